@@ -0,0 +1,39 @@
+"""Obaveštenja za admin_room
+
+create_quiz/update_quiz ne šalju ceo kviz (sa tačnim odgovorima) svakom
+adminu, već sažetak sa verzijom (to_summary_dict). Obaveštenja unutar
+ADMIN_NOTIFY_BATCH_MS spajaju se u jednu quizzes_pending poruku, a za isti
+kviz ostaje samo poslednja verzija. Pitanja i odgovori se učitavaju na zahtev
+preko GET /api/quizzes/<id>.
+"""
+import threading
+
+from config import Config
+from extensions import socketio
+from rooms import ADMIN_ROOM
+
+# quiz_id -> sažetak koji čeka sledeći flush
+_pending = {}
+_lock = threading.Lock()
+
+
+def notify_quiz_pending(quiz):
+    """Zakazuje obaveštenje o kvizu koji čeka odobrenje"""
+    summary = quiz.to_summary_dict()
+    with _lock:
+        # Prvi događaj u prozoru pokreće flush, ostali samo čekaju u _pending
+        schedule = not _pending
+        current = _pending.get(summary['id'])
+        if current is None or current['version'] <= summary['version']:
+            _pending[summary['id']] = summary
+    if schedule:
+        socketio.start_background_task(_flush_later)
+
+
+def _flush_later():
+    socketio.sleep(Config.ADMIN_NOTIFY_BATCH_MS / 1000)
+    with _lock:
+        quizzes = list(_pending.values())
+        _pending.clear()
+    if quizzes:
+        socketio.emit('quizzes_pending', {'quizzes': quizzes}, room=ADMIN_ROOM)
@@ -1,3 +1,6 @@
+# Mora biti prvi import: u eventlet/gevent modu zakrpi socket-e pre nego što ih
+# redis, psycopg2 (SQLAlchemy) i requests uvezu
+import async_mode
 import token
 from flask import Flask, jsonify, send_from_directory, request
 from flask_cors import CORS, cross_origin
@@ -17,11 +20,17 @@ import jwt
 import logging
 
 from config import Config
-from models import db, User, create_default_admin, ROLE_ADMIN, ROLE_MODERATOR
+from models import db, User, create_default_admin, ensure_quiz_version_column, ROLE_ADMIN, ROLE_MODERATOR
 from extensions import socketio
 from auth import auth_bp
 from routes_users import users_bp
 from routes_quiz import quiz_bp
+from result_events import start_result_listener
+from rooms import ADMIN_ROOM, role_room, user_room
+from live_leaderboard import quiz_room, snapshot as leaderboard_snapshot, start_live_leaderboards
+from socket_metrics import socket_metrics
+from socket_presence import start_presence_heartbeat
+from socket_codec import client_supports_serializer
 
 
 
@@ -40,20 +49,22 @@ CORS(app, resources={
     r"/api/*": {
         "origins": Config.CORS_ORIGINS,
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"],
         "supports_credentials": True
     }
 })
 
 # JWT
-jwt = JWTManager(app)
+jwt_manager = JWTManager(app)
 
 socketio.init_app(
     app, 
     cors_allowed_origins=Config.CORS_ORIGINS,
     logger=False,
     engineio_logger=False,
-    async_mode='threading'
+    async_mode=Config.SOCKETIO_ASYNC_MODE,
+    message_queue=Config.SOCKETIO_MESSAGE_QUEUE or None,
+    channel=Config.SOCKETIO_CHANNEL
     )
 
 # Database
@@ -321,6 +332,7 @@ if wait_for_postgres():
     with app.app_context():
         # Kreiraj tabele
         db.create_all()
+        ensure_quiz_version_column()
         
         # Kreiraj uploads folder ako ne postoji
         if not os.path.exists(Config.UPLOAD_FOLDER):
@@ -432,6 +444,7 @@ def api_docs():
 def handle_connect():
     token = request.args.get('token')
     if not token:
+        socket_metrics.record_rejected_auth()
         emit('error', {'message': 'Authentication required'})
         return False
     
@@ -440,20 +453,33 @@ def handle_connect():
         request.user_id = data['user_id']
         request.user_role = data.get('role', 'IGRAČ')
     except jwt.ExpiredSignatureError:
+        socket_metrics.record_rejected_auth()
         emit('error', {'message': 'Token expired'})
         return False
     except jwt.InvalidTokenError:
+        socket_metrics.record_rejected_auth()
         emit('error', {'message': 'Invalid token'})
         return False
     
+    # websocket.js u query-ju javlja formate koje ume da raspakuje (codecs)
+    if not client_supports_serializer(request.args.get('codecs')):
+        socket_metrics.record_rejected_codec()
+        emit('error', {'message': 'Unsupported client, reload the page'})
+        return False
+    
+    # Lična soba (result_ready, odluke o sopstvenim kvizovima) i soba uloge
+    # (admin_room za administratore); ciljani emit-ovi ne idu svim klijentima
+    join_room(user_room(request.user_id))
+    join_room(role_room(request.user_role))
+    
     if request.user_role == ROLE_ADMIN:
-        join_room('admin_room')
         emit('admin_connected', {
             'user_id': request.user_id,
             'message': 'Admin room joined',
             'timestamp': datetime.utcnow().isoformat()
         })
     
+    socket_metrics.record_connect()
     logger.info(f'WebSocket client connected: {request.sid} ({request.user_role})')
     emit('system_message', {
         'message': 'Connected to Quiz Platform',
@@ -463,6 +489,7 @@ def handle_connect():
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    socket_metrics.record_disconnect()
     logger.info(f'WebSocket client disconnected: {request.sid}')
 
 @socketio.on('admin_notification')
@@ -479,23 +506,27 @@ def handle_admin_notification(data):
         'type': notification_type,
         'from_user_id': request.user_id,
         'timestamp': datetime.utcnow().isoformat()
-    }, room='admin_room')
+    }, room=ADMIN_ROOM)
 
 @socketio.on('join_quiz_room')
 def handle_join_quiz_room(data):
     quiz_id = (data or {}).get('quiz_id')
     if quiz_id:
-        join_room(f'quiz_{quiz_id}')
+        join_room(quiz_room(quiz_id))
         emit('system_message', {
             'message': f'Joined quiz room {quiz_id}',
             'timestamp': datetime.utcnow().isoformat()
         })
+        # Početno stanje rang liste; dalje stižu leaderboard_delta događaji
+        board = leaderboard_snapshot(quiz_id)
+        if board:
+            emit('leaderboard_snapshot', board)
 
 @socketio.on('leave_quiz_room')
 def handle_leave_quiz_room(data):
     quiz_id = (data or {}).get('quiz_id')
     if quiz_id:
-        leave_room(f'quiz_{quiz_id}')
+        leave_room(quiz_room(quiz_id))
         emit('system_message', {
             'message': f'Left quiz room {quiz_id}',
             'timestamp': datetime.utcnow().isoformat()
@@ -520,27 +551,50 @@ def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
 # JWT error handlers
-@jwt.expired_token_loader
+@jwt_manager.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
     return jsonify({
         'error': 'Token has expired',
         'code': 'token_expired'
     }), 401
 
-@jwt.invalid_token_loader
+@jwt_manager.invalid_token_loader
 def invalid_token_callback(error):
     return jsonify({
         'error': 'Invalid token',
         'code': 'invalid_token'
     }), 401
 
-@jwt.unauthorized_loader
+@jwt_manager.unauthorized_loader
 def missing_token_callback(error):
     return jsonify({
         'error': 'Authorization token is required',
         'code': 'missing_token'
     }), 401
 
+# Reloader postoji samo uz Werkzeug (threading); green server se pokreće direktno
+USE_RELOADER = Config.FLASK_DEBUG and Config.SOCKETIO_ASYNC_MODE == 'threading'
+
+_background_tasks_started = False
+
+def start_background_tasks():
+    """Pokreće pozadinske zadatke procesa: result_ready pretplatnik, live rang liste, presence heartbeat
+
+    Poziva se pri inicijalizaciji aplikacije, pa radi i kada modul učita WSGI
+    server (npr. gunicorn app:app), ne samo uz `python app.py`. Ponovni poziv ne radi ništa.
+    """
+    global _background_tasks_started
+    if _background_tasks_started:
+        return
+    _background_tasks_started = True
+    start_result_listener()
+    start_live_leaderboards()
+    start_presence_heartbeat()
+
+# Roditeljski proces debug reloader-a samo prati fajlove; zadaci rade u procesu koji služi zahteve
+if not (USE_RELOADER and __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'):
+    start_background_tasks()
+
 if __name__ == '__main__':
     print("=" * 60)
     print(" QUIZ PLATFORM SERVER")
@@ -549,7 +603,8 @@ if __name__ == '__main__':
     print(f" Port: {Config.PORT}")
     print(f" API: http://localhost:{Config.PORT}")
     print(f" Health: http://localhost:{Config.PORT}/health")
-    print(f" WebSocket: ws://localhost:{Config.PORT} (threading mode)")
+    print(f" WebSocket: ws://localhost:{Config.PORT} ({Config.SOCKETIO_ASYNC_MODE} mode)")
+    print(f" Socket.IO message queue: {Config.SOCKETIO_MESSAGE_QUEUE or 'off (single process)'}")
     print(f" Database: PostgreSQL")
     print(f" Rate Limiting: {'Redis' if use_redis else 'In-memory'}")
     print(f" Login attempts: 3 per 15 minutes")
@@ -561,10 +616,17 @@ if __name__ == '__main__':
     print(" SVE DO 'RAD SA KVIZOVIMA' IMPLEMENTIRANO")
     print("=" * 60)
     
+    if Config.SOCKETIO_ASYNC_MODE == 'threading':
+        run_options = {'allow_unsafe_werkzeug': True}
+    elif Config.SOCKETIO_ASYNC_MODE == 'eventlet':
+        run_options = {'max_size': Config.SOCKETIO_MAX_CONNECTIONS}
+    else:
+        run_options = {'spawn': Config.SOCKETIO_MAX_CONNECTIONS}
     socketio.run(
         app, 
         host='0.0.0.0', 
         port=Config.PORT, 
         debug=Config.FLASK_DEBUG,
-        allow_unsafe_werkzeug=True
+        use_reloader=USE_RELOADER,
+        **run_options
     )
\ No newline at end of file
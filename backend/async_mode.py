@@ -0,0 +1,32 @@
+"""Izbor async moda za Socket.IO server (SOCKETIO_ASYNC_MODE)
+
+threading  razvoj: Werkzeug server, svaka WebSocket konekcija drži OS nit
+eventlet   produkcija: green thread-ovi, hiljade konekcija po procesu
+gevent     produkcija: isto, preko gevent-a (+ gevent-websocket)
+
+U eventlet/gevent modu standardna biblioteka se monkey-patch-uje (socket, ssl,
+select, time, threading), pa redis-py i requests postaju kooperativni bez
+izmena; psycopg2 je C ekstenzija i zakrpi se preko psycogreen-a.
+
+Modul mora biti uvezen pre svih ostalih (app.py ga uvozi prvog); config.py
+uvozi samo os i dotenv, pa ga je bezbedno učitati pre patch-ovanja.
+"""
+from config import Config
+
+ASYNC_MODES = ('threading', 'eventlet', 'gevent')
+ASYNC_MODE = Config.SOCKETIO_ASYNC_MODE
+
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
+    from psycogreen.eventlet import patch_psycopg
+    patch_psycopg()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+elif ASYNC_MODE not in ASYNC_MODES:
+    raise ValueError(f"SOCKETIO_ASYNC_MODE mora biti jedno od {ASYNC_MODES}, a ne '{ASYNC_MODE}'")
@@ -27,6 +27,31 @@ class Config:
     # Redis 
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
     
+    # Socket.IO message queue: emit-ovi iz bilo kog procesa/čvora stižu do svih klijenata.
+    # Uključuje se eksplicitno (npr. SOCKETIO_MESSAGE_QUEUE=$REDIS_URL kad radi više procesa);
+    # bez Redis-a bi se emit-ovi kroz queue gubili, pa je podrazumevano jedan proces, bez queue-a
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+    SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'flask-socketio')
+    # threading (razvoj) | eventlet | gevent (produkcija) - vidi async_mode.py
+    SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+    # Gornja granica istovremenih konekcija po procesu u eventlet/gevent modu
+    # (eventlet.wsgi podrazumevano prima samo 1024)
+    SOCKETIO_MAX_CONNECTIONS = int(os.getenv('SOCKETIO_MAX_CONNECTIONS', 10000))
+    # Format poruka: json | deflate (JSON, veće poruke kompresovane) - vidi socket_codec.py
+    SOCKETIO_SERIALIZER = os.getenv('SOCKETIO_SERIALIZER', 'json')
+    # deflate: payload manji od ovoliko bajtova JSON-a ide nekompresovan
+    SOCKETIO_COMPRESS_THRESHOLD = int(os.getenv('SOCKETIO_COMPRESS_THRESHOLD', 1024))
+    # Live rang liste u quiz_<id> sobama: jedan leaderboard_delta po sobi na svakih N ms
+    LIVE_LEADERBOARD_INTERVAL_MS = int(os.getenv('LIVE_LEADERBOARD_INTERVAL_MS', 500))
+    LIVE_LEADERBOARD_TOP_N = int(os.getenv('LIVE_LEADERBOARD_TOP_N', 10))
+    # Prozor u kome se admin_room obaveštenja spajaju u jednu poruku
+    ADMIN_NOTIFY_BATCH_MS = int(os.getenv('ADMIN_NOTIFY_BATCH_MS', 250))
+    # Prisustvo u Redis-u: heartbeat čvora i rok posle kog ugašen čvor nestaje
+    PRESENCE_HEARTBEAT_SECONDS = int(os.getenv('PRESENCE_HEARTBEAT_SECONDS', 10))
+    PRESENCE_TTL_SECONDS = int(os.getenv('PRESENCE_TTL_SECONDS', 30))
+    # Ime čvora u presence ključevima (podrazumevano host:pid)
+    SOCKETIO_NODE_ID = os.getenv('SOCKETIO_NODE_ID', '')
+    
     RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
     RATE_LIMIT_LOGIN_ATTEMPTS = int(os.getenv('RATE_LIMIT_LOGIN_ATTEMPTS', 3))
     
@@ -296,6 +296,7 @@ class QuizResponseDTO(BaseModel):
     status: str
     rejection_reason: Optional[str] = None
     question_count: int
+    version: int = 1
     created_at: datetime
     updated_at: Optional[datetime] = None
     questions: Optional[List[QuizQuestionResponseDTO]] = None
@@ -1,3 +1,35 @@
+import time
+
+import redis
 from flask_socketio import SocketIO
 
-socketio = SocketIO()
\ No newline at end of file
+from config import Config
+from socket_codec import encode_payload
+from socket_metrics import socket_metrics
+
+
+class InstrumentedSocketIO(SocketIO):
+    """SocketIO koji broji i meri svaki emit po event-u (i emit() iz handler-a ide ovuda)
+
+    Payload prolazi kroz socket_codec (deflate omotač), pa izmereno vreme
+    uključuje i kompresiju.
+    """
+
+    def emit(self, event, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            if args:
+                args = (encode_payload(args[0]),) + args[1:]
+            return super().emit(event, *args, **kwargs)
+        finally:
+            socket_metrics.record_emit(event, time.perf_counter() - start)
+
+
+socketio = InstrumentedSocketIO()
+
+# Deljeni Redis klijent (konekcija se otvara tek pri prvoj komandi)
+redis_client = redis.Redis.from_url(
+    Config.REDIS_URL,
+    decode_responses=True,
+    socket_connect_timeout=2
+)
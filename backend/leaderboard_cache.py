@@ -0,0 +1,43 @@
+import logging
+
+import redis
+
+from extensions import redis_client
+from quiz_service import leaderboard_store
+
+logger = logging.getLogger(__name__)
+
+# Format kljuceva i citanje deli sa Quiz Service-om (quiz_service/leaderboard_store.py)
+MAX_PAGE_SIZE = 200
+
+
+def read_page(quiz_id, limit=50, cursor=None, best_only=False):
+    """Stranica rang liste iz Redis sorted seta, ili None ako rang lista nije spremna"""
+    limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+    try:
+        page = leaderboard_store.read_page(redis_client, quiz_id, limit, cursor, best_only)
+    except (redis.RedisError, ValueError) as e:
+        logger.warning(f"Leaderboard cache read failed for quiz {quiz_id}: {e}")
+        return None
+    if page is None:
+        return None
+    rows, next_cursor = page
+    return {'results': rows, 'next_cursor': next_cursor, 'limit': limit}
+
+
+def user_rank(quiz_id, user_id, around=0):
+    """Pozicija korisnika (najbolji pokušaj) i susedi +/- around"""
+    try:
+        return leaderboard_store.user_rank(redis_client, quiz_id, str(user_id), around)
+    except redis.RedisError as e:
+        logger.warning(f"Leaderboard cache read failed for quiz {quiz_id}: {e}")
+        return None
+
+
+def read_top(quiz_id, limit):
+    """Prvih limit igrača (najbolji pokušaj) i ukupan broj igrača, ili None ako rang lista nije spremna"""
+    try:
+        return leaderboard_store.read_top(redis_client, quiz_id, limit)
+    except redis.RedisError as e:
+        logger.warning(f"Leaderboard cache read failed for quiz {quiz_id}: {e}")
+        return None
@@ -0,0 +1,150 @@
+"""Live rang liste za quiz_<id> sobe
+
+result_ready događaj samo označi kviz kao promenjen. Pozadinski tick na svakih
+LIVE_LEADERBOARD_INTERVAL_MS jednom po kvizu pročita top N (najbolji pokušaj po
+igraču) iz Redis rang liste i sobi pošalje samo promene ranga u odnosu na
+prethodni tick (leaderboard_delta). Sto rezultata u istom intervalu daje jedan
+delta, a emit u sobu serijalizuje payload jednom za sve gledaoce.
+
+Klijent koji uđe u sobu dobije leaderboard_snapshot; svaki delta nosi base_seq
+(stanje na koje se primenjuje) i seq. Ako se base_seq ne poklapa sa lokalnim,
+klijent ponovo pošalje join_quiz_room i dobije svež snapshot; base_seq None
+znači da delta sadrži ceo top N.
+
+Svaki proces računa delte za svoje lokalne gledaoce (emit sa ignore_queue),
+isto kao result_events.
+"""
+import itertools
+import logging
+import threading
+
+from config import Config
+from extensions import socketio
+from leaderboard_cache import read_top
+
+logger = logging.getLogger(__name__)
+
+# Polja reda koja tabela prikazuje (quiz_id/quiz_name su isti za celu sobu)
+LIVE_ROW_FIELDS = ('_id', 'user_id', 'user_name', 'score', 'max_score', 'time_spent')
+
+_dirty = set()
+_lock = threading.Lock()
+# quiz_id -> {'seq', 'rows', 'total_players'} poslednjeg stanja poslatog sobi
+_boards = {}
+_seq = itertools.count(1)
+
+
+def quiz_room(quiz_id):
+    return f'quiz_{quiz_id}'
+
+
+def mark_dirty(quiz_id):
+    """Poziva se za svaki novi rezultat; sam emit čeka sledeći tick"""
+    with _lock:
+        _dirty.add(str(quiz_id))
+
+
+def _live_row(row):
+    return {field: row.get(field) for field in LIVE_ROW_FIELDS}
+
+
+def leaderboard_delta(previous, current):
+    """Promene ranga između dva top N stanja
+
+    Red sa novim najboljim pokušajem ide ceo; red koji se samo pomerio nosi
+    user_id i rang, jer ga klijent već ima. removed su igrači ispali iz top N.
+    """
+    before = {row['user_id']: (rank, row) for rank, row in enumerate(previous, 1)}
+    changes = []
+    for rank, row in enumerate(current, 1):
+        old = before.pop(row['user_id'], None)
+        if old is None or old[1]['_id'] != row['_id']:
+            changes.append({'rank': rank, 'previous_rank': old[0] if old else None, 'row': _live_row(row)})
+        elif old[0] != rank:
+            changes.append({'rank': rank, 'previous_rank': old[0], 'user_id': row['user_id']})
+    return changes, list(before)
+
+
+def _has_local_spectators(room):
+    return bool(socketio.server.manager.rooms.get('/', {}).get(room))
+
+
+def _snapshot_event(quiz_id, board):
+    return {
+        'quiz_id': quiz_id,
+        'seq': board['seq'],
+        'top': Config.LIVE_LEADERBOARD_TOP_N,
+        'rows': [_live_row(row) for row in board['rows']],
+        'total_players': board['total_players'],
+    }
+
+
+def snapshot(quiz_id):
+    """Trenutni top N za klijenta koji ulazi u sobu, ili None ako rang lista ne postoji"""
+    quiz_id = str(quiz_id)
+    with _lock:
+        board = _boards.get(quiz_id)
+        if board is not None:
+            return _snapshot_event(quiz_id, board)
+
+    top = read_top(quiz_id, Config.LIVE_LEADERBOARD_TOP_N)
+    if top is None:
+        return None
+    rows, total = top
+    with _lock:
+        board = _boards.setdefault(quiz_id, {'seq': next(_seq), 'rows': rows, 'total_players': total})
+        return _snapshot_event(quiz_id, board)
+
+
+def _tick():
+    with _lock:
+        dirty = list(_dirty)
+        _dirty.clear()
+        # Sobe koje su se ispraznile više ne prate stanje
+        for quiz_id in [quiz_id for quiz_id in _boards if not _has_local_spectators(quiz_room(quiz_id))]:
+            del _boards[quiz_id]
+
+    for quiz_id in dirty:
+        room = quiz_room(quiz_id)
+        if not _has_local_spectators(room):
+            continue
+        top = read_top(quiz_id, Config.LIVE_LEADERBOARD_TOP_N)
+        if top is None:
+            continue
+        rows, total = top
+
+        with _lock:
+            # Bez prethodnog stanja (rang lista bila prazna pri ulasku) delta je ceo top N,
+            # a base_seq None znači da ga klijent prihvata kao novo stanje
+            board = _boards.setdefault(quiz_id, {'seq': None, 'rows': [], 'total_players': 0})
+            changes, removed = leaderboard_delta(board['rows'], rows)
+            if not changes and not removed and total == board['total_players']:
+                continue
+            base_seq = board['seq']
+            board.update(seq=next(_seq), rows=rows, total_players=total)
+            event = {
+                'quiz_id': quiz_id,
+                'base_seq': base_seq,
+                'seq': board['seq'],
+                'top': Config.LIVE_LEADERBOARD_TOP_N,
+                'changes': changes,
+                'removed': removed,
+                'total_players': total,
+            }
+        socketio.emit('leaderboard_delta', event, room=room, ignore_queue=True)
+
+
+def _run():
+    interval = Config.LIVE_LEADERBOARD_INTERVAL_MS / 1000
+    logger.info(f"Live leaderboards: top {Config.LIVE_LEADERBOARD_TOP_N} every {Config.LIVE_LEADERBOARD_INTERVAL_MS} ms")
+    while True:
+        socketio.sleep(interval)
+        try:
+            _tick()
+        except Exception as e:
+            logger.warning(f"Live leaderboard tick failed: {e}")
+
+
+def start_live_leaderboards():
+    """Pokreće tick u pozadini (jednom po procesu)"""
+    socketio.start_background_task(_run)
@@ -4,6 +4,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import re
 import bcrypt
 from flask import current_app
+from sqlalchemy import inspect, text
 
 db = SQLAlchemy()
 
@@ -290,6 +291,8 @@ class Quiz(db.Model):
     rejection_reason = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Raste pri svakoj izmeni sadržaja; admin obaveštenja nose samo sažetak + verziju
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
     
     questions = db.relationship(
         'QuizQuestion',
@@ -308,6 +311,7 @@ class Quiz(db.Model):
             'status': self.status,
             'rejection_reason': self.rejection_reason,
             'question_count': len(self.questions),
+            'version': self.version,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -368,6 +372,15 @@ class QuizAnswer(db.Model):
         }
 
 
+def ensure_quiz_version_column():
+    """Dodaje quizzes.version u bazu kreiranu pre te kolone (create_all ne menja postojeće tabele)"""
+    columns = {column['name'] for column in inspect(db.engine).get_columns('quizzes')}
+    if 'version' not in columns:
+        db.session.execute(text('ALTER TABLE quizzes ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
+        db.session.commit()
+        print("✅ Added quizzes.version column")
+
+
 # Funkcija za kreiranje default admina
 def create_default_admin():
     """Kreiranje default admin korisnika ako ne postoji (po specifikaciji)"""
@@ -1,12 +1,51 @@
 import os
 import time
+import json
+import uuid
+import queue
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from multiprocessing import Process
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from pymongo import MongoClient, DESCENDING
+from pymongo import MongoClient
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+import redis
+from indexes import ensure_indexes, explain_hot_queries, list_indexes
+from leaderboard import (
+    parse_page_size,
+    fetch_page,
+    fetch_best_page,
+    rebuild_leaderboard
+)
+from leaderboard_store import (
+    record_results, read_page, user_rank, init_leaderboard, leaderboard_ready, claim_rebuild, release_rebuild
+)
+from quiz_processor import AnswerKeyCache
+from result_codec import compact_result, decode_results
+from result_writer import ResultWriter
+from mailer import enqueue_email, mail_metrics
+from rescoring import rescore_results, answer_key_changed
+from item_analytics import get_item_analytics
+from results_export import EXPORT_FORMATS, stream_export
+from user_results import (
+    fetch_user_page,
+    load_user_summary,
+    rebuild_user_summaries
+)
+from quiz_stats import (
+    compute_statistics,
+    empty_statistics,
+    statistics_from_document,
+    quiz_stats_filter,
+    init_stats_document,
+    rebuild_stats_document
+)
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -21,17 +60,53 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
 SMTP_USER = os.getenv("SMTP_USERNAME", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 SMTP_FROM = os.getenv("FROM_EMAIL", "noreply@quizplatform.com")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+SUBMISSION_TTL_SECONDS = int(os.getenv("SUBMISSION_TTL_SECONDS", "3600"))
+SUBMISSION_MAX_WAIT_SECONDS = int(os.getenv("SUBMISSION_MAX_WAIT_SECONDS", "25"))
+# Backend subscribes here and forwards events to the player's socket.io room
+RESULT_READY_CHANNEL = "quiz_events:result_ready"
 
 client = MongoClient(MONGO_URL)
 db = client["quizplatform_db2"]
 quiz_collection = db["quizzes"]
 results_collection = db["results"]
+stats_collection = db["quiz_stats"]
+submissions_collection = db["submissions"]
+user_stats_collection = db["user_stats"]
+analytics_collection = db["item_analytics"]
+
+# Compiled answer keys, refreshed when /quizzes/sync bumps the quiz version
+answer_keys = AnswerKeyCache(quiz_collection)
 
 # Create indexes
-quiz_collection.create_index([("status", 1)])
-quiz_collection.create_index([("author_id", 1)])
-results_collection.create_index([("quiz_id", 1)])
-results_collection.create_index([("user_id", 1)])
+index_report = ensure_indexes(db)
+print(f"Indexes ensured: {index_report}")
+
+# Redis holds the status of submissions still being processed (falls back to MongoDB)
+use_redis = False
+redis_client = None
+try:
+    redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=2)
+    redis_client.ping()
+    use_redis = True
+    print(f"Redis connected: {REDIS_URL}")
+except redis.RedisError:
+    print("Redis not available, submission status served from MongoDB only")
+    redis_client = None
+
+def submission_dedupe_key(user_id, quiz_id, idempotency_key=None, started_at=None):
+    """Dedupe key from the client's idempotency key, else from the attempt start.
+    Returns None for legacy clients that send neither."""
+    if idempotency_key:
+        source = f"{user_id}:{quiz_id}:key:{idempotency_key}"
+    elif started_at:
+        source = f"{user_id}:{quiz_id}:start:{started_at}"
+    else:
+        return None
+    return hashlib.sha256(source.encode()).hexdigest()
+
+def submission_key(submission_id):
+    return f"submission:{submission_id}"
 
 def serialize_mongo_doc(doc):
     """Convert MongoDB document to JSON-serializable format"""
@@ -46,6 +121,110 @@ def serialize_mongo_doc(doc):
         doc["submitted_at"] = doc["submitted_at"].isoformat()
     return doc
 
+def result_to_status(result):
+    """Build the public submission status from a stored result document"""
+    max_score = result.get("max_score", 0)
+    submitted_at = result.get("submitted_at")
+    return {
+        "submission_id": result.get("submission_id"),
+        "status": "completed",
+        "quiz_name": result.get("quiz_name", ""),
+        "user_id": result.get("user_id"),
+        "score": result.get("score", 0),
+        "max_score": max_score,
+        "percentage": (result.get("score", 0) / max_score * 100) if max_score > 0 else 0,
+        "time_spent": result.get("time_spent"),
+        "submitted_at": submitted_at.isoformat() if isinstance(submitted_at, datetime) else submitted_at
+    }
+
+def publish_submission_status(status):
+    """Store submission status in Redis and wake up long-poll waiters"""
+    if not use_redis:
+        return
+    try:
+        key = submission_key(status["submission_id"])
+        payload = json.dumps(status)
+        pipe = redis_client.pipeline()
+        pipe.setex(key, SUBMISSION_TTL_SECONDS, payload)
+        pipe.publish(key, payload)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Could not publish submission status: {str(e)}")
+
+def publish_result_ready(status, quiz_id):
+    """Announce a stored result on RESULT_READY_CHANNEL (fire and forget)"""
+    if not use_redis:
+        return
+    try:
+        redis_client.publish(RESULT_READY_CHANNEL, json.dumps(dict(status, quiz_id=quiz_id)))
+    except redis.RedisError as e:
+        print(f"Could not publish result_ready: {str(e)}")
+
+def load_submission_status(submission_id):
+    """Return submission status from Redis, else from the stored result or the submission claim"""
+    if use_redis:
+        try:
+            cached = redis_client.get(submission_key(submission_id))
+            if cached:
+                return json.loads(cached)
+        except redis.RedisError:
+            pass
+    
+    result = results_collection.find_one(
+        {"submission_id": submission_id},
+        {"answers": 0, "masks": 0}
+    )
+    if result:
+        return result_to_status(decode_results(db, [result])[0])
+    
+    # Not stored yet (or Redis is down): the claim still knows the submission
+    claim = submissions_collection.find_one({"submission_id": submission_id})
+    if claim and claim.get("duplicate_of"):
+        status = load_submission_status(claim["duplicate_of"])
+        return dict(status, submission_id=submission_id, duplicate_of=claim["duplicate_of"]) if status else None
+    return claim_status(claim) if claim else None
+
+def claim_status(claim):
+    """Processing status of a claimed submission whose result is not stored yet"""
+    return {
+        "submission_id": claim["submission_id"],
+        "status": "processing",
+        "user_id": claim.get("user_id"),
+        "submitted_at": claim["claimed_at"].isoformat()
+    }
+
+def wait_for_submission(submission_id, wait_seconds):
+    """Long-poll until the submission is completed or wait_seconds elapse"""
+    status = load_submission_status(submission_id)
+    if status is None or status["status"] != "processing" or wait_seconds <= 0:
+        return status
+    
+    deadline = time.monotonic() + wait_seconds
+    if use_redis:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(submission_key(submission_id))
+            # Re-check after subscribing so a result published in between is not missed
+            status = load_submission_status(submission_id)
+            while status and status["status"] == "processing":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                message = pubsub.get_message(timeout=remaining)
+                if message and message["type"] == "message":
+                    status = json.loads(message["data"])
+            return status
+        except redis.RedisError:
+            pass
+        finally:
+            pubsub.close()
+    
+    # Without Redis fall back to polling the indexed submission_id lookup
+    while status and status["status"] == "processing" and time.monotonic() < deadline:
+        time.sleep(0.5)
+        status = load_submission_status(submission_id)
+    return status
+
 def send_email(to_email, subject, body):
     """Send email notification"""
     try:
@@ -64,55 +243,164 @@ def send_email(to_email, subject, body):
         print(f"Email failed: {str(e)}")
         return False
 
-def calculate_score(quiz, user_answers):
-    """Calculate quiz score"""
-    total_score = 0
-    max_score = 0
-    
-    for question in quiz.get("questions", []):
-        max_score += question.get("points", 0)
-        question_id = str(question.get("id", ""))
-        
-        user_answer = user_answers.get(question_id, [])
-        if not isinstance(user_answer, list):
-            user_answer = [user_answer]
-        
-        correct_answers = set()
-        for idx, answer in enumerate(question.get("answers", [])):
-            if answer.get("is_correct", False):
-                correct_answers.add(str(idx))
-        
-        user_answer_set = set(str(ans) for ans in user_answer)
-        if user_answer_set == correct_answers:
-            total_score += question.get("points", 0)
-    
-    return total_score, max_score
+# Without Redis, emails are sent by one background thread so SMTP never blocks the result writer
+direct_mail_queue = queue.Queue()
+direct_mail_lock = threading.Lock()
+direct_mail_thread = None
+
+def send_direct_mail_forever():
+    while True:
+        send_email(*direct_mail_queue.get())
+
+def send_email_later(to_email, subject, body):
+    """Queue an email for the background sender (started on first use in this process)"""
+    global direct_mail_thread
+    with direct_mail_lock:
+        if direct_mail_thread is None or not direct_mail_thread.is_alive():
+            direct_mail_thread = threading.Thread(target=send_direct_mail_forever, name="direct-mail", daemon=True)
+            direct_mail_thread.start()
+    direct_mail_queue.put((to_email, subject, body))
+
+def notify_by_email(to_email, subject, body):
+    """Hand the email to the mail dispatcher; without Redis to the background sender"""
+    if use_redis:
+        try:
+            enqueue_email(redis_client, to_email, subject, body)
+            return True
+        except redis.RedisError as e:
+            print(f"Mail queue unavailable, sending in the background: {str(e)}")
+    send_email_later(to_email, subject, body)
+    return True
+
+def after_results_stored(items):
+    """Writer callback: publish statuses, update leaderboards and send emails for a stored batch"""
+    statuses = [result_to_status(item["result"]) for item in items]
+    for status in statuses:
+        publish_submission_status(status)
+    if use_redis:
+        try:
+            recorded = record_results(redis_client, [(item["stats"][0], item["result"]) for item in items])
+            # Quizzes without a leaderboard get one from MongoDB, which already holds these results
+            for quiz_id in {item["stats"][0] for item, improved in zip(items, recorded) if improved is None}:
+                start_leaderboard_rebuild(quiz_id)
+        except redis.RedisError as e:
+            print(f"Leaderboard update failed (rebuild with manage.py): {str(e)}")
+    # After the leaderboards, so live quiz rooms in the backend read the new ranks
+    for status, item in zip(statuses, items):
+        publish_result_ready(status, item["stats"][0])
+    for item in items:
+        notify_by_email(*item["email"])
+        print(f"Quiz {item['stats'][0]} processed for user {item['result']['user_id']}")
+
+def after_results_failed(items):
+    """Writer callback: mark the submissions failed and release their claims for a retry"""
+    for item in items:
+        failed = {
+            "submission_id": item["result"]["submission_id"],
+            "status": "failed",
+            "user_id": item["result"]["user_id"]
+        }
+        publish_submission_status(failed)
+        # Players waiting on the socket learn about the failure too
+        publish_result_ready(failed, item["stats"][0])
+    dedupe_keys = [item["dedupe_key"] for item in items if item["dedupe_key"]]
+    if dedupe_keys:
+        submissions_collection.delete_many({"_id": {"$in": dedupe_keys}})
+
+def after_results_duplicate(items):
+    """Writer callback: answer submissions whose dedupe key already has a stored result
+
+    Happens when a retry arrives after its claim expired. The submission gets
+    the status of the stored result, and its claim points there for later lookups.
+    """
+    existing = {
+        doc["dedupe_key"]: doc
+        for doc in decode_results(db, list(results_collection.find(
+            {"dedupe_key": {"$in": [item["dedupe_key"] for item in items]}},
+            {"answers": 0, "masks": 0}
+        )))
+    }
+    missing = []
+    for item in items:
+        original = existing.get(item["dedupe_key"])
+        if original is None:
+            missing.append(item)
+            continue
+        submission_id = item["result"]["submission_id"]
+        status = dict(
+            result_to_status(original), submission_id=submission_id, duplicate_of=original.get("submission_id")
+        )
+        publish_submission_status(status)
+        publish_result_ready(status, item["stats"][0])
+        submissions_collection.update_one(
+            {"_id": item["dedupe_key"], "submission_id": submission_id},
+            {"$set": {"duplicate_of": original.get("submission_id")}}
+        )
+    if missing:
+        # The stored result was deleted after it rejected this one, nothing to point at
+        after_results_failed(missing)
+
+# Scored results are written in batches by a thread of the serving process
+result_writer = ResultWriter(db, after_results_stored, after_results_failed, after_results_duplicate)
+
+# Under async_app background jobs run in a spawn-context pool started with the
+# server: forking the threaded uvicorn process could copy locks held by other
+# threads. The Flask server keeps forking one process per job.
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "16"))
+process_pool = None
+
+def init_pool_worker(result_queue):
+    """Pool worker initializer: scored results go to the serving process's writer"""
+    result_writer.queue = result_queue
+
+def start_process_pool(max_workers=SCORING_WORKERS):
+    global process_pool
+    if process_pool is None:
+        process_pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_pool_worker,
+            initargs=(result_writer.queue,)
+        )
+    return process_pool
+
+def stop_process_pool():
+    global process_pool
+    if process_pool is not None:
+        # Like a restart with forked jobs: unscored submissions fail and their claims expire
+        process_pool.shutdown(wait=False, cancel_futures=True)
+        process_pool = None
+
+def report_job_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Background job failed: {str(future.exception())}")
+
+def run_in_background_process(target, *args):
+    """Run a job in a pool worker once the pool is started, else in a forked process"""
+    if process_pool is not None:
+        process_pool.submit(target, *args).add_done_callback(report_job_failure)
+    else:
+        Process(target=target, args=args).start()
 
 # ASYNC QUIZ PROCESSING WITH PROCESS
-def process_quiz_in_background(mongo_quiz_id, user_id, answers, time_spent, user_email, user_name):
+def process_quiz_in_background(submission_id, answer_key, user_id, answers, time_spent, user_email, user_name, dedupe_key=None):
     """Process quiz results in a separate process
     Args:
-        mongo_quiz_id: MongoDB ObjectId as string
+        submission_id: ID returned to the client on submit, stored with the result
+        answer_key: compiled AnswerKey of the quiz (no quiz refetch needed)
+        dedupe_key: idempotency key of the submission, unique among results
+    The scored result is handed to result_writer, which stores it in the next batch.
     """
     try:
         time.sleep(5)  # Simulate processing
         
-        process_client = MongoClient(MONGO_URL)
-        process_db = process_client["quizplatform_db2"]
-        process_quiz_collection = process_db["quizzes"]
-        process_results_collection = process_db["results"]
-        
-        # Find quiz by MongoDB ObjectId
-        quiz = process_quiz_collection.find_one({"_id": ObjectId(mongo_quiz_id)})
-        if not quiz:
-            print(f"Quiz {mongo_quiz_id} not found in MongoDB")
-            return
-        
-        total_score, max_score = calculate_score(quiz, answers)
+        total_score, max_score = answer_key.score(answers)
         
         result_data = {
-            "quiz_id": mongo_quiz_id,  # Store MongoDB ObjectId as string
-            "quiz_name": quiz.get("name", ""),
+            "submission_id": submission_id,
+            "quiz_id": answer_key.mongo_id,  # Store MongoDB ObjectId as string
+            "quiz_version": answer_key.version,
+            "quiz_name": answer_key.name,
             "user_id": user_id,
             "user_name": user_name,
             "answers": answers,
@@ -122,30 +410,121 @@ def process_quiz_in_background(mongo_quiz_id, user_id, answers, time_spent, user
             "submitted_at": datetime.utcnow(),
             "processed": True
         }
-        
-        process_results_collection.insert_one(result_data)
+        if dedupe_key:
+            result_data["dedupe_key"] = dedupe_key
         
         percentage = (total_score / max_score * 100) if max_score > 0 else 0
         email_body = f"""
         <html>
         <body>
             <h2>Quiz Results</h2>
-            <p>Thank you for completing: <strong>{quiz.get('name', '')}</strong></p>
+            <p>Thank you for completing: <strong>{answer_key.name}</strong></p>
             <p><strong>Your Score:</strong> {total_score} / {max_score} ({percentage:.1f}%)</p>
             <p><strong>Time Spent:</strong> {time_spent} seconds</p>
         </body>
         </html>
         """
         
-        send_email(user_email, f"Quiz Results: {quiz.get('name', '')}", email_body)
-        print(f"Quiz {mongo_quiz_id} processed for user {user_id}")
+        result_writer.submit({
+            "result": result_data,
+            # Stored compactly (answer masks, no name copies); result keeps the full shape
+            "stored": compact_result(result_data, answer_key.question_ids()),
+            "stats": (answer_key.quiz_id, max_score, answer_key.duration_seconds),
+            "dedupe_key": dedupe_key,
+            "email": (user_email, f"Quiz Results: {answer_key.name}", email_body)
+        })
         
     except Exception as e:
         print(f"Error processing quiz: {str(e)}")
+        failed = {"submission_id": submission_id, "status": "failed", "user_id": user_id}
+        publish_submission_status(failed)
+        publish_result_ready(failed, answer_key.quiz_id)
+        if dedupe_key:
+            # Release the claim so the client may retry a failed submission
+            process_client = MongoClient(MONGO_URL)
+            process_client["quizplatform_db2"]["submissions"].delete_one({"_id": dedupe_key})
+            process_client.close()
+
+def rescore_quiz_in_background(quiz_id):
+    """Rescore stored results after an answer key change, then refresh summaries"""
+    try:
+        process_client = MongoClient(MONGO_URL)
+        process_db = process_client["quizplatform_db2"]
+        quiz = process_db["quizzes"].find_one({"quiz_id": quiz_id})
+        if not quiz:
+            print(f"Rescore: quiz {quiz_id} not found")
+            return
+        
+        stats = rescore_results(process_db["results"], quiz)
+        print(f"Rescore quiz {quiz_id}: {stats}")
+        # Also when no score changed: new points move the histogram bounds
+        rebuild_stats_document(process_db["results"], process_db["quiz_stats"], quiz)
+        if stats["changed"]:
+            rebuild_user_summaries(
+                process_db["results"],
+                process_db["user_stats"],
+                process_db["results"].distinct("user_id", {"quiz_id": str(quiz["_id"])})
+            )
+            if use_redis:
+                rebuild_leaderboard(redis_client, process_db["results"], quiz_id, str(quiz["_id"]))
+    except Exception as e:
+        print(f"Error rescoring quiz {quiz_id}: {str(e)}")
     finally:
         if 'process_client' in locals():
             process_client.close()
 
+def start_rescore(quiz_id):
+    run_in_background_process(rescore_quiz_in_background, quiz_id)
+
+def rebuild_stats_in_background(quiz_id):
+    """Rebuild the quiz_stats document after its histogram bounds changed"""
+    try:
+        process_client = MongoClient(MONGO_URL)
+        process_db = process_client["quizplatform_db2"]
+        quiz = process_db["quizzes"].find_one({"quiz_id": quiz_id})
+        if quiz:
+            count = rebuild_stats_document(process_db["results"], process_db["quiz_stats"], quiz)
+            print(f"Statistics of quiz {quiz_id} rebuilt from {count} results")
+    except Exception as e:
+        print(f"Error rebuilding statistics of quiz {quiz_id}: {str(e)}")
+    finally:
+        if 'process_client' in locals():
+            process_client.close()
+
+def start_stats_rebuild(quiz_id):
+    run_in_background_process(rebuild_stats_in_background, quiz_id)
+
+def rebuild_leaderboard_in_background(quiz_id):
+    """Build a missing leaderboard; the caller already holds the rebuilding marker"""
+    try:
+        quiz = quiz_collection.find_one({"quiz_id": quiz_id}, {"_id": 1})
+        if not quiz:
+            release_rebuild(redis_client, quiz_id)
+            return
+        count = rebuild_leaderboard(redis_client, results_collection, quiz_id, str(quiz["_id"]))
+        print(f"Leaderboard of quiz {quiz_id} rebuilt from {count} results")
+    except Exception as e:
+        print(f"Error rebuilding leaderboard of quiz {quiz_id}: {str(e)}")
+        try:
+            release_rebuild(redis_client, quiz_id)
+        except redis.RedisError:
+            pass
+
+def start_leaderboard_rebuild(quiz_id):
+    """Rebuild a quiz's leaderboard once a read or write found it missing
+
+    The rebuilding marker doubles as the lock, so concurrent requests start one rebuild.
+    """
+    if not use_redis:
+        return False
+    try:
+        if not claim_rebuild(redis_client, quiz_id):
+            return False
+    except redis.RedisError:
+        return False
+    threading.Thread(target=rebuild_leaderboard_in_background, args=(quiz_id,), daemon=True).start()
+    return True
+
 # ENDPOINTS
 @app.route("/health", methods=["GET"])
 def health():
@@ -155,6 +534,51 @@ def health():
     except:
         return {"status": "error"}, 500
 
+@app.route("/diagnostics/indexes", methods=["GET"])
+def index_diagnostics():
+    """Show indexes and explain() plans for the hot queries"""
+    try:
+        quiz = None
+        if request.args.get("quiz_id"):
+            quiz = quiz_collection.find_one({"quiz_id": int(request.args["quiz_id"])}, {"_id": 1, "quiz_id": 1})
+        else:
+            quiz = quiz_collection.find_one({}, {"_id": 1, "quiz_id": 1})
+        
+        user_id = request.args.get("user_id")
+        if user_id is None:
+            sample = results_collection.find_one({}, {"user_id": 1})
+            user_id = sample["user_id"] if sample else None
+        
+        return jsonify({
+            "indexes": list_indexes(db),
+            "last_ensure_report": index_report,
+            "plans": explain_hot_queries(
+                db,
+                quiz_id=quiz["quiz_id"] if quiz else None,
+                mongo_quiz_id=str(quiz["_id"]) if quiz else None,
+                user_id=user_id
+            )
+        }), 200
+    except ValueError:
+        return {"error": "Invalid quiz ID"}, 400
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@app.route("/diagnostics/mail", methods=["GET"])
+def mail_diagnostics():
+    """Mail dispatcher throughput and queue depth"""
+    if not use_redis:
+        return {"error": "Mail queue requires Redis"}, 503
+    try:
+        return jsonify(mail_metrics(redis_client)), 200
+    except redis.RedisError as e:
+        return {"error": str(e)}, 503
+
+@app.route("/diagnostics/writer", methods=["GET"])
+def writer_diagnostics():
+    """Batched result writer: flushes, batch sizes, worst queue wait"""
+    return jsonify(result_writer.snapshot()), 200
+
 @app.route("/quizzes/sync", methods=["POST"])
 def sync_quiz():
     """Sync quiz from main backend to MongoDB"""
@@ -180,136 +604,329 @@ def sync_quiz():
         }
         
         if existing:
-            # Update existing
+            # Update existing; the version bump invalidates compiled answer keys
             quiz_collection.update_one(
                 {"_id": existing["_id"]},
-                {"$set": quiz_doc}
+                {"$set": quiz_doc, "$inc": {"version": 1}}
             )
-            return {"message": "Quiz updated", "mongo_id": str(existing["_id"])}, 200
+            answer_keys.invalidate(data["id"])
+            
+            # Corrected answer key: rescore results recorded with the old one
+            rescoring = answer_key_changed(existing, dict(quiz_doc, _id=existing["_id"]))
+            if rescoring:
+                start_rescore(data["id"])
+            elif quiz_stats_filter(existing) != quiz_stats_filter(quiz_doc):
+                # New duration: the statistics document needs new histogram bounds
+                start_stats_rebuild(data["id"])
+            return {
+                "message": "Quiz updated",
+                "mongo_id": str(existing["_id"]),
+                "rescoring": rescoring
+            }, 200
         else:
             # Insert new
+            quiz_doc["version"] = 1
             result = quiz_collection.insert_one(quiz_doc)
+            # A new quiz has no results yet, so its statistics document and leaderboard start complete
+            init_stats_document(stats_collection, quiz_doc)
+            if use_redis:
+                try:
+                    init_leaderboard(redis_client, data["id"])
+                except redis.RedisError as e:
+                    print(f"Leaderboard of quiz {data['id']} not initialized: {str(e)}")
             return {"message": "Quiz synced", "mongo_id": str(result.inserted_id)}, 201
             
     except Exception as e:
         return {"error": str(e)}, 500
 
+@app.route("/quizzes/<quiz_id>/rescore", methods=["POST"])
+def rescore_quiz(quiz_id):
+    """Rescore all stored results against the quiz's current answer key"""
+    try:
+        quiz = quiz_collection.find_one({"quiz_id": int(quiz_id)}, {"_id": 1})
+        if not quiz:
+            return {"error": "Quiz not found"}, 404
+        start_rescore(int(quiz_id))
+        return {"message": "Rescoring started", "status": "processing"}, 202
+    except ValueError:
+        return {"error": "Invalid quiz ID format"}, 400
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+SUBMIT_REQUIRED_FIELDS = ["user_id", "answers", "time_spent", "user_email", "user_name"]
+
+def submission_claim(dedupe_key, submission_id, answer_key, user_id):
+    """Document claiming a dedupe key for a submission (_id = dedupe key)"""
+    return {
+        "_id": dedupe_key,
+        "submission_id": submission_id,
+        "quiz_id": answer_key.quiz_id,
+        "user_id": user_id,
+        # TTL field (claimed_at_ttl index)
+        "claimed_at": datetime.utcnow()
+    }
+
+def duplicate_submission_response(original_id, status):
+    status = status or {"submission_id": original_id, "status": "processing"}
+    return dict(status, message="Duplicate submission, returning original status", duplicate=True)
+
+def start_submission(submission_id, answer_key, data, dedupe_key):
+    """Publish the processing status and start the scoring process"""
+    publish_submission_status({
+        "submission_id": submission_id,
+        "status": "processing",
+        "quiz_name": answer_key.name,
+        "user_id": data["user_id"],
+        "submitted_at": datetime.utcnow().isoformat()
+    })
+    
+    # Start async processing in separate process
+    result_writer.start()
+    run_in_background_process(
+        process_quiz_in_background,
+        submission_id,
+        answer_key,
+        data["user_id"],
+        data["answers"],
+        data["time_spent"],
+        data["user_email"],
+        data["user_name"],
+        dedupe_key
+    )
+    
+    return {
+        "message": "Quiz submitted. Results will be emailed.",
+        "status": "processing",
+        "submission_id": submission_id
+    }
+
 @app.route("/quizzes/<quiz_id>/submit", methods=["POST"])
 def submit_quiz(quiz_id):
     """Submit quiz - async processing with multiprocessing.Process"""
     try:
         data = request.json
-        required = ["user_id", "answers", "time_spent", "user_email", "user_name"]
-        for field in required:
+        for field in SUBMIT_REQUIRED_FIELDS:
             if field not in data:
                 return {"error": f"Missing: {field}"}, 400
         
         # Find quiz by integer quiz_id (not MongoDB ObjectId)
-        quiz = quiz_collection.find_one({"quiz_id": int(quiz_id)})
-        if not quiz:
+        answer_key = answer_keys.get(int(quiz_id))
+        if not answer_key:
             return {"error": "Quiz not found in results database. Make sure the quiz is approved."}, 404
         
-        # Start async processing in separate process
-        process = Process(
-            target=process_quiz_in_background,
-            args=(
-                str(quiz["_id"]),  # Pass MongoDB ObjectId as string
-                data["user_id"],
-                data["answers"],
-                data["time_spent"],
-                data["user_email"],
-                data["user_name"]
-            )
+        submission_id = uuid.uuid4().hex
+        dedupe_key = submission_dedupe_key(
+            data["user_id"],
+            answer_key.quiz_id,
+            request.headers.get("Idempotency-Key") or data.get("idempotency_key"),
+            data.get("started_at")
         )
-        process.start()
+        if dedupe_key:
+            # Claim the key before any work; a retry finds the original submission
+            try:
+                submissions_collection.insert_one(
+                    submission_claim(dedupe_key, submission_id, answer_key, data["user_id"])
+                )
+            except DuplicateKeyError:
+                claim = submissions_collection.find_one({"_id": dedupe_key}) or {}
+                original_id = claim.get("submission_id")
+                status = load_submission_status(original_id) if original_id else None
+                return duplicate_submission_response(original_id, status), 200
         
-        return {
-            "message": "Quiz submitted. Results will be emailed.",
-            "status": "processing"
-        }, 202
+        return start_submission(submission_id, answer_key, data, dedupe_key), 202
     except ValueError:
         return {"error": "Invalid quiz ID format"}, 400
     except Exception as e:
         return {"error": str(e)}, 500
 
+@app.route("/submissions/<submission_id>", methods=["GET"])
+def get_submission(submission_id):
+    """Get submission status, optionally long-polling with ?wait=<seconds>"""
+    try:
+        wait = min(max(int(request.args.get("wait", 0)), 0), SUBMISSION_MAX_WAIT_SECONDS)
+    except ValueError:
+        return {"error": "Invalid wait value"}, 400
+    
+    try:
+        status = wait_for_submission(submission_id, wait)
+        if status is None:
+            return {"error": "Submission not found"}, 404
+        return jsonify(status), 200
+    except Exception as e:
+        return {"error": str(e)}, 500
+
 @app.route("/quizzes/<quiz_id>/results", methods=["GET"])
 def get_quiz_results(quiz_id):
-    """Get leaderboard for a quiz"""
+    """Get leaderboard page for a quiz
+    Query params:
+        limit: page size (default 50, max 200)
+        cursor: next_cursor from the previous page
+        best: 1 to return only the best attempt per user
+    """
+    try:
+        limit = parse_page_size(request.args.get("limit"))
+        cursor = request.args.get("cursor")
+        best_only = request.args.get("best", "0") in ("1", "true")
+    except ValueError:
+        return {"error": "Invalid limit"}, 400
+    
+    empty_page = {"results": [], "next_cursor": None, "limit": limit}
     try:
+        # Served from the materialized sorted set when available
+        if use_redis:
+            try:
+                page = read_page(redis_client, int(quiz_id), limit, cursor, best_only)
+                if page is not None:
+                    results, next_cursor = page
+                    return jsonify({"results": results, "next_cursor": next_cursor, "limit": limit}), 200
+            except redis.RedisError as e:
+                print(f"Leaderboard cache unavailable, falling back to MongoDB: {str(e)}")
+        
         # Find by quiz_id field (integer from main DB)
-        quiz = quiz_collection.find_one({"quiz_id": int(quiz_id)})
+        quiz = quiz_collection.find_one({"quiz_id": int(quiz_id)}, {"_id": 1})
         if not quiz:
-            return jsonify([]), 200
+            return jsonify(empty_page), 200
+        
+        if use_redis:
+            start_leaderboard_rebuild(int(quiz_id))
         
         # Use MongoDB _id for results query
         mongo_id = str(quiz["_id"])
-        results = list(
-            results_collection.find({"quiz_id": mongo_id})
-            .sort([("score", DESCENDING), ("time_spent", 1)])
-        )
+        fetch = fetch_best_page if best_only else fetch_page
+        results, next_cursor = fetch(results_collection, mongo_id, limit, cursor)
         for r in results:
             serialize_mongo_doc(r)
-        return jsonify(results), 200
+        return jsonify({"results": results, "next_cursor": next_cursor, "limit": limit}), 200
+    except ValueError as e:
+        if cursor:
+            return {"error": str(e)}, 400
+        return jsonify(empty_page), 200
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@app.route("/quizzes/<quiz_id>/results/export", methods=["GET"])
+def export_quiz_results(quiz_id):
+    """Stream all results of a quiz as a chunked response
+    Query params:
+        format: ndjson (default) or csv
+        answers: 1 to include the submitted answers
+    """
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        return {"error": f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}"}, 400
+    include_answers = request.args.get("answers", "0") in ("1", "true")
+    
+    try:
+        quiz = quiz_collection.find_one({"quiz_id": int(quiz_id)}, {"_id": 1})
     except ValueError:
-        return jsonify([]), 200
+        return {"error": "Invalid quiz ID"}, 400
+    if not quiz:
+        return {"error": "Quiz not found"}, 404
+    
+    return Response(
+        stream_with_context(stream_export(results_collection, str(quiz["_id"]), export_format, include_answers)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename=quiz_{quiz_id}_results.{export_format}"}
+    )
+
+@app.route("/quizzes/<quiz_id>/results/rank/<user_id>", methods=["GET"])
+def get_user_rank(quiz_id, user_id):
+    """Get a user's leaderboard rank with ?around=<n> neighbours on each side"""
+    if not use_redis:
+        return {"error": "Leaderboard cache unavailable"}, 503
+    try:
+        around = min(max(int(request.args.get("around", 0)), 0), 50)
+        rank = user_rank(redis_client, int(quiz_id), user_id, around)
+        if rank is None:
+            if not leaderboard_ready(redis_client, int(quiz_id)):
+                start_leaderboard_rebuild(int(quiz_id))
+                return {"error": "Leaderboard is being rebuilt, retry shortly"}, 503, {"Retry-After": "5"}
+            return {"error": "User has no result for this quiz"}, 404
+        return jsonify(rank), 200
+    except ValueError:
+        return {"error": "Invalid quiz ID or around value"}, 400
     except Exception as e:
         return {"error": str(e)}, 500
 
 @app.route("/users/<user_id>/results", methods=["GET"])
 def get_user_results(user_id):
-    """Get all results for a user"""
+    """Get a page of a user's results, newest first
+    Query params:
+        limit: page size (default 50, max 200)
+        cursor: next_cursor from the previous page
+        quiz_id: only results of this quiz (integer ID from main DB)
+        include_archived: 1 to continue into archived results after the recent ones
+    """
+    try:
+        limit = parse_page_size(request.args.get("limit"))
+        quiz_id = request.args.get("quiz_id", type=int)
+    except ValueError:
+        return {"error": "Invalid limit"}, 400
+    cursor = request.args.get("cursor")
+    include_archived = request.args.get("include_archived", "0") in ("1", "true")
+    
     try:
-        results = list(
-            results_collection.find({"user_id": user_id})
-            .sort("submitted_at", DESCENDING)
+        mongo_quiz_id = None
+        if quiz_id is not None:
+            quiz = quiz_collection.find_one({"quiz_id": quiz_id}, {"_id": 1})
+            if not quiz:
+                return jsonify({"results": [], "next_cursor": None, "limit": limit}), 200
+            mongo_quiz_id = str(quiz["_id"])
+        
+        results, next_cursor = fetch_user_page(
+            results_collection, user_id, limit, cursor, mongo_quiz_id, include_archived
         )
         for r in results:
             serialize_mongo_doc(r)
-        return jsonify(results), 200
+        return jsonify({"results": results, "next_cursor": next_cursor, "limit": limit}), 200
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@app.route("/users/<user_id>/summary", methods=["GET"])
+def get_user_summary(user_id):
+    """Per-user totals from the maintained user_stats document (aggregated until it is complete)"""
+    try:
+        return jsonify(load_user_summary(results_collection, user_stats_collection, user_id)), 200
     except Exception as e:
         return {"error": str(e)}, 500
 
 @app.route("/quizzes/<quiz_id>/statistics", methods=["GET"])
 def get_quiz_statistics(quiz_id):
-    """Get statistics for a quiz"""
+    """Get statistics for a quiz
+    Served from the incrementally maintained quiz_stats document; quizzes
+    without a complete one for their current bounds (not yet backfilled, or
+    points/duration changed) fall back to the aggregation pipeline.
+    """
     try:
         # Find by quiz_id field (integer from main DB)
-        quiz = quiz_collection.find_one({"quiz_id": int(quiz_id)})
+        quiz = quiz_collection.find_one(
+            {"quiz_id": int(quiz_id)},
+            {"quiz_id": 1, "questions.points": 1, "duration_seconds": 1}
+        )
         if not quiz:
-            return {
-                "quiz_id": quiz_id,
-                "total_attempts": 0,
-                "average_score": 0,
-                "average_time": 0,
-                "highest_score": 0,
-                "lowest_score": 0
-            }, 200
-        
-        # Use MongoDB _id for results query
-        mongo_id = str(quiz["_id"])
-        results = list(results_collection.find({"quiz_id": mongo_id}))
-        
-        if not results:
-            return {
-                "quiz_id": quiz_id,
-                "total_attempts": 0,
-                "average_score": 0,
-                "average_time": 0,
-                "highest_score": 0,
-                "lowest_score": 0
-            }, 200
+            return jsonify(empty_statistics(quiz_id)), 200
         
-        scores = [r["score"] for r in results]
-        times = [r["time_spent"] for r in results]
+        stats_doc = stats_collection.find_one(quiz_stats_filter(quiz))
+        if stats_doc:
+            return jsonify(statistics_from_document(stats_doc, quiz_id)), 200
         
-        return jsonify({
-            "quiz_id": quiz_id,
-            "total_attempts": len(results),
-            "average_score": sum(scores) / len(results),
-            "average_time": sum(times) / len(results),
-            "highest_score": max(scores),
-            "lowest_score": min(scores)
-        }), 200
+        return jsonify(compute_statistics(results_collection, quiz, quiz_id)), 200
+    except ValueError:
+        return {"error": "Invalid quiz ID"}, 400
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@app.route("/quizzes/<quiz_id>/analytics", methods=["GET"])
+def get_quiz_analytics(quiz_id):
+    """Per-question difficulty, discrimination and option distribution"""
+    try:
+        report = get_item_analytics(quiz_collection, results_collection, analytics_collection, int(quiz_id))
+        if report is None:
+            return {"error": "Quiz not found"}, 404
+        report = serialize_mongo_doc(dict(report, computed_at=report["computed_at"].isoformat()))
+        return jsonify(report), 200
     except ValueError:
         return {"error": "Invalid quiz ID"}, 400
     except Exception as e:
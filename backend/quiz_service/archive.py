@@ -0,0 +1,151 @@
+"""Tiered archival of old results
+
+Results older than RESULTS_ARCHIVE_AFTER_DAYS move from results into the cold
+results_archive collection, bucketed per user and calendar month. A month is
+split over numbered buckets of at most RESULTS_ARCHIVE_BUCKET_SIZE results, so
+a heavy player never pushes a bucket towards the 16 MB document limit:
+
+    _id                 "<user_id>:<YYYY-MM>:<seq>"
+    user_id, bucket     month start (UTC)
+    seq, count          bucket number within the month (from 1), results held
+    first_submitted_at, last_submitted_at
+    results             the moved result documents, unchanged (either encoding)
+
+Buckets written before the cap ("<user_id>:<YYYY-MM>", no seq) are read as
+before but never appended to.
+
+The hot collection, and every index on it, then only covers recent results.
+quiz_stats, user_stats and the Redis leaderboards are left as they are. Every
+path that computes totals or rankings from results reads the archive too
+(archived_results_union): the rebuilds, the statistics and leaderboard
+fallbacks and item analytics, so archiving never changes what they return.
+Archived results are not rescored.
+
+Usage:
+    python manage.py archive-results [--older-than-days N] [--batch-size N] [--pause SECONDS]
+"""
+import os
+import time
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+ARCHIVE_COLLECTION = "results_archive"
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("RESULTS_ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("RESULTS_ARCHIVE_BATCH_SIZE", "1000"))
+# Pause between batches so archiving never saturates the primary
+ARCHIVE_PAUSE_SECONDS = float(os.getenv("RESULTS_ARCHIVE_PAUSE_SECONDS", "0.5"))
+ARCHIVE_BUCKET_SIZE = int(os.getenv("RESULTS_ARCHIVE_BUCKET_SIZE", "200"))
+
+
+def month_bucket(submitted_at):
+    return submitted_at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def bucket_id(user_id, submitted_at, seq):
+    return f"{user_id}:{submitted_at:%Y-%m}:{seq}"
+
+
+def archived_results_union(match, projection=None, stages=()):
+    """$unionWith stage appending the archived results that match (results-shaped documents)
+
+    stages run on the archived results before the union, e.g. a $sort/$limit
+    that keeps a page query from pulling in the whole archive.
+    """
+    # Buckets carry user_id at the top level (user_bucket index), anything else is per result;
+    # operators ($or of a page cursor) only filter the unwound results
+    bucket_match = {
+        field if field == "user_id" else f"results.{field}": value
+        for field, value in match.items() if not field.startswith("$")
+    }
+    pipeline = [
+        {"$match": bucket_match},
+        {"$unwind": "$results"},
+        {"$replaceRoot": {"newRoot": "$results"}},
+        {"$match": match},
+    ]
+    if projection:
+        pipeline.append({"$project": projection})
+    pipeline += stages
+    return {"$unionWith": {"coll": ARCHIVE_COLLECTION, "pipeline": pipeline}}
+
+
+def _open_buckets(archive_collection, groups):
+    """Newest bucket {(user_id, month): (seq, count)} per group, and the result ids already archived there"""
+    open_buckets, archived = {}, set()
+    for bucket in archive_collection.find(
+        {"user_id": {"$in": list({user_id for user_id, _ in groups})},
+         "bucket": {"$in": list({month for _, month in groups})}},
+        {"user_id": 1, "bucket": 1, "seq": 1, "count": 1, "results._id": 1}
+    ):
+        key = (bucket["user_id"], bucket["bucket"])
+        if key not in groups:
+            continue
+        archived.update(result["_id"] for result in bucket.get("results", []))
+        # Buckets from before the size cap have no seq and count as full
+        seq = bucket.get("seq", 0)
+        if seq >= open_buckets.get(key, (-1, 0))[0]:
+            open_buckets[key] = (seq, bucket.get("count", ARCHIVE_BUCKET_SIZE) if seq else ARCHIVE_BUCKET_SIZE)
+    return open_buckets, archived
+
+
+def _archive_batch(results_collection, archive_collection, batch):
+    groups = {}
+    for doc in batch:
+        groups.setdefault((doc["user_id"], month_bucket(doc["submitted_at"])), []).append(doc)
+    open_buckets, archived = _open_buckets(archive_collection, groups)
+
+    writes = []
+    for (user_id, month), docs in groups.items():
+        # Results already moved by a run that crashed between write and delete
+        docs = [doc for doc in docs if doc["_id"] not in archived]
+        seq, count = open_buckets.get((user_id, month), (0, ARCHIVE_BUCKET_SIZE))
+        while docs:
+            if count >= ARCHIVE_BUCKET_SIZE:
+                seq, count = seq + 1, 0
+            chunk, docs = docs[:ARCHIVE_BUCKET_SIZE - count], docs[ARCHIVE_BUCKET_SIZE - count:]
+            count += len(chunk)
+            writes.append(UpdateOne(
+                {"_id": bucket_id(user_id, month, seq)},
+                {
+                    "$setOnInsert": {"user_id": user_id, "bucket": month, "seq": seq},
+                    "$push": {"results": {"$each": chunk}},
+                    "$inc": {"count": len(chunk)},
+                    "$min": {"first_submitted_at": min(doc["submitted_at"] for doc in chunk)},
+                    "$max": {"last_submitted_at": max(doc["submitted_at"] for doc in chunk)},
+                },
+                upsert=True,
+            ))
+    if writes:
+        archive_collection.bulk_write(writes, ordered=False)
+    results_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+    return len(writes)
+
+
+def archive_results(results_collection, older_than_days=ARCHIVE_AFTER_DAYS,
+                    batch_size=ARCHIVE_BATCH_SIZE, pause_seconds=ARCHIVE_PAUSE_SECONDS, max_batches=None):
+    """Move results submitted before now - older_than_days into the archive, oldest first"""
+    archive_collection = results_collection.database[ARCHIVE_COLLECTION]
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    stats = {"cutoff": cutoff, "archived": 0, "buckets_touched": 0, "batches": 0}
+    start = time.perf_counter()
+
+    while max_batches is None or stats["batches"] < max_batches:
+        # Served by the submitted_at_id index; each batch is re-queried since moved documents are gone
+        batch = list(
+            results_collection.find({"submitted_at": {"$lt": cutoff}})
+            .sort([("submitted_at", 1), ("_id", 1)])
+            .limit(batch_size)
+        )
+        if not batch:
+            break
+        stats["buckets_touched"] += _archive_batch(results_collection, archive_collection, batch)
+        stats["archived"] += len(batch)
+        stats["batches"] += 1
+        if len(batch) < batch_size:
+            break
+        time.sleep(pause_seconds)
+
+    stats["elapsed_seconds"] = time.perf_counter() - start
+    return stats
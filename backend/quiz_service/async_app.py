@@ -0,0 +1,396 @@
+"""Asyncio serving mode for the quiz service
+
+Serves the request-heavy endpoints natively on asyncio (Motor for MongoDB,
+redis.asyncio for submission status and long-polling), with the same paths and
+JSON contracts as app.py. Every other route (sync, rescore, analytics, export,
+diagnostics) falls through to the Flask app over an ASGI->WSGI bridge.
+
+Usage:
+    python async_app.py            # uvicorn on QUIZ_SERVICE_PORT (default 5001)
+    python benchmarks.py load ...  # compare against `python app.py`
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+
+import redis
+import redis.asyncio as aioredis
+import uvicorn
+from asgiref.wsgi import WsgiToAsgi
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+
+import app as sync_app
+from leaderboard import (
+    best_page_pipeline,
+    page_pipeline,
+    parse_page_size,
+    split_page
+)
+from leaderboard_store import read_page, user_rank, leaderboard_ready
+from quiz_processor import HEAD_PROJECTION
+from result_codec import apply_decoding, name_lookups
+from quiz_stats import (
+    empty_statistics,
+    quiz_bounds,
+    quiz_max_score,
+    quiz_stats_filter,
+    statistics_from_document,
+    statistics_from_facets,
+    statistics_pipeline
+)
+from user_results import (
+    USER_RESULT_PROJECTION,
+    USER_RESULT_SORT,
+    fetch_user_page,
+    split_user_page,
+    summary_from_document,
+    user_page_query,
+    user_summary_pipeline
+)
+
+client = AsyncIOMotorClient(sync_app.MONGO_URL)
+db = client["quizplatform_db2"]
+quiz_collection = db["quizzes"]
+results_collection = db["results"]
+stats_collection = db["quiz_stats"]
+submissions_collection = db["submissions"]
+user_stats_collection = db["user_stats"]
+
+aredis = aioredis.Redis.from_url(sync_app.REDIS_URL, decode_responses=True) if sync_app.use_redis else None
+
+
+def json_default(value):
+    """Values Flask's jsonify handles but json.dumps does not (e.g. rescored_at, nested ids)"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSONResponse for documents read from MongoDB"""
+
+    def render(self, content):
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=json_default
+        ).encode("utf-8")
+
+
+def error(message, status_code):
+    return MongoJSONResponse({"error": message}, status_code=status_code)
+
+
+async def decode_results(docs):
+    """Async counterpart of result_codec.decode_results (names only, no answers)"""
+    quiz_ids, user_ids = name_lookups(docs)
+    quiz_names, user_names = {}, {}
+    if quiz_ids:
+        async for quiz in quiz_collection.find({"_id": {"$in": list(quiz_ids)}}, {"name": 1}):
+            quiz_names[str(quiz["_id"])] = quiz.get("name", "")
+    if user_ids:
+        async for player in db["players"].find({"_id": {"$in": list(user_ids)}}):
+            user_names[player["_id"]] = player.get("name", "")
+    return apply_decoding(docs, quiz_names, user_names)
+
+
+async def load_submission_status(submission_id):
+    """Return submission status from Redis, else from the stored result or the submission claim"""
+    if aredis:
+        try:
+            cached = await aredis.get(sync_app.submission_key(submission_id))
+            if cached:
+                return json.loads(cached)
+        except redis.RedisError:
+            pass
+
+    result = await results_collection.find_one({"submission_id": submission_id}, {"answers": 0, "masks": 0})
+    if result:
+        return sync_app.result_to_status((await decode_results([result]))[0])
+
+    claim = await submissions_collection.find_one({"submission_id": submission_id})
+    if claim and claim.get("duplicate_of"):
+        status = await load_submission_status(claim["duplicate_of"])
+        return dict(status, submission_id=submission_id, duplicate_of=claim["duplicate_of"]) if status else None
+    return sync_app.claim_status(claim) if claim else None
+
+
+async def wait_for_submission(submission_id, wait_seconds):
+    """Long-poll without holding a thread: awaits the Redis status channel"""
+    status = await load_submission_status(submission_id)
+    if status is None or status["status"] != "processing" or wait_seconds <= 0:
+        return status
+
+    deadline = time.monotonic() + wait_seconds
+    if aredis:
+        pubsub = aredis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(sync_app.submission_key(submission_id))
+            # Re-check after subscribing so a result published in between is not missed
+            status = await load_submission_status(submission_id)
+            while status and status["status"] == "processing":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                message = await pubsub.get_message(timeout=remaining)
+                if message and message["type"] == "message":
+                    status = json.loads(message["data"])
+            return status
+        except redis.RedisError:
+            pass
+        finally:
+            await pubsub.close()
+
+    while status and status["status"] == "processing" and time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+        status = await load_submission_status(submission_id)
+    return status
+
+
+async def get_answer_key(quiz_id):
+    """Async counterpart of AnswerKeyCache.get sharing the same per-process cache"""
+    head = await quiz_collection.find_one({"quiz_id": quiz_id}, HEAD_PROJECTION)
+    cached = sync_app.answer_keys.cached(quiz_id, head)
+    if cached or not head:
+        return cached
+    quiz = await quiz_collection.find_one({"_id": head["_id"]})
+    return sync_app.answer_keys.store(quiz_id, quiz) if quiz else None
+
+
+# ENDPOINTS
+async def health(request):
+    try:
+        await client.admin.command("ping")
+        return MongoJSONResponse({"status": "quiz-service-ok", "mongodb": "connected", "mode": "async"})
+    except Exception:
+        return MongoJSONResponse({"status": "error"}, status_code=500)
+
+
+async def submit_quiz(request):
+    try:
+        data = await request.json()
+        for field in sync_app.SUBMIT_REQUIRED_FIELDS:
+            if field not in data:
+                return error(f"Missing: {field}", 400)
+
+        answer_key = await get_answer_key(int(request.path_params["quiz_id"]))
+        if not answer_key:
+            return error("Quiz not found in results database. Make sure the quiz is approved.", 404)
+
+        submission_id = uuid.uuid4().hex
+        dedupe_key = sync_app.submission_dedupe_key(
+            data["user_id"],
+            answer_key.quiz_id,
+            request.headers.get("Idempotency-Key") or data.get("idempotency_key"),
+            data.get("started_at")
+        )
+        if dedupe_key:
+            try:
+                await submissions_collection.insert_one(
+                    sync_app.submission_claim(dedupe_key, submission_id, answer_key, data["user_id"])
+                )
+            except DuplicateKeyError:
+                claim = await submissions_collection.find_one({"_id": dedupe_key}) or {}
+                original_id = claim.get("submission_id")
+                status = await load_submission_status(original_id) if original_id else None
+                return MongoJSONResponse(sync_app.duplicate_submission_response(original_id, status))
+
+        # Publishing the status and handing the job to the pool block briefly, keep them off the event loop
+        accepted = await asyncio.to_thread(sync_app.start_submission, submission_id, answer_key, data, dedupe_key)
+        return MongoJSONResponse(accepted, status_code=202)
+    except ValueError:
+        return error("Invalid quiz ID format", 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def get_submission(request):
+    try:
+        wait = min(max(int(request.query_params.get("wait", 0)), 0), sync_app.SUBMISSION_MAX_WAIT_SECONDS)
+    except ValueError:
+        return error("Invalid wait value", 400)
+
+    try:
+        status = await wait_for_submission(request.path_params["submission_id"], wait)
+        if status is None:
+            return error("Submission not found", 404)
+        return MongoJSONResponse(status)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def get_quiz_results(request):
+    quiz_id = request.path_params["quiz_id"]
+    try:
+        limit = parse_page_size(request.query_params.get("limit"))
+        cursor = request.query_params.get("cursor")
+        best_only = request.query_params.get("best", "0") in ("1", "true")
+    except ValueError:
+        return error("Invalid limit", 400)
+
+    empty_page = {"results": [], "next_cursor": None, "limit": limit}
+    try:
+        if sync_app.use_redis:
+            try:
+                page = await asyncio.to_thread(read_page, sync_app.redis_client, int(quiz_id), limit, cursor, best_only)
+                if page is not None:
+                    results, next_cursor = page
+                    return MongoJSONResponse({"results": results, "next_cursor": next_cursor, "limit": limit})
+            except redis.RedisError as e:
+                print(f"Leaderboard cache unavailable, falling back to MongoDB: {str(e)}")
+
+        quiz = await quiz_collection.find_one({"quiz_id": int(quiz_id)}, {"_id": 1})
+        if not quiz:
+            return MongoJSONResponse(empty_page)
+
+        if sync_app.use_redis:
+            await asyncio.to_thread(sync_app.start_leaderboard_rebuild, int(quiz_id))
+
+        mongo_id = str(quiz["_id"])
+        if best_only:
+            rows = await results_collection.aggregate(
+                best_page_pipeline(mongo_id, limit, cursor), allowDiskUse=True
+            ).to_list(None)
+        else:
+            rows = await results_collection.aggregate(page_pipeline(mongo_id, limit, cursor)).to_list(None)
+        results, next_cursor = split_page(rows, limit)
+        for r in await decode_results(results):
+            sync_app.serialize_mongo_doc(r)
+        return MongoJSONResponse({"results": results, "next_cursor": next_cursor, "limit": limit})
+    except ValueError as e:
+        if cursor:
+            return error(str(e), 400)
+        return MongoJSONResponse(empty_page)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def get_user_rank(request):
+    if not sync_app.use_redis:
+        return error("Leaderboard cache unavailable", 503)
+    try:
+        around = min(max(int(request.query_params.get("around", 0)), 0), 50)
+        quiz_id = int(request.path_params["quiz_id"])
+        rank = await asyncio.to_thread(
+            user_rank, sync_app.redis_client, quiz_id, request.path_params["user_id"], around
+        )
+        if rank is None:
+            if not await asyncio.to_thread(leaderboard_ready, sync_app.redis_client, quiz_id):
+                await asyncio.to_thread(sync_app.start_leaderboard_rebuild, quiz_id)
+                return MongoJSONResponse(
+                    {"error": "Leaderboard is being rebuilt, retry shortly"}, status_code=503, headers={"Retry-After": "5"}
+                )
+            return error("User has no result for this quiz", 404)
+        return MongoJSONResponse(rank)
+    except ValueError:
+        return error("Invalid quiz ID or around value", 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def get_user_results(request):
+    user_id = request.path_params["user_id"]
+    try:
+        limit = parse_page_size(request.query_params.get("limit"))
+        quiz_id = request.query_params.get("quiz_id")
+        quiz_id = int(quiz_id) if quiz_id else None
+    except ValueError:
+        return error("Invalid limit", 400)
+    cursor = request.query_params.get("cursor")
+
+    try:
+        mongo_quiz_id = None
+        if quiz_id is not None:
+            quiz = await quiz_collection.find_one({"quiz_id": quiz_id}, {"_id": 1})
+            if not quiz:
+                return MongoJSONResponse({"results": [], "next_cursor": None, "limit": limit})
+            mongo_quiz_id = str(quiz["_id"])
+
+        if request.query_params.get("include_archived", "0") in ("1", "true"):
+            # Cold path, served by the sync implementation off the event loop
+            results, next_cursor = await asyncio.to_thread(
+                fetch_user_page, sync_app.results_collection, user_id, limit, cursor, mongo_quiz_id, True
+            )
+        else:
+            rows = await results_collection.find(
+                user_page_query(user_id, cursor, mongo_quiz_id), USER_RESULT_PROJECTION
+            ).sort(USER_RESULT_SORT).limit(limit + 1).to_list(None)
+            results, next_cursor = split_user_page(rows, limit)
+            results = await decode_results(results)
+        for r in results:
+            sync_app.serialize_mongo_doc(r)
+        return MongoJSONResponse({"results": results, "next_cursor": next_cursor, "limit": limit})
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def get_user_summary(request):
+    user_id = request.path_params["user_id"]
+    try:
+        doc = await user_stats_collection.find_one({"_id": user_id, "complete": True})
+        if doc is None:
+            docs = await results_collection.aggregate(user_summary_pipeline({"user_id": user_id})).to_list(1)
+            doc = docs[0] if docs else None
+        return MongoJSONResponse(summary_from_document(doc, user_id))
+    except Exception as e:
+        return error(str(e), 500)
+
+
+async def get_quiz_statistics(request):
+    quiz_id = request.path_params["quiz_id"]
+    try:
+        quiz = await quiz_collection.find_one(
+            {"quiz_id": int(quiz_id)},
+            {"quiz_id": 1, "questions.points": 1, "duration_seconds": 1}
+        )
+        if not quiz:
+            return MongoJSONResponse(empty_statistics(quiz_id))
+
+        stats_doc = await stats_collection.find_one(quiz_stats_filter(quiz))
+        if stats_doc:
+            return MongoJSONResponse(statistics_from_document(stats_doc, quiz_id))
+
+        max_score = quiz_max_score(quiz)
+        score_bounds, time_bounds = quiz_bounds(max_score, quiz.get("duration_seconds"))
+        facets = await results_collection.aggregate(statistics_pipeline(quiz, score_bounds, time_bounds)).to_list(1)
+        return MongoJSONResponse(statistics_from_facets(facets[0] if facets else {}, quiz_id, max_score, score_bounds, time_bounds))
+    except ValueError:
+        return error("Invalid quiz ID", 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+
+routes = [
+    Route("/health", health, methods=["GET"]),
+    Route("/quizzes/{quiz_id}/submit", submit_quiz, methods=["POST"]),
+    Route("/submissions/{submission_id}", get_submission, methods=["GET"]),
+    Route("/quizzes/{quiz_id}/results", get_quiz_results, methods=["GET"]),
+    Route("/quizzes/{quiz_id}/results/rank/{user_id}", get_user_rank, methods=["GET"]),
+    Route("/quizzes/{quiz_id}/statistics", get_quiz_statistics, methods=["GET"]),
+    Route("/users/{user_id}/results", get_user_results, methods=["GET"]),
+    Route("/users/{user_id}/summary", get_user_summary, methods=["GET"]),
+    # Everything else is served by the Flask app
+    Mount("/", app=WsgiToAsgi(sync_app.app)),
+]
+
+# Only the backend calls the quiz service, so no CORS layer here (Flask routes keep theirs).
+# Background jobs (scoring, rescoring) go to a spawn-context pool instead of forking this process.
+application = Starlette(
+    routes=routes,
+    on_startup=[sync_app.start_process_pool],
+    on_shutdown=[sync_app.stop_process_pool],
+)
+
+
+if __name__ == "__main__":
+    uvicorn.run(application, host="0.0.0.0", port=int(os.getenv("QUIZ_SERVICE_PORT", "5001")))
@@ -0,0 +1,478 @@
+"""Microbenchmarks for the quiz service
+
+Usage:
+    python benchmarks.py scoring [--questions N] [--submissions N]
+    python benchmarks.py rescoring [--questions N] [--results N] [--batch-size N]
+    python benchmarks.py mail [--messages N] [--smtp-host HOST --smtp-port PORT]
+    python benchmarks.py encoding [--questions N] [--results N]
+    python benchmarks.py writes [--results N] [--batch-size N] [--flush-interval-ms N]
+    python benchmarks.py load --quiz-id ID [--target NAME=URL ...] [--concurrency N] [--requests N]
+
+Benchmarks that need no database run standalone; the rest use MONGODB_URL.
+"""
+import argparse
+import asyncio
+import os
+import random
+import smtplib
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from quiz_processor import AnswerKey
+
+
+def legacy_calculate_score(quiz, user_answers):
+    """calculate_score as it was before compiled answer keys (baseline)"""
+    total_score = 0
+    max_score = 0
+    for question in quiz.get("questions", []):
+        max_score += question.get("points", 0)
+        question_id = str(question.get("id", ""))
+        user_answer = user_answers.get(question_id, [])
+        if not isinstance(user_answer, list):
+            user_answer = [user_answer]
+        correct_answers = set()
+        for idx, answer in enumerate(question.get("answers", [])):
+            if answer.get("is_correct", False):
+                correct_answers.add(str(idx))
+        user_answer_set = set(str(ans) for ans in user_answer)
+        if user_answer_set == correct_answers:
+            total_score += question.get("points", 0)
+    return total_score, max_score
+
+
+def make_quiz(questions, answers_per_question=4, seed=42):
+    rng = random.Random(seed)
+    return {
+        "_id": "bench",
+        "quiz_id": 1,
+        "name": "Benchmark quiz",
+        "version": 1,
+        "duration_seconds": 600,
+        "questions": [
+            {
+                "id": q + 1,
+                "points": rng.randint(1, 5),
+                "answers": [{"is_correct": rng.random() < 0.3} for _ in range(answers_per_question)],
+            }
+            for q in range(questions)
+        ],
+    }
+
+
+def make_submissions(quiz, count, seed=7):
+    rng = random.Random(seed)
+    submissions = []
+    for _ in range(count):
+        submissions.append({
+            str(q["id"]): rng.sample(range(len(q["answers"])), rng.randint(0, 2))
+            for q in quiz["questions"]
+        })
+    return submissions
+
+
+def _timed(fn, submissions):
+    start = time.perf_counter()
+    for answers in submissions:
+        fn(answers)
+    return time.perf_counter() - start
+
+
+def bench_scoring(args):
+    """Legacy per-submission scoring vs compiled answer key"""
+    quiz = make_quiz(args.questions)
+    submissions = make_submissions(quiz, args.submissions)
+
+    key = AnswerKey(quiz)
+    for answers in submissions[:1000]:
+        assert key.score(answers) == legacy_calculate_score(quiz, answers)
+
+    legacy = _timed(lambda answers: legacy_calculate_score(quiz, answers), submissions)
+    compile_start = time.perf_counter()
+    key = AnswerKey(quiz)
+    compile_time = time.perf_counter() - compile_start
+    compiled = _timed(key.score, submissions)
+
+    per_legacy = legacy / len(submissions) * 1e6
+    per_compiled = compiled / len(submissions) * 1e6
+    print(f"questions={args.questions} submissions={args.submissions}")
+    print(f"legacy calculate_score: {per_legacy:8.2f} us/submission")
+    print(f"compiled AnswerKey:     {per_compiled:8.2f} us/submission (compile once: {compile_time * 1e6:.1f} us)")
+    print(f"speedup:                {per_legacy / per_compiled:8.2f}x")
+    return 0
+
+
+def bench_rescoring(args):
+    """Vectorized batch rescoring vs per-result compiled scoring (no database)"""
+    from rescoring import KeyMatrix, encode_answers, score_batch
+
+    quiz = make_quiz(args.questions)
+    key = AnswerKey(quiz)
+    key_matrix = KeyMatrix(key)
+    # One pool of distinct submissions, cycled to reach the requested result count
+    pool = make_submissions(quiz, args.batch_size)
+
+    check_selected, check_invalid = encode_answers(pool[:1000], key_matrix)
+    expected = [key.score(answers)[0] for answers in pool[:1000]]
+    assert list(score_batch(check_selected, check_invalid, key_matrix)) == expected
+
+    encode_time = score_time = per_result_time = 0.0
+    remaining = args.results
+    while remaining > 0:
+        batch = pool[:min(args.batch_size, remaining)]
+        start = time.perf_counter()
+        selected, invalid = encode_answers(batch, key_matrix)
+        encode_time += time.perf_counter() - start
+        start = time.perf_counter()
+        score_batch(selected, invalid, key_matrix)
+        score_time += time.perf_counter() - start
+        start = time.perf_counter()
+        for answers in batch:
+            key.score(answers)
+        per_result_time += time.perf_counter() - start
+        remaining -= len(batch)
+
+    vectorized = encode_time + score_time
+    print(f"questions={args.questions} results={args.results} batch_size={args.batch_size}")
+    print(f"encode (Python -> bool matrices): {encode_time:7.2f}s")
+    print(f"score (NumPy, whole batch):       {score_time:7.2f}s")
+    print(f"vectorized total:                 {vectorized:7.2f}s  ({args.results / vectorized:,.0f} results/s)")
+    print(f"per-result AnswerKey.score:       {per_result_time:7.2f}s  ({args.results / per_result_time:,.0f} results/s)")
+    return 0
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server that accepts and discards every message"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 sink ready")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.rstrip(b"\r\n")
+            if in_data:
+                if line == b".":
+                    in_data = False
+                    self.reply("250 OK")
+                continue
+            command = line[:4].upper()
+            if command == b"EHLO":
+                self.reply("250 sink")
+            elif command == b"DATA":
+                in_data = True
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+def _start_sink():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SinkHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+def bench_mail(args):
+    """Connection per email (old send_email) vs the dispatcher's pooled connection"""
+    from mailer import MailDispatcher
+
+    sink = None
+    host, port = args.smtp_host, args.smtp_port
+    if not host:
+        sink, port = _start_sink()
+        host = "127.0.0.1"
+
+    body = "<html><body><h2>Quiz Results</h2><p>Score: 7 / 10</p></body></html>"
+    messages = [
+        {"to": f"user{i}@example.com", "subject": "Quiz Results: Benchmark", "html": body, "attempts": 0}
+        for i in range(args.messages)
+    ]
+    # Dispatcher without Redis: only its message building and SMTP path are measured
+    dispatcher = MailDispatcher(None, host, port)
+    dispatcher._connect = lambda: smtplib.SMTP(host, port, timeout=10)
+
+    start = time.perf_counter()
+    for message in messages:
+        server = smtplib.SMTP(host, port, timeout=10)
+        server.send_message(dispatcher._build(message))
+        server.quit()
+    per_message = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message in messages:
+        dispatcher._send(message)
+    pooled = time.perf_counter() - start
+    dispatcher._close()
+
+    if sink:
+        sink.shutdown()
+    print(f"messages={args.messages} server={host}:{port}{' (built-in sink)' if sink else ''}")
+    print(f"connection per email: {per_message:7.2f}s  ({args.messages / per_message:,.0f} emails/s)")
+    print(f"pooled connection:    {pooled:7.2f}s  ({args.messages / pooled:,.0f} emails/s)")
+    return 0
+
+
+async def _load_run(session, method, url, payload_for, concurrency, total):
+    """Fire total requests with at most concurrency in flight; returns (seconds, latencies, errors)"""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url, json=payload_for(i) if payload_for else None) as response:
+                    await response.read()
+                    if response.status >= 400:
+                        errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, sorted(latencies), errors
+
+
+def bench_load(args):
+    """Leaderboard and submit throughput of the sync (Flask) vs async (ASGI) service"""
+    import aiohttp
+
+    run_id = int(time.time())
+
+    def submit_payload(i):
+        # Unique started_at per request, so idempotency does not collapse them
+        return {
+            "user_id": f"bench-{i % 500}",
+            "user_email": "bench@example.com",
+            "user_name": "Load Benchmark",
+            "answers": {},
+            "time_spent": 60,
+            "started_at": f"bench-{run_id}-{i}",
+        }
+
+    scenarios = [
+        ("leaderboard", "GET", f"/quizzes/{args.quiz_id}/results?limit=50", None),
+        ("submit", "POST", f"/quizzes/{args.quiz_id}/submit", submit_payload),
+    ]
+
+    async def run():
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        timeout = aiohttp.ClientTimeout(total=60)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            print(f"concurrency={args.concurrency} requests={args.requests} quiz_id={args.quiz_id}")
+            print(f"{'target':<8} {'scenario':<12} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+            for target in args.target:
+                name, base_url = target.split("=", 1)
+                for scenario, method, path, payload_for in scenarios:
+                    if scenario == "submit" and args.skip_submit:
+                        continue
+                    seconds, latencies, errors = await _load_run(
+                        session, method, base_url.rstrip("/") + path, payload_for, args.concurrency, args.requests
+                    )
+                    p50 = latencies[len(latencies) // 2] * 1000
+                    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+                    print(f"{name:<8} {scenario:<12} {args.requests / seconds:>9.0f} {p50:>8.1f} {p99:>8.1f} {errors:>7}")
+
+    asyncio.run(run())
+    return 0
+
+
+def make_results(quiz, count, seed=11):
+    """Legacy-shaped result documents as the worker stored them before compaction"""
+    rng = random.Random(seed)
+    key = AnswerKey(quiz)
+    results = []
+    for r, answers in enumerate(make_submissions(quiz, count, seed)):
+        answers = {qid: [str(index) for index in selected] for qid, selected in answers.items()}
+        score, max_score = key.score(answers)
+        results.append({
+            "_id": ObjectId(),
+            "submission_id": f"{r:032x}",
+            "quiz_id": "65f1c0ffee0000000000beef",
+            "quiz_version": 1,
+            "quiz_name": "Distribuirani racunarski sistemi - kolokvijum 1",
+            "user_id": str(rng.randint(1, 5000)),
+            "user_name": "Petar Petrovic",
+            "answers": answers,
+            "score": score,
+            "max_score": max_score,
+            "time_spent": rng.randint(30, 600),
+            "submitted_at": datetime(2026, 1, 1) + timedelta(seconds=r),
+            "processed": True,
+        })
+    return results
+
+
+def bench_encoding(args):
+    """Stored size and scan (BSON decode + rescoring encode) time, legacy vs compact"""
+    import bson
+    from rescoring import KeyMatrix, encode_documents
+    from result_codec import compact_result, decode_answers
+
+    quiz = make_quiz(args.questions)
+    key = AnswerKey(quiz)
+    key_matrix = KeyMatrix(key)
+    layouts = {key.layout_id: tuple(key.question_ids())}
+    legacy = make_results(quiz, args.results)
+    compact = [compact_result(doc, key.question_ids()) for doc in legacy]
+    for doc, packed in zip(legacy[:1000], compact[:1000]):
+        assert {qid: sorted(int(i) for i in sel) for qid, sel in doc["answers"].items() if sel} == decode_answers(packed, layouts)
+
+    report = {}
+    for name, docs in (("legacy", legacy), ("compact", compact)):
+        raw = b"".join(bson.encode(doc) for doc in docs)
+        start = time.perf_counter()
+        decoded = bson.decode_all(raw)
+        decode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(0, len(decoded), 5000):
+            encode_documents(decoded[i:i + 5000], key_matrix, layouts)
+        matrix_time = time.perf_counter() - start
+        report[name] = (len(raw) / len(docs), decode_time, matrix_time)
+
+    print(f"questions={args.questions} results={args.results}")
+    for name, (size, decode_time, matrix_time) in report.items():
+        print(
+            f"{name:8s} {size:8.1f} B/doc  decode {decode_time:6.2f}s  "
+            f"rescore-encode {matrix_time:6.2f}s  scan total {decode_time + matrix_time:6.2f}s"
+        )
+    (legacy_size, *legacy_times), (compact_size, *compact_times) = report["legacy"], report["compact"]
+    print(
+        f"size -{(1 - compact_size / legacy_size) * 100:.1f}%  "
+        f"scan {sum(legacy_times) / sum(compact_times):.2f}x faster"
+    )
+    return 0
+
+
+def bench_writes(args):
+    """Per-result insert + stats round trips vs the batched ResultWriter (scratch databases on MONGODB_URL)"""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+    from quiz_stats import init_stats_document, record_result_stats
+    from result_codec import compact_result
+    from result_writer import ResultWriter
+    from user_results import rebuild_user_summaries, record_user_result
+
+    url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    client = MongoClient(url, serverSelectionTimeoutMS=5000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        # Both variants are round-trip bound, so only a real server gives meaningful numbers
+        print(f"MongoDB not reachable at {url}, nothing measured: {str(e)}")
+        return 1
+    quiz = make_quiz(args.questions)
+    key = AnswerKey(quiz)
+    stats = (quiz["quiz_id"], key.max_score, quiz["duration_seconds"])
+
+    def fresh_results():
+        for result in make_results(quiz, args.results):
+            result.pop("_id")
+            yield result, compact_result(result, key.question_ids())
+
+    def per_result(db):
+        for result, stored in fresh_results():
+            db["results"].insert_one(stored)
+            db["players"].update_one({"_id": result["user_id"]}, {"$set": {"name": result["user_name"]}}, upsert=True)
+            record_result_stats(db["quiz_stats"], *stats, result)
+            record_user_result(db["user_stats"], result)
+
+    def batched(db):
+        done = threading.Event()
+        stored_count = [0]
+
+        def on_stored(items):
+            stored_count[0] += len(items)
+            if stored_count[0] >= args.results:
+                done.set()
+
+        writer = ResultWriter(db, on_stored, on_stored, on_stored, args.batch_size, args.flush_interval_ms)
+        writer.start()
+        for result, stored in fresh_results():
+            writer.submit({"result": result, "stored": stored, "stats": stats, "dedupe_key": None, "email": None})
+        done.wait()
+        return writer.snapshot()
+
+    print(f"results={args.results} batch_size={args.batch_size} flush_interval_ms={args.flush_interval_ms}")
+    for name, run in (("per-result", per_result), ("batched", batched)):
+        db = client[f"quiz_bench_writes_{name.replace('-', '_')}"]
+        client.drop_database(db.name)
+        # Complete (empty) statistics document, so both variants maintain it
+        init_stats_document(db["quiz_stats"], quiz)
+        rebuild_user_summaries(db["results"], db["user_stats"])
+        start = time.perf_counter()
+        metrics = run(db)
+        elapsed = time.perf_counter() - start
+        assert db["results"].count_documents({}) == args.results
+        line = f"{name:10s} {elapsed:7.2f}s  {args.results / elapsed:9,.0f} results/s"
+        if metrics:
+            line += f"  flushes={metrics['flushes']} max_wait={metrics['max_wait_seconds'] * 1000:.0f}ms"
+        print(line)
+        client.drop_database(db.name)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quiz service microbenchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    scoring = subparsers.add_parser("scoring", help=bench_scoring.__doc__)
+    scoring.add_argument("--questions", type=int, default=20)
+    scoring.add_argument("--submissions", type=int, default=20000)
+    scoring.set_defaults(func=bench_scoring)
+
+    rescoring = subparsers.add_parser("rescoring", help=bench_rescoring.__doc__)
+    rescoring.add_argument("--questions", type=int, default=20)
+    rescoring.add_argument("--results", type=int, default=1000000)
+    rescoring.add_argument("--batch-size", type=int, default=5000)
+    rescoring.set_defaults(func=bench_rescoring)
+
+    encoding = subparsers.add_parser("encoding", help=bench_encoding.__doc__)
+    encoding.add_argument("--questions", type=int, default=20)
+    encoding.add_argument("--results", type=int, default=200000)
+    encoding.set_defaults(func=bench_encoding)
+
+    writes = subparsers.add_parser("writes", help=bench_writes.__doc__)
+    writes.add_argument("--questions", type=int, default=20)
+    writes.add_argument("--results", type=int, default=20000)
+    writes.add_argument("--batch-size", type=int, default=500)
+    writes.add_argument("--flush-interval-ms", type=int, default=200)
+    writes.set_defaults(func=bench_writes)
+
+    mail = subparsers.add_parser("mail", help=bench_mail.__doc__)
+    mail.add_argument("--messages", type=int, default=2000)
+    mail.add_argument("--smtp-host", default="", help="defaults to a built-in discarding SMTP sink")
+    mail.add_argument("--smtp-port", type=int, default=1025)
+    mail.set_defaults(func=bench_mail)
+
+    load = subparsers.add_parser("load", help=bench_load.__doc__)
+    load.add_argument("--quiz-id", type=int, required=True, help="Synced quiz to hit (submit stores real results)")
+    load.add_argument(
+        "--target", action="append",
+        help="NAME=URL, repeatable (default: sync=http://localhost:5001 async=http://localhost:5002)"
+    )
+    load.add_argument("--concurrency", type=int, default=200)
+    load.add_argument("--requests", type=int, default=5000)
+    load.add_argument("--skip-submit", action="store_true", help="Only benchmark the leaderboard")
+    load.set_defaults(func=bench_load)
+
+    args = parser.parse_args()
+    if args.benchmark == "load" and not args.target:
+        args.target = ["sync=http://localhost:5001", "async=http://localhost:5002"]
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+import os
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# A claim whose scoring process died (or whose queued result was lost in a
+# restart) blocks retries of that submission only this long
+SUBMISSION_CLAIM_TTL_SECONDS = int(os.getenv("SUBMISSION_CLAIM_TTL_SECONDS", "600"))
+
+# Indexes required by the quiz service, per collection.
+# Each entry: (name, keys, options)
+INDEX_SPECS = {
+    "quizzes": [
+        ("quiz_id_unique", [("quiz_id", ASCENDING)], {"unique": True}),
+        ("status_1", [("status", ASCENDING)], {}),
+        ("author_id_1", [("author_id", ASCENDING)], {}),
+    ],
+    "results": [
+        # Leaderboard: filter by quiz, sort by score desc, time asc (_id as page tiebreaker)
+        ("quiz_score_time_id", [("quiz_id", ASCENDING), ("score", DESCENDING), ("time_spent", ASCENDING), ("_id", ASCENDING)], {}),
+        # User history: filter by user (optionally quiz), newest first, _id as page tiebreaker
+        ("user_submitted_at_id", [("user_id", ASCENDING), ("submitted_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ("user_quiz_submitted_at", [("user_id", ASCENDING), ("quiz_id", ASCENDING), ("submitted_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ("submission_id_1", [("submission_id", ASCENDING)], {"unique": True, "sparse": True}),
+        # Idempotent submissions: at most one stored result per dedupe key
+        ("dedupe_key_1", [("dedupe_key", ASCENDING)], {"unique": True, "sparse": True}),
+        # Archival job: oldest results first
+        ("submitted_at_id", [("submitted_at", ASCENDING), ("_id", ASCENDING)], {}),
+    ],
+    # Archived history pages and archive-aware rebuilds and fallbacks (per quiz / per user)
+    "results_archive": [
+        ("user_bucket", [("user_id", ASCENDING), ("bucket", DESCENDING)], {}),
+        ("results_quiz_id", [("results.quiz_id", ASCENDING)], {}),
+    ],
+    # Submission claims use the dedupe key as _id, which is unique by itself
+    "submissions": [
+        ("submission_id_1", [("submission_id", ASCENDING)], {"unique": True}),
+        # Stored results stay deduplicated by results.dedupe_key_1 after the claim expires
+        ("claimed_at_ttl", [("claimed_at", ASCENDING)], {"expireAfterSeconds": SUBMISSION_CLAIM_TTL_SECONDS}),
+    ],
+}
+
+# Older indexes superseded by the compound indexes above (same prefix)
+OBSOLETE_INDEXES = {
+    "results": ["quiz_id_1", "user_id_1", "quiz_score_time", "user_submitted_at"],
+}
+
+
+def ensure_indexes(db):
+    """Create all required indexes and drop superseded ones. Returns a report dict."""
+    report = {}
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[collection_name]
+        created, failed = [], []
+        for name, keys, options in specs:
+            try:
+                collection.create_index(keys, name=name, **options)
+                created.append(name)
+            except OperationFailure as e:
+                # e.g. duplicate quiz_id values block the unique index
+                print(f"Index {collection_name}.{name} not created: {str(e)}")
+                failed.append({"name": name, "error": str(e)})
+
+        dropped = []
+        existing = collection.index_information()
+        for name in OBSOLETE_INDEXES.get(collection_name, []):
+            if name in existing:
+                collection.drop_index(name)
+                dropped.append(name)
+
+        report[collection_name] = {"ensured": created, "failed": failed, "dropped": dropped}
+    return report
+
+
+def _plan_stages(plan):
+    """Flatten a winning plan tree into a list of (stage, index) entries"""
+    stages = []
+    while plan:
+        stages.append({"stage": plan.get("stage"), "index": plan.get("indexName")})
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+def summarize_explain(explain):
+    """Reduce explain() output to the fields relevant for index diagnostics"""
+    planner = explain.get("queryPlanner", {})
+    winning = planner.get("winningPlan", {})
+    # Slot-based engine (MongoDB 7) nests the classic plan under queryPlan
+    winning = winning.get("queryPlan", winning)
+    stats = explain.get("executionStats", {})
+    stages = _plan_stages(winning)
+    return {
+        "stages": stages,
+        "uses_index": any(s["stage"] == "IXSCAN" for s in stages),
+        "collection_scan": any(s["stage"] == "COLLSCAN" for s in stages),
+        "in_memory_sort": any(s["stage"] == "SORT" for s in stages),
+        "n_returned": stats.get("nReturned"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "execution_time_ms": stats.get("executionTimeMillis"),
+    }
+
+
+def explain_hot_queries(db, quiz_id=None, mongo_quiz_id=None, user_id=None):
+    """Explain the queries the service runs on every request"""
+    quizzes = db["quizzes"]
+    results = db["results"]
+    plans = {}
+
+    if quiz_id is not None:
+        plans["quiz_by_quiz_id"] = summarize_explain(
+            quizzes.find({"quiz_id": quiz_id}).limit(1).explain()
+        )
+    if mongo_quiz_id is not None:
+        plans["leaderboard"] = summarize_explain(
+            results.find({"quiz_id": mongo_quiz_id}, {"answers": 0, "masks": 0})
+            .sort([("score", DESCENDING), ("time_spent", ASCENDING), ("_id", ASCENDING)])
+            .limit(50)
+            .explain()
+        )
+    if user_id is not None:
+        plans["user_results"] = summarize_explain(
+            results.find({"user_id": user_id}, {"answers": 0, "masks": 0})
+            .sort([("submitted_at", DESCENDING), ("_id", DESCENDING)])
+            .limit(50)
+            .explain()
+        )
+    return plans
+
+
+def list_indexes(db):
+    """Current indexes per managed collection"""
+    return {
+        name: {
+            index_name: info.get("key")
+            for index_name, info in db[name].index_information().items()
+        }
+        for name in INDEX_SPECS
+    }
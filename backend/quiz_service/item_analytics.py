@@ -0,0 +1,218 @@
+"""Per-question item analytics
+
+For every question of a quiz:
+    difficulty      share of attempts that answered it exactly right
+    discrimination  point-biserial correlation between being right and the total score
+    options         how often each answer option was chosen
+
+Results are streamed in batches and folded into additive NumPy accumulators,
+so memory stays bounded. The accumulators are stored per quiz in item_analytics
+together with the quiz version and a watermark (an ObjectId): every result with
+a smaller _id is already folded in, so a request only reads the results stored
+since. Only a new quiz version starts over from empty accumulators.
+
+Result ids come from several writer processes and may be stored slightly out
+of order, so the watermark trails the clock by WATERMARK_LAG_SECONDS. Newer
+results are still folded into the returned report, just not into the stored
+accumulators.
+
+Archived results count like everywhere else. A full fold reads the archive;
+an incremental one only needs it when the stored watermark is older than the
+archiving age, since results only leave the hot collection after that long.
+"""
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson.objectid import ObjectId
+
+from archive import ARCHIVE_AFTER_DAYS, archived_results_union
+from quiz_processor import AnswerKey
+from rescoring import KeyMatrix, encode_documents, score_batch, DEFAULT_BATCH_SIZE
+from result_codec import LayoutCache
+
+WATERMARK_LAG_SECONDS = int(os.getenv("ANALYTICS_WATERMARK_LAG_SECONDS", "60"))
+
+RESULT_PROJECTION = {"_id": 0, "answers": 1, "enc": 1, "layout": 1, "masks": 1}
+
+
+class ItemAccumulator:
+    """Sufficient statistics for difficulty, point-biserial and option counts"""
+
+    def __init__(self, key_matrix):
+        n_questions = len(key_matrix.question_index)
+        self.key_matrix = key_matrix
+        self.count = 0
+        self.sum_total = 0.0
+        self.sum_total_sq = 0.0
+        self.n_correct = np.zeros(n_questions, dtype=np.int64)
+        self.sum_total_correct = np.zeros(n_questions, dtype=np.float64)
+        self.n_answered = np.zeros(n_questions, dtype=np.int64)
+        self.option_counts = np.zeros((n_questions, key_matrix.n_options), dtype=np.int64)
+
+    def state(self):
+        """Accumulators as a BSON-friendly document"""
+        return {
+            "count": self.count,
+            "sum_total": self.sum_total,
+            "sum_total_sq": self.sum_total_sq,
+            "n_correct": self.n_correct.tolist(),
+            "sum_total_correct": self.sum_total_correct.tolist(),
+            "n_answered": self.n_answered.tolist(),
+            "option_counts": self.option_counts.tolist(),
+        }
+
+    @classmethod
+    def from_state(cls, key_matrix, state):
+        """Accumulator restored from state(), or None if it does not fit the key"""
+        accumulator = cls(key_matrix)
+        option_counts = np.array(state["option_counts"], dtype=np.int64)
+        if option_counts.shape != accumulator.option_counts.shape:
+            return None
+        accumulator.count = state["count"]
+        accumulator.sum_total = state["sum_total"]
+        accumulator.sum_total_sq = state["sum_total_sq"]
+        accumulator.n_correct = np.array(state["n_correct"], dtype=np.int64)
+        accumulator.sum_total_correct = np.array(state["sum_total_correct"], dtype=np.float64)
+        accumulator.n_answered = np.array(state["n_answered"], dtype=np.int64)
+        accumulator.option_counts = option_counts
+        return accumulator
+
+    def add_batch(self, docs, layouts):
+        selected, invalid = encode_documents(docs, self.key_matrix, layouts)
+        totals = score_batch(selected, invalid, self.key_matrix).astype(np.float64)
+        correct = (selected == self.key_matrix.key).all(axis=2) & ~invalid
+
+        self.count += len(docs)
+        self.sum_total += totals.sum()
+        self.sum_total_sq += (totals * totals).sum()
+        self.n_correct += correct.sum(axis=0)
+        self.sum_total_correct += totals @ correct
+        self.n_answered += (selected.any(axis=2) | invalid).sum(axis=0)
+        self.option_counts += selected.sum(axis=0)
+
+    def difficulty(self):
+        return self.n_correct / self.count
+
+    def discrimination(self):
+        """Point-biserial r = (M1 - M0) / s * sqrt(p * q); None where undefined"""
+        n = self.count
+        mean = self.sum_total / n
+        std = np.sqrt(max(self.sum_total_sq / n - mean * mean, 0.0))
+        n_wrong = n - self.n_correct
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_correct = self.sum_total_correct / self.n_correct
+            mean_wrong = (self.sum_total - self.sum_total_correct) / n_wrong
+            p = self.n_correct / n
+            r = (mean_correct - mean_wrong) / std * np.sqrt(p * (1 - p))
+        defined = (self.n_correct > 0) & (n_wrong > 0) & (std > 0)
+        return [float(value) if ok else None for value, ok in zip(r, defined)]
+
+
+def fold_results(accumulator, results_collection, query, layouts, batch_size=DEFAULT_BATCH_SIZE, archived=False):
+    """Stream the matching results (and with archived, the matching archived ones) into the accumulator"""
+    if archived:
+        cursor = results_collection.aggregate([
+            {"$match": query},
+            {"$project": RESULT_PROJECTION},
+            archived_results_union(query, RESULT_PROJECTION),
+        ], batchSize=batch_size)
+    else:
+        cursor = results_collection.find(query, RESULT_PROJECTION).batch_size(batch_size)
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            accumulator.add_batch(batch, layouts)
+            batch = []
+    if batch:
+        accumulator.add_batch(batch, layouts)
+
+
+def build_report(quiz, answer_key, accumulator):
+    """Per-question report from filled accumulators"""
+    report = {
+        "quiz_id": quiz.get("quiz_id"),
+        "version": answer_key.version,
+        "result_count": accumulator.count,
+        "computed_at": datetime.utcnow(),
+        "questions": [],
+    }
+    if not accumulator.count:
+        return report
+
+    difficulty = accumulator.difficulty()
+    discrimination = accumulator.discrimination()
+    for q, question in enumerate(quiz.get("questions", [])):
+        _, correct_mask, points = answer_key.questions[q]
+        answered = int(accumulator.n_answered[q])
+        report["questions"].append({
+            "question_id": question.get("id"),
+            "text": question.get("text", ""),
+            "points": points,
+            "difficulty": float(difficulty[q]),
+            "discrimination": discrimination[q],
+            "answered": answered,
+            "options": [
+                {
+                    "option": a,
+                    "text": answer.get("text", ""),
+                    "is_correct": bool(correct_mask >> a & 1),
+                    "count": int(accumulator.option_counts[q, a]),
+                    "share": float(accumulator.option_counts[q, a] / answered) if answered else 0.0,
+                }
+                for a, answer in enumerate(question.get("answers", []))
+            ],
+        })
+    return report
+
+
+def compute_item_analytics(results_collection, quiz, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream all of a quiz's results and build the per-question report"""
+    answer_key = AnswerKey(quiz)
+    accumulator = ItemAccumulator(KeyMatrix(answer_key))
+    layouts = LayoutCache(results_collection.database["quiz_layouts"])
+    fold_results(accumulator, results_collection, {"quiz_id": str(quiz["_id"])}, layouts, batch_size, archived=True)
+    return build_report(quiz, answer_key, accumulator)
+
+
+def get_item_analytics(quizzes_collection, results_collection, analytics_collection, quiz_id):
+    """Report for an integer quiz_id, folding in only results stored since the last call"""
+    quiz = quizzes_collection.find_one({"quiz_id": quiz_id})
+    if not quiz:
+        return None
+
+    answer_key = AnswerKey(quiz)
+    key_matrix = KeyMatrix(answer_key)
+    layouts = LayoutCache(results_collection.database["quiz_layouts"])
+    match = {"quiz_id": str(quiz["_id"])}
+
+    cached = analytics_collection.find_one({"_id": quiz_id})
+    accumulator = None
+    if cached and cached.get("version") == answer_key.version and "state" in cached:
+        accumulator = ItemAccumulator.from_state(key_matrix, cached["state"])
+    now = datetime.utcnow()
+    if accumulator is None:
+        accumulator, since, archived = ItemAccumulator(key_matrix), {}, True
+    else:
+        since = {"$gte": cached["watermark"]}
+        # Results stored after the watermark may have been archived before this call
+        archived = cached["watermark"].generation_time.replace(tzinfo=None) < now - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+    # Settled results go into the stored accumulators, the last few seconds only into this report
+    watermark = ObjectId.from_datetime(now - timedelta(seconds=WATERMARK_LAG_SECONDS))
+    folded = accumulator.count
+    fold_results(
+        accumulator, results_collection, dict(match, _id=dict(since, **{"$lt": watermark})), layouts, archived=archived
+    )
+    if not since or accumulator.count != folded:
+        analytics_collection.replace_one(
+            {"_id": quiz_id},
+            {"version": answer_key.version, "state": accumulator.state(), "watermark": watermark},
+            upsert=True
+        )
+    fold_results(accumulator, results_collection, dict(match, _id={"$gte": watermark}), layouts)
+
+    report = build_report(quiz, answer_key, accumulator)
+    report["_id"] = quiz_id
+    return report
@@ -0,0 +1,124 @@
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+
+from archive import archived_results_union
+from leaderboard_store import REBUILD_BATCH_SIZE, parse_cursor, split_page
+from leaderboard_store import rebuild_leaderboard as rebuild_sorted_sets
+from result_codec import decode_results, decoded_batches
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Leaderboard rows never need the per-question answers (legacy map or compact masks)
+LEADERBOARD_PROJECTION = {"answers": 0, "masks": 0}
+
+# Matches the (quiz_id, score, time_spent, _id) index so no in-memory sort is needed
+# (for the hot results; archived ones are merged in after their own sort)
+LEADERBOARD_SORT = [("score", DESCENDING), ("time_spent", ASCENDING), ("_id", ASCENDING)]
+
+
+def parse_page_size(value):
+    """Clamp the requested page size to [1, MAX_PAGE_SIZE]"""
+    if value in (None, ""):
+        return DEFAULT_PAGE_SIZE
+    return min(max(int(value), 1), MAX_PAGE_SIZE)
+
+
+def decode_cursor(cursor):
+    """Parse 'score:time_spent:result_id' into typed values; raises ValueError"""
+    score, time_spent, result_id = parse_cursor(cursor)
+    try:
+        return score, time_spent, ObjectId(result_id)
+    except InvalidId as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def cursor_filter(cursor):
+    """Filter for rows strictly after the cursor in leaderboard order"""
+    score, time_spent, result_id = decode_cursor(cursor)
+    return {"$or": [
+        {"score": {"$lt": score}},
+        {"score": score, "time_spent": {"$gt": time_spent}},
+        {"score": score, "time_spent": time_spent, "_id": {"$gt": result_id}},
+    ]}
+
+
+def page_query(mongo_quiz_id, cursor=None):
+    """Filter for one page of all attempts, starting after the cursor"""
+    query = {"quiz_id": mongo_quiz_id}
+    if cursor:
+        query.update(cursor_filter(cursor))
+    return query
+
+
+def page_pipeline(mongo_quiz_id, limit, cursor=None):
+    """Aggregation returning limit+1 rows of all attempts after the cursor
+
+    Archived results keep their place, like on the Redis leaderboard: hot and
+    archived results each contribute their first limit+1 rows to the merge.
+    """
+    query = page_query(mongo_quiz_id, cursor)
+    top = [{"$sort": dict(LEADERBOARD_SORT)}, {"$limit": limit + 1}]
+    return [
+        {"$match": query},
+        *top,
+        {"$project": LEADERBOARD_PROJECTION},
+        archived_results_union(query, LEADERBOARD_PROJECTION, top),
+        *top,
+    ]
+
+
+def best_page_pipeline(mongo_quiz_id, limit, cursor=None):
+    """Aggregation returning limit+1 best-attempt-per-user rows after the cursor"""
+    match = {"quiz_id": mongo_quiz_id}
+    pipeline = [
+        {"$match": match},
+        {"$project": LEADERBOARD_PROJECTION},
+        archived_results_union(match, LEADERBOARD_PROJECTION),
+        {"$sort": dict(LEADERBOARD_SORT)},
+        {"$group": {
+            "_id": "$user_id",
+            "best": {"$first": "$$ROOT"},
+            "attempts": {"$sum": 1},
+        }},
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$best", {"attempts": "$attempts"}]}}},
+    ]
+    if cursor:
+        pipeline.append({"$match": cursor_filter(cursor)})
+    pipeline += [
+        {"$sort": dict(LEADERBOARD_SORT)},
+        {"$limit": limit + 1},
+    ]
+    return pipeline
+
+
+def fetch_page(results_collection, mongo_quiz_id, limit, cursor=None):
+    """One page of all attempts in leaderboard order"""
+    rows = list(results_collection.aggregate(page_pipeline(mongo_quiz_id, limit, cursor)))
+    rows, next_cursor = split_page(rows, limit)
+    return decode_results(results_collection.database, rows), next_cursor
+
+
+def fetch_best_page(results_collection, mongo_quiz_id, limit, cursor=None):
+    """One page with only the best attempt of each user"""
+    rows = list(results_collection.aggregate(best_page_pipeline(mongo_quiz_id, limit, cursor), allowDiskUse=True))
+    rows, next_cursor = split_page(rows, limit)
+    return decode_results(results_collection.database, rows), next_cursor
+
+
+# --- Materialized leaderboards (Redis sorted sets, see leaderboard_store) ---
+
+def rebuild_leaderboard(redis_client, results_collection, quiz_id, mongo_quiz_id):
+    """Repopulate one quiz's sorted sets from results, swapping them in atomically"""
+    def batches():
+        # Generator: the scan starts only after the store marked the rebuild running
+        # Archived results keep their place on the leaderboard
+        cursor = results_collection.aggregate([
+            {"$match": {"quiz_id": mongo_quiz_id}},
+            {"$project": LEADERBOARD_PROJECTION},
+            archived_results_union({"quiz_id": mongo_quiz_id}, LEADERBOARD_PROJECTION),
+        ], batchSize=REBUILD_BATCH_SIZE)
+        yield from decoded_batches(results_collection, cursor, REBUILD_BATCH_SIZE)
+
+    return rebuild_sorted_sets(redis_client, batches(), quiz_id)
@@ -0,0 +1,347 @@
+"""Materialized leaderboards in Redis sorted sets
+
+Shared by the quiz service (which writes and rebuilds them) and the backend
+(which reads them directly), so it only depends on json and a redis client.
+
+Per quiz (keyed by the integer quiz_id from the main DB):
+    leaderboard:<id>             ZSET  result_id -> rank score, every attempt
+    leaderboard:<id>:best        ZSET  result_id -> rank score, best attempt per user
+    leaderboard:<id>:users       HASH  user_id -> result_id of the user's best attempt
+    leaderboard:<id>:rows        HASH  result_id -> leaderboard row (JSON)
+    leaderboard:<id>:ready       set once the sets hold every result (new quiz or rebuild)
+    leaderboard:<id>:rebuilding  set while a rebuild runs (new results go to both copies)
+
+The rank score is the negated composite score, so ascending order is leaderboard
+order and equal scores fall back to the member, i.e. result _id ascending, the
+same tie order as the MongoDB (score, time_spent, _id) sort.
+
+Results are only recorded into a quiz's sets once they are ready: a new quiz
+starts with empty ready sets (init_leaderboard), any other quiz after a rebuild.
+Until then readers get None and fall back to MongoDB, and the quiz service
+starts a rebuild on demand (claim_rebuild keeps it to one at a time).
+"""
+import json
+
+# Composite score: higher score first, then lower time_spent (time capped at ~115 days)
+TIME_SCALE = 10 ** 7
+
+REBUILD_BATCH_SIZE = 1000
+# A crashed rebuild stops the double writes after this long
+REBUILDING_TTL_SECONDS = 600
+
+DATA_KEYS = ("all", "best", "users", "rows")
+
+# record(all, best, users, rows) with ARGV: result_id, rank score, user_id, row JSON
+_RECORD_FUNCTION = """
+local function record(all, best, users, rows)
+    redis.call('ZADD', all, ARGV[2], ARGV[1])
+    redis.call('HSET', rows, ARGV[1], ARGV[4])
+    local current = redis.call('HGET', users, ARGV[3])
+    if current then
+        local current_score = redis.call('ZSCORE', best, current)
+        if current_score then
+            current_score = tonumber(current_score)
+            local score = tonumber(ARGV[2])
+            if current_score < score or (current_score == score and current <= ARGV[1]) then
+                return 0
+            end
+        end
+        redis.call('ZREM', best, current)
+    end
+    redis.call('ZADD', best, ARGV[2], ARGV[1])
+    redis.call('HSET', users, ARGV[3], ARGV[1])
+    return 1
+end
+"""
+
+# KEYS: live data keys, ready, rebuilding, rebuild data keys
+# Returns -1 if the result went nowhere (neither ready nor rebuilding)
+RECORD_RESULT_SCRIPT = _RECORD_FUNCTION + """
+local ready = redis.call('EXISTS', KEYS[5]) == 1
+local rebuilding = redis.call('EXISTS', KEYS[6]) == 1
+local improved = 0
+if ready then
+    improved = record(KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+end
+if rebuilding then
+    record(KEYS[7], KEYS[8], KEYS[9], KEYS[10])
+end
+if not ready and not rebuilding then
+    return -1
+end
+return improved
+"""
+
+# KEYS: rebuild data keys
+REBUILD_ROW_SCRIPT = _RECORD_FUNCTION + """
+return record(KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+"""
+
+# KEYS: live data keys, rebuild data keys, ready, rebuilding
+SWAP_SCRIPT = """
+for i = 1, 4 do
+    if redis.call('EXISTS', KEYS[i + 4]) == 1 then
+        redis.call('RENAME', KEYS[i + 4], KEYS[i])
+    else
+        redis.call('DEL', KEYS[i])
+    end
+end
+redis.call('SET', KEYS[9], 1)
+redis.call('DEL', KEYS[10])
+return 1
+"""
+
+# KEYS: live data keys, ready, rebuilding
+INIT_SCRIPT = """
+if redis.call('EXISTS', KEYS[5]) == 1 or redis.call('EXISTS', KEYS[6]) == 1 then
+    return 0
+end
+redis.call('DEL', KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+redis.call('SET', KEYS[5], 1)
+return 1
+"""
+
+# KEYS: ready, zset, rows; ARGV: count, cursor result_id (or ''), cursor rank score
+# Returns false if the leaderboard is not ready, else the rows (JSON) after the cursor
+PAGE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local start = 0
+if ARGV[2] ~= '' then
+    local rank = redis.call('ZRANK', KEYS[2], ARGV[2])
+    if rank then
+        start = rank + 1
+    else
+        -- Cursor row left the set (e.g. replaced best attempt): continue after its position
+        start = redis.call('ZCOUNT', KEYS[2], '-inf', '(' .. ARGV[3])
+        for _, member in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], ARGV[3], ARGV[3])) do
+            if member < ARGV[2] then
+                start = start + 1
+            end
+        end
+    end
+end
+local ids = redis.call('ZRANGE', KEYS[2], start, start + tonumber(ARGV[1]) - 1)
+if #ids == 0 then
+    return {}
+end
+return redis.call('HMGET', KEYS[3], unpack(ids))
+"""
+
+
+def leaderboard_keys(quiz_id):
+    base = f"leaderboard:{quiz_id}"
+    return {
+        "all": base,
+        "best": f"{base}:best",
+        "users": f"{base}:users",
+        "rows": f"{base}:rows",
+        "ready": f"{base}:ready",
+        "rebuilding": f"{base}:rebuilding",
+    }
+
+
+def rebuild_keys(keys):
+    return {name: f"{keys[name]}:rebuild" for name in DATA_KEYS}
+
+
+def composite_score(score, time_spent):
+    time_part = min(max(int(time_spent or 0), 0), TIME_SCALE - 1)
+    return score * TIME_SCALE + (TIME_SCALE - 1 - time_part)
+
+
+def rank_score(score, time_spent):
+    """Sorted set score: ascending order is leaderboard order"""
+    return -composite_score(score, time_spent)
+
+
+def encode_cursor(row):
+    """Cursor pointing after the given leaderboard row"""
+    return f"{row['score']}:{row['time_spent']}:{row['_id']}"
+
+
+def parse_cursor(cursor):
+    """Split 'score:time_spent:result_id' into (float, float, str); raises ValueError"""
+    try:
+        score, time_spent, result_id = cursor.split(":")
+        return float(score), float(time_spent), result_id
+    except AttributeError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def split_page(rows, limit):
+    """Split limit+1 fetched rows into a page and the next cursor"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]) if has_more and rows else None
+    return rows, next_cursor
+
+
+def leaderboard_row(result):
+    """JSON-serializable leaderboard row for a result document"""
+    submitted_at = result.get("submitted_at")
+    return {
+        "_id": str(result["_id"]),
+        "quiz_id": result.get("quiz_id"),
+        "quiz_name": result.get("quiz_name", ""),
+        "user_id": result.get("user_id"),
+        "user_name": result.get("user_name", ""),
+        "score": result.get("score", 0),
+        "max_score": result.get("max_score", 0),
+        "time_spent": result.get("time_spent", 0),
+        "submitted_at": submitted_at.isoformat() if hasattr(submitted_at, "isoformat") else submitted_at,
+        "submission_id": result.get("submission_id"),
+    }
+
+
+def _row_args(result):
+    row = leaderboard_row(result)
+    return [row["_id"], rank_score(row["score"], row["time_spent"]), row["user_id"], json.dumps(row)]
+
+
+def _record(script, quiz_id, result, client=None):
+    keys = leaderboard_keys(quiz_id)
+    temp = rebuild_keys(keys)
+    return script(
+        keys=[keys[name] for name in DATA_KEYS] + [keys["ready"], keys["rebuilding"]] + [temp[name] for name in DATA_KEYS],
+        args=_row_args(result),
+        client=client,
+    )
+
+
+def _improved(reply):
+    return None if reply == -1 else bool(reply)
+
+
+def record_result(redis_client, quiz_id, result):
+    """Add a stored result to the quiz's sorted sets
+
+    Returns True if it is the user's new best, or None if the quiz has no
+    leaderboard yet (nothing recorded, it needs a rebuild).
+    """
+    return _improved(_record(redis_client.register_script(RECORD_RESULT_SCRIPT), quiz_id, result))
+
+
+def record_results(redis_client, entries):
+    """record_result for many (quiz_id, result) pairs in one pipelined round trip"""
+    script = redis_client.register_script(RECORD_RESULT_SCRIPT)
+    pipe = redis_client.pipeline(transaction=False)
+    for quiz_id, result in entries:
+        _record(script, quiz_id, result, client=pipe)
+    return [_improved(reply) for reply in pipe.execute()]
+
+
+def init_leaderboard(redis_client, quiz_id):
+    """Mark the empty sets of a quiz without results ready. False if it already has a leaderboard."""
+    keys = leaderboard_keys(quiz_id)
+    return bool(redis_client.register_script(INIT_SCRIPT)(
+        keys=[keys[name] for name in DATA_KEYS] + [keys["ready"], keys["rebuilding"]]
+    ))
+
+
+def leaderboard_ready(redis_client, quiz_id):
+    return bool(redis_client.exists(leaderboard_keys(quiz_id)["ready"]))
+
+
+def claim_rebuild(redis_client, quiz_id):
+    """Take the rebuilding marker if no rebuild runs. True if the caller should rebuild."""
+    keys = leaderboard_keys(quiz_id)
+    return bool(redis_client.set(keys["rebuilding"], 1, nx=True, ex=REBUILDING_TTL_SECONDS))
+
+
+def release_rebuild(redis_client, quiz_id):
+    """Drop the marker of a rebuild that did not finish"""
+    redis_client.delete(leaderboard_keys(quiz_id)["rebuilding"])
+
+
+def _rows_for(redis_client, quiz_id, result_ids):
+    if not result_ids:
+        return []
+    raw = redis_client.hmget(leaderboard_keys(quiz_id)["rows"], result_ids)
+    return [json.loads(r) for r in raw if r]
+
+
+def read_page(redis_client, quiz_id, limit, cursor=None, best_only=False):
+    """(rows, next_cursor) from the sorted set, or None if the leaderboard is not ready"""
+    keys = leaderboard_keys(quiz_id)
+    result_id, score = "", 0
+    if cursor:
+        cursor_score, time_spent, result_id = parse_cursor(cursor)
+        score = rank_score(cursor_score, time_spent)
+
+    raw = redis_client.register_script(PAGE_SCRIPT)(
+        keys=[keys["ready"], keys["best" if best_only else "all"], keys["rows"]],
+        args=[limit + 1, result_id, repr(score)],
+    )
+    if raw is None:
+        return None
+    return split_page([json.loads(r) for r in raw if r], limit)
+
+
+def read_top(redis_client, quiz_id, limit):
+    """(first limit best attempts, number of players), or None if the leaderboard is not ready"""
+    keys = leaderboard_keys(quiz_id)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.exists(keys["ready"])
+    pipe.zrange(keys["best"], 0, limit - 1)
+    pipe.zcard(keys["best"])
+    ready, result_ids, total = pipe.execute()
+    if not ready:
+        return None
+    return _rows_for(redis_client, quiz_id, result_ids), total
+
+
+def user_rank(redis_client, quiz_id, user_id, around=0):
+    """Rank of the user's best attempt plus a window of +/- around neighbours"""
+    keys = leaderboard_keys(quiz_id)
+    if not redis_client.exists(keys["ready"]):
+        return None
+    result_id = redis_client.hget(keys["users"], user_id)
+    if result_id is None:
+        return None
+    rank = redis_client.zrank(keys["best"], result_id)
+    if rank is None:
+        return None
+
+    first = max(rank - around, 0)
+    window_ids = redis_client.zrange(keys["best"], first, rank + around)
+    window = _rows_for(redis_client, quiz_id, window_ids)
+    for offset, row in enumerate(window):
+        row["rank"] = first + offset + 1
+
+    return {
+        "user_id": user_id,
+        "rank": rank + 1,
+        "total_players": redis_client.zcard(keys["best"]),
+        "entry": next((row for row in window if row["_id"] == result_id), None),
+        "around": window,
+    }
+
+
+def rebuild_leaderboard(redis_client, batches, quiz_id):
+    """Repopulate one quiz's sorted sets from batches of result documents
+
+    Results recorded while the rebuild runs also go to the rebuild copies, so the
+    atomic swap at the end does not drop them. The swap marks the leaderboard ready.
+    """
+    keys = leaderboard_keys(quiz_id)
+    temp = rebuild_keys(keys)
+    temp_keys = [temp[name] for name in DATA_KEYS]
+    redis_client.delete(*temp_keys)
+    redis_client.set(keys["rebuilding"], 1, ex=REBUILDING_TTL_SECONDS)
+
+    script = redis_client.register_script(REBUILD_ROW_SCRIPT)
+    count = 0
+    for batch in batches:
+        pipe = redis_client.pipeline(transaction=False)
+        for result in batch:
+            script(keys=temp_keys, args=_row_args(result), client=pipe)
+        pipe.expire(keys["rebuilding"], REBUILDING_TTL_SECONDS)
+        pipe.execute()
+        count += len(batch)
+
+    redis_client.register_script(SWAP_SCRIPT)(
+        keys=[keys[name] for name in DATA_KEYS] + temp_keys + [keys["ready"], keys["rebuilding"]]
+    )
+    return count
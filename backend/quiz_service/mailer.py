@@ -0,0 +1,278 @@
+"""Pooled, batched SMTP dispatcher for quiz-result emails
+
+Scoring workers only enqueue messages in Redis (enqueue_email). This process
+drains the queue in batches over a persistent SMTP connection, retries failed
+messages with exponential back-off and records throughput metrics.
+
+Taken messages are moved atomically to MAIL_PROCESSING_KEY and removed from it
+once sent (or scheduled for retry), so a dispatcher that dies mid-batch loses
+nothing: on start it puts whatever is still there back on the queue. A message
+may therefore be sent twice, never dropped. Run a single dispatcher per queue.
+Messages that cannot be decoded go straight to MAIL_DEAD_KEY.
+
+Usage:
+    python mailer.py [--batch-size N] [--smtp-host HOST] [--smtp-port PORT]
+
+For local testing point it at any debugging SMTP server, e.g. MailHog from
+docker-compose or aiosmtpd (`python -m aiosmtpd -n -l localhost:1025`).
+"""
+import argparse
+import json
+import os
+import smtplib
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import redis
+
+MAIL_QUEUE_KEY = "mail:queue"
+MAIL_PROCESSING_KEY = "mail:processing"  # taken but not yet sent or rescheduled
+MAIL_RETRY_KEY = "mail:retry"        # ZSET message -> not-before timestamp
+MAIL_DEAD_KEY = "mail:dead"
+MAIL_METRICS_KEY = "mail:metrics"
+
+# ZSET members are removed and queued in one step, so a message is never in both
+PROMOTE_RETRIES_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, raw in ipairs(due) do
+    redis.call('ZREM', KEYS[1], raw)
+    redis.call('RPUSH', KEYS[2], raw)
+end
+return #due
+"""
+
+
+def enqueue_email(redis_client, to_email, subject, html_body):
+    """Queue an email for the dispatcher (called from scoring workers)"""
+    message = {"to": to_email, "subject": subject, "html": html_body, "attempts": 0, "queued_at": time.time()}
+    redis_client.rpush(MAIL_QUEUE_KEY, json.dumps(message))
+
+
+def mail_metrics(redis_client):
+    """Dispatcher counters plus derived throughput"""
+    metrics = {key: float(value) for key, value in redis_client.hgetall(MAIL_METRICS_KEY).items()}
+    send_seconds = metrics.get("send_seconds", 0)
+    metrics["messages_per_second"] = metrics.get("sent", 0) / send_seconds if send_seconds else 0
+    metrics["queued"] = redis_client.llen(MAIL_QUEUE_KEY)
+    metrics["processing"] = redis_client.llen(MAIL_PROCESSING_KEY)
+    metrics["retry_scheduled"] = redis_client.zcard(MAIL_RETRY_KEY)
+    metrics["dead"] = redis_client.llen(MAIL_DEAD_KEY)
+    return metrics
+
+
+class MailDispatcher:
+    def __init__(self, redis_client, host, port, user="", password="", sender="noreply@quizplatform.com",
+                 batch_size=50, max_attempts=5, base_backoff=2.0, idle_timeout=30):
+        self.redis = redis_client
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.idle_timeout = idle_timeout
+        self._smtp = None
+        self._last_used = 0.0
+
+    # --- connection handling ---
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=10)
+        smtp.ehlo()
+        if self.user:
+            smtp.starttls()
+            smtp.login(self.user, self.password)
+        self.redis.hincrby(MAIL_METRICS_KEY, "connections", 1)
+        return smtp
+
+    def _connection(self):
+        """Reuse the open connection; verify it with NOOP if it sat idle"""
+        if self._smtp is not None and time.monotonic() - self._last_used > 5:
+            try:
+                self._smtp.noop()
+            except smtplib.SMTPException:
+                self._close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                # QUIT failed halfway; close the socket ourselves
+                self._smtp.close()
+            self._smtp = None
+
+    def _build(self, message):
+        msg = MIMEMultipart()
+        msg["From"] = self.sender
+        msg["To"] = message["to"]
+        msg["Subject"] = message["subject"]
+        msg.attach(MIMEText(message["html"], "html"))
+        return msg
+
+    def _send(self, message):
+        msg = self._build(message)
+        try:
+            self._connection().send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Server dropped the pooled connection: close it, reconnect once and retry
+            self._close()
+            self._connection().send_message(msg)
+        self._last_used = time.monotonic()
+
+    # --- queue handling ---
+
+    def _promote_due_retries(self):
+        """Move retry messages whose back-off elapsed back onto the queue"""
+        self.redis.register_script(PROMOTE_RETRIES_SCRIPT)(
+            keys=[MAIL_RETRY_KEY, MAIL_QUEUE_KEY], args=[time.time(), self.batch_size]
+        )
+
+    def requeue_unacked(self):
+        """Put messages left in the processing list by a dead dispatcher back at the queue head"""
+        count = 0
+        while self.redis.lmove(MAIL_PROCESSING_KEY, MAIL_QUEUE_KEY, "RIGHT", "LEFT") is not None:
+            count += 1
+        if count:
+            print(f"Requeued {count} unacknowledged messages")
+        return count
+
+    def _next_batch(self, block_seconds):
+        first = self.redis.blmove(MAIL_QUEUE_KEY, MAIL_PROCESSING_KEY, block_seconds, "LEFT", "RIGHT")
+        if first is None:
+            return []
+        batch = [first]
+        if self.batch_size > 1:
+            pipe = self.redis.pipeline(transaction=False)
+            for _ in range(self.batch_size - 1):
+                pipe.lmove(MAIL_QUEUE_KEY, MAIL_PROCESSING_KEY, "LEFT", "RIGHT")
+            batch += [raw for raw in pipe.execute() if raw is not None]
+        return batch
+
+    def _ack(self, raw, pipe=None):
+        (pipe or self.redis).lrem(MAIL_PROCESSING_KEY, 1, raw)
+
+    @staticmethod
+    def _decode(raw):
+        """Parse a queued message; raises ValueError if it is not a sendable message"""
+        message = json.loads(raw)
+        if not isinstance(message, dict) or not all(isinstance(message.get(key), str) for key in ("to", "subject", "html")):
+            raise ValueError("message needs string to, subject and html fields")
+        message["attempts"] = int(message.get("attempts", 0))
+        return message
+
+    def _dead_letter_raw(self, raw, error):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.rpush(MAIL_DEAD_KEY, json.dumps({"raw": raw, "last_error": str(error)}))
+        pipe.hincrby(MAIL_METRICS_KEY, "dead_lettered", 1)
+        self._ack(raw, pipe)
+        pipe.execute()
+        print(f"Undecodable mail message dead-lettered: {error}")
+
+    def _schedule_retry(self, raw, message, error):
+        """Reschedule (or dead-letter) a failed message and ack it in one transaction"""
+        message["attempts"] += 1
+        message["last_error"] = str(error)
+        pipe = self.redis.pipeline(transaction=True)
+        if message["attempts"] >= self.max_attempts:
+            pipe.rpush(MAIL_DEAD_KEY, json.dumps(message))
+            pipe.hincrby(MAIL_METRICS_KEY, "dead_lettered", 1)
+            print(f"Mail to {message['to']} dead-lettered after {message['attempts']} attempts: {error}")
+        else:
+            delay = self.base_backoff * (2 ** (message["attempts"] - 1))
+            pipe.zadd(MAIL_RETRY_KEY, {json.dumps(message): time.time() + delay})
+            pipe.hincrby(MAIL_METRICS_KEY, "retried", 1)
+        self._ack(raw, pipe)
+        pipe.execute()
+
+    def run_once(self, block_seconds=1):
+        """Send one batch; returns the number of messages taken from the queue"""
+        self._promote_due_retries()
+        batch = self._next_batch(block_seconds)
+        if not batch:
+            if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                self._close()
+            return 0
+
+        sent = failed = 0
+        start = time.perf_counter()
+        for raw in batch:
+            try:
+                message = self._decode(raw)
+            except (ValueError, TypeError) as e:
+                self._dead_letter_raw(raw, e)
+                continue
+            try:
+                self._send(message)
+            except (smtplib.SMTPException, OSError) as e:
+                self._close()
+                self._schedule_retry(raw, message, e)
+                failed += 1
+                continue
+            self._ack(raw)
+            sent += 1
+        elapsed = time.perf_counter() - start
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrby(MAIL_METRICS_KEY, "batches", 1)
+        pipe.hincrby(MAIL_METRICS_KEY, "sent", sent)
+        pipe.hincrby(MAIL_METRICS_KEY, "failed_attempts", failed)
+        pipe.hincrbyfloat(MAIL_METRICS_KEY, "send_seconds", elapsed)
+        pipe.execute()
+        print(f"Mail batch: {sent} sent, {failed} failed in {elapsed * 1000:.0f} ms")
+        return len(batch)
+
+    def run_forever(self):
+        print(f"Mail dispatcher started: {self.host}:{self.port}, batch size {self.batch_size}")
+        try:
+            while True:
+                try:
+                    self.requeue_unacked()
+                    break
+                except redis.RedisError as e:
+                    print(f"Redis unavailable, retrying: {str(e)}")
+                    time.sleep(2)
+            while True:
+                try:
+                    self.run_once()
+                except redis.RedisError as e:
+                    print(f"Redis error, retrying: {str(e)}")
+                    time.sleep(2)
+                except Exception as e:
+                    # Unacked messages stay in the processing list for the next start
+                    print(f"Mail batch failed: {str(e)}")
+                    time.sleep(2)
+        finally:
+            self._close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quiz-result mail dispatcher")
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://redis:6379/0"))
+    parser.add_argument("--smtp-host", default=os.getenv("SMTP_SERVER", "quiz_mailhog"))
+    parser.add_argument("--smtp-port", type=int, default=int(os.getenv("SMTP_PORT", "1025")))
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("MAIL_BATCH_SIZE", "50")))
+    parser.add_argument("--max-attempts", type=int, default=int(os.getenv("MAIL_MAX_ATTEMPTS", "5")))
+    args = parser.parse_args()
+
+    dispatcher = MailDispatcher(
+        redis.Redis.from_url(args.redis_url, decode_responses=True),
+        args.smtp_host,
+        args.smtp_port,
+        user=os.getenv("SMTP_USERNAME", ""),
+        password=os.getenv("SMTP_PASSWORD", ""),
+        sender=os.getenv("FROM_EMAIL", "noreply@quizplatform.com"),
+        batch_size=args.batch_size,
+        max_attempts=args.max_attempts,
+    )
+    dispatcher.run_forever()
+
+
+if __name__ == "__main__":
+    main()
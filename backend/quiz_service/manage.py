@@ -0,0 +1,207 @@
+"""Maintenance commands for the quiz service
+
+Usage:
+    python manage.py rebuild-leaderboards [--quiz-id ID]
+    python manage.py backfill-stats [--quiz-id ID]
+    python manage.py backfill-user-stats [--user-id ID]
+    python manage.py rescore --quiz-id ID [--batch-size N]
+    python manage.py item-analytics [--quiz-id ID]
+    python manage.py compact-results [--quiz-id ID] [--batch-size N]
+    python manage.py archive-results [--older-than-days N] [--batch-size N] [--pause SECONDS] [--max-batches N]
+"""
+import argparse
+
+from pymongo import ReplaceOne, UpdateOne
+
+from app import (
+    quiz_collection,
+    results_collection,
+    stats_collection,
+    user_stats_collection,
+    analytics_collection,
+    redis_client,
+    use_redis
+)
+from archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_PAUSE_SECONDS, archive_results
+from item_analytics import get_item_analytics
+from quiz_processor import AnswerKey
+from result_codec import compact_result, is_compact, register_layout
+from leaderboard import rebuild_leaderboard
+from quiz_stats import rebuild_stats_document
+from rescoring import rescore_results, DEFAULT_BATCH_SIZE
+from user_results import rebuild_user_summaries
+
+
+def _quizzes(args, projection):
+    query = {"quiz_id": args.quiz_id} if args.quiz_id is not None else {}
+    return quiz_collection.find(query, projection)
+
+
+def rebuild_leaderboards(args):
+    """Repopulate the Redis leaderboard sorted sets from results"""
+    if not use_redis:
+        print("Redis not available, nothing to rebuild")
+        return 1
+
+    for quiz in _quizzes(args, {"_id": 1, "quiz_id": 1}):
+        count = rebuild_leaderboard(redis_client, results_collection, quiz["quiz_id"], str(quiz["_id"]))
+        print(f"Quiz {quiz['quiz_id']}: {count} results")
+    return 0
+
+
+def backfill_stats(args):
+    """Rebuild the quiz_stats documents from results"""
+    projection = {"_id": 1, "quiz_id": 1, "questions.points": 1, "duration_seconds": 1}
+    for quiz in _quizzes(args, projection):
+        count = rebuild_stats_document(results_collection, stats_collection, quiz)
+        print(f"Quiz {quiz['quiz_id']}: {count} results")
+    return 0
+
+
+def backfill_user_stats(args):
+    """Rebuild the per-user user_stats summary documents from results"""
+    rebuild_user_summaries(
+        results_collection,
+        user_stats_collection,
+        [args.user_id] if args.user_id is not None else None
+    )
+    print(f"user_stats: {user_stats_collection.count_documents({'complete': True})} users")
+    return 0
+
+
+def rescore(args):
+    """Rescore a quiz's results against its current answer key"""
+    quiz = quiz_collection.find_one({"quiz_id": args.quiz_id})
+    if not quiz:
+        print(f"Quiz {args.quiz_id} not found")
+        return 1
+
+    stats = rescore_results(results_collection, quiz, batch_size=args.batch_size)
+    print(
+        f"Quiz {args.quiz_id}: scanned {stats['scanned']}, changed {stats['changed']} "
+        f"in {stats['elapsed_seconds']:.1f}s ({stats['results_per_second']:.0f} results/s)"
+    )
+    # Also when no score changed: new points move the histogram bounds
+    rebuild_stats_document(results_collection, stats_collection, quiz)
+    if stats["changed"]:
+        rebuild_user_summaries(
+            results_collection,
+            user_stats_collection,
+            results_collection.distinct("user_id", {"quiz_id": str(quiz["_id"])})
+        )
+        if use_redis:
+            rebuild_leaderboard(redis_client, results_collection, quiz["quiz_id"], str(quiz["_id"]))
+    return 0
+
+
+def item_analytics(args):
+    """Refresh per-question analytics (folds in results stored since the last run)"""
+    for quiz in _quizzes(args, {"quiz_id": 1}):
+        report = get_item_analytics(quiz_collection, results_collection, analytics_collection, quiz["quiz_id"])
+        print(f"Quiz {quiz['quiz_id']}: {report['result_count']} results, computed at {report['computed_at']}")
+    return 0
+
+
+def _compact_batch(batch, question_ids, counts):
+    replaces, players = [], {}
+    for doc in batch:
+        compact = compact_result(doc, question_ids)
+        if not is_compact(compact):
+            counts["skipped"] += 1
+            continue
+        # Guard on enc so a concurrently migrated document is not replaced twice
+        replaces.append(ReplaceOne({"_id": doc["_id"], "enc": {"$exists": False}}, compact))
+        players.setdefault(doc.get("user_id"), doc.get("user_name", ""))
+    if replaces:
+        results_collection.bulk_write(replaces, ordered=False)
+        results_collection.database["players"].bulk_write([
+            UpdateOne({"_id": user_id}, {"$setOnInsert": {"name": name}}, upsert=True)
+            for user_id, name in players.items()
+        ], ordered=False)
+    counts["compacted"] += len(replaces)
+
+
+def compact_results(args):
+    """Rewrite legacy results into the compact encoding (answer masks, no name copies)"""
+    layouts_collection = results_collection.database["quiz_layouts"]
+    for quiz in _quizzes(args, None):
+        question_ids = AnswerKey(quiz).question_ids()
+        register_layout(layouts_collection, question_ids)
+        counts = {"compacted": 0, "skipped": 0}
+
+        cursor = results_collection.find(
+            {"quiz_id": str(quiz["_id"]), "enc": {"$exists": False}}
+        ).batch_size(args.batch_size)
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= args.batch_size:
+                _compact_batch(batch, question_ids, counts)
+                batch = []
+        if batch:
+            _compact_batch(batch, question_ids, counts)
+        # Skipped results answer questions the current version no longer has
+        print(f"Quiz {quiz['quiz_id']}: compacted {counts['compacted']}, kept legacy {counts['skipped']}")
+    return 0
+
+
+def archive(args):
+    """Move old results into results_archive (stats and leaderboards stay unchanged)"""
+    stats = archive_results(
+        results_collection,
+        older_than_days=args.older_than_days,
+        batch_size=args.batch_size,
+        pause_seconds=args.pause,
+        max_batches=args.max_batches
+    )
+    print(
+        f"Archived {stats['archived']} results older than {stats['cutoff']:%Y-%m-%d} "
+        f"into {stats['buckets_touched']} bucket writes, {stats['batches']} batches "
+        f"in {stats['elapsed_seconds']:.1f}s"
+    )
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quiz service maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = subparsers.add_parser("rebuild-leaderboards", help=rebuild_leaderboards.__doc__)
+    rebuild.add_argument("--quiz-id", type=int, help="Only rebuild this quiz (integer ID from main DB)")
+    rebuild.set_defaults(func=rebuild_leaderboards)
+
+    backfill = subparsers.add_parser("backfill-stats", help=backfill_stats.__doc__)
+    backfill.add_argument("--quiz-id", type=int, help="Only rebuild this quiz (integer ID from main DB)")
+    backfill.set_defaults(func=backfill_stats)
+
+    user_backfill = subparsers.add_parser("backfill-user-stats", help=backfill_user_stats.__doc__)
+    user_backfill.add_argument("--user-id", help="Only rebuild this user")
+    user_backfill.set_defaults(func=backfill_user_stats)
+
+    rescore_parser = subparsers.add_parser("rescore", help=rescore.__doc__)
+    rescore_parser.add_argument("--quiz-id", type=int, required=True, help="Integer ID from main DB")
+    rescore_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    rescore_parser.set_defaults(func=rescore)
+
+    analytics = subparsers.add_parser("item-analytics", help=item_analytics.__doc__)
+    analytics.add_argument("--quiz-id", type=int, help="Only this quiz (integer ID from main DB)")
+    analytics.set_defaults(func=item_analytics)
+
+    compact = subparsers.add_parser("compact-results", help=compact_results.__doc__)
+    compact.add_argument("--quiz-id", type=int, help="Only this quiz (integer ID from main DB)")
+    compact.add_argument("--batch-size", type=int, default=1000)
+    compact.set_defaults(func=compact_results)
+
+    archive_parser = subparsers.add_parser("archive-results", help=archive.__doc__)
+    archive_parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    archive_parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    archive_parser.add_argument("--pause", type=float, default=ARCHIVE_PAUSE_SECONDS, help="Seconds between batches")
+    archive_parser.add_argument("--max-batches", type=int, help="Stop after N batches (spread work over runs)")
+    archive_parser.set_defaults(func=archive)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
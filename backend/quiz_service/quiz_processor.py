@@ -0,0 +1,115 @@
+"""Quiz scoring with compiled answer keys
+
+A quiz document is compiled once per version into an AnswerKey holding, per
+question, a bitmask of the correct answer indexes and the question points.
+Scoring a submission is then one mask build and one integer compare per question.
+"""
+import threading
+
+from result_codec import MAX_OPTION_INDEX, answer_index, layout_id, register_layout
+
+# Fields needed to decide whether a cached key is still fresh
+HEAD_PROJECTION = {"_id": 1, "version": 1}
+
+
+def answer_mask(user_answer, option_count):
+    """Bitmask of the selected answer indexes, or -1 if the answer is malformed
+
+    An index outside the question's options (or above MAX_OPTION_INDEX) is
+    malformed, so a submitted index never builds an arbitrarily large int.
+    """
+    if not isinstance(user_answer, list):
+        user_answer = [user_answer]
+    limit = min(option_count, MAX_OPTION_INDEX + 1)
+    mask = 0
+    for option in user_answer:
+        index = answer_index(option)
+        if index is None or not 0 <= index < limit:
+            return -1
+        mask |= 1 << index
+    return mask
+
+
+class AnswerKey:
+    """Compiled, read-only answer key for one version of a quiz"""
+
+    __slots__ = (
+        "quiz_id", "mongo_id", "name", "version", "duration_seconds",
+        "questions", "option_counts", "max_score", "layout_id"
+    )
+
+    def __init__(self, quiz):
+        self.quiz_id = quiz.get("quiz_id")
+        self.mongo_id = str(quiz["_id"])
+        self.name = quiz.get("name", "")
+        self.version = quiz.get("version", 0)
+        self.duration_seconds = quiz.get("duration_seconds", 0)
+
+        questions = []
+        option_counts = []
+        for question in quiz.get("questions", []):
+            option_counts.append(len(question.get("answers", [])))
+            mask = 0
+            for index, answer in enumerate(question.get("answers", [])):
+                if answer.get("is_correct", False):
+                    mask |= 1 << index
+            questions.append((str(question.get("id", "")), mask, question.get("points", 0)))
+        self.questions = tuple(questions)
+        self.option_counts = tuple(option_counts)
+        self.max_score = sum(points for _, _, points in self.questions)
+        # Question order used by compact result masks
+        self.layout_id = layout_id(self.question_ids())
+
+    def question_ids(self):
+        return [question_id for question_id, _, _ in self.questions]
+
+    def score(self, user_answers):
+        """Return (total_score, max_score) for a {question_id: [answer_index, ...]} map"""
+        total = 0
+        get = user_answers.get
+        for (question_id, correct_mask, points), option_count in zip(self.questions, self.option_counts):
+            if answer_mask(get(question_id, []), option_count) == correct_mask:
+                total += points
+        return total, self.max_score
+
+
+class AnswerKeyCache:
+    """Per-process cache of compiled answer keys, invalidated by quiz version"""
+
+    def __init__(self, quiz_collection):
+        self.quiz_collection = quiz_collection
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def get(self, quiz_id):
+        """Compiled key for an integer quiz_id, or None if the quiz is not synced"""
+        # Cheap projected lookup on the unique quiz_id index decides freshness
+        head = self.quiz_collection.find_one({"quiz_id": quiz_id}, HEAD_PROJECTION)
+        cached = self.cached(quiz_id, head)
+        if cached or not head:
+            return cached
+
+        quiz = self.quiz_collection.find_one({"_id": head["_id"]})
+        return self.store(quiz_id, quiz) if quiz else None
+
+    def cached(self, quiz_id, head):
+        """Cached key if it matches the quiz head ({_id, version}), else None"""
+        if not head:
+            self.invalidate(quiz_id)
+            return None
+        cached = self._keys.get(quiz_id)
+        if cached and cached.version == head.get("version", 0) and cached.mongo_id == str(head["_id"]):
+            return cached
+        return None
+
+    def store(self, quiz_id, quiz):
+        """Compile and cache the key of a freshly loaded quiz document"""
+        key = AnswerKey(quiz)
+        register_layout(self.quiz_collection.database["quiz_layouts"], key.question_ids())
+        with self._lock:
+            self._keys[quiz_id] = key
+        return key
+
+    def invalidate(self, quiz_id):
+        with self._lock:
+            self._keys.pop(quiz_id, None)
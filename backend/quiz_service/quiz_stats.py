@@ -0,0 +1,395 @@
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+
+from archive import archived_results_union
+
+HISTOGRAM_BUCKETS = 10
+
+# Summary rebuilds run while the ResultWriter keeps folding results in: results
+# from a cutoff ObjectId on go to the document through the writer, older ones
+# through the rebuild's aggregation. The cutoff lies this far ahead of the write
+# that announces it, and the rebuild waits REBUILD_SETTLE_SECONDS past it for
+# results from before the cutoff that are still queued (several flush intervals).
+REBUILD_CUTOFF_LEAD_SECONDS = 1
+REBUILD_SETTLE_SECONDS = float(os.getenv("SUMMARY_REBUILD_SETTLE_SECONDS", "5"))
+
+# Only the fields stored in the (quiz_id, score, time_spent, _id) index,
+# so the $match + $project prefix is an index-covered scan
+COVERED_PROJECTION = {"_id": 0, "score": 1, "time_spent": 1}
+
+
+def histogram_boundaries(upper, buckets=HISTOGRAM_BUCKETS):
+    """Ascending integer $bucket boundaries covering [0, upper]"""
+    upper = max(int(math.ceil(upper)), 1)
+    step = max(int(math.ceil(upper / buckets)), 1)
+    return list(range(0, upper + 1, step)) + [upper + 1]
+
+
+def _bucket_stage(field, boundaries):
+    return {"$bucket": {
+        "groupBy": f"${field}",
+        "boundaries": boundaries,
+        "default": "overflow",
+        "output": {"count": {"$sum": 1}},
+    }}
+
+
+def _histogram(buckets, boundaries):
+    """Convert $bucket output into a dense list including empty buckets"""
+    counts = {b["_id"]: b["count"] for b in buckets}
+    histogram = [
+        {"min": low, "max": high, "count": counts.get(low, 0)}
+        for low, high in zip(boundaries, boundaries[1:])
+    ]
+    if "overflow" in counts:
+        histogram.append({"min": boundaries[-1], "max": None, "count": counts["overflow"]})
+    return histogram
+
+
+def empty_statistics(quiz_id):
+    return {
+        "quiz_id": quiz_id,
+        "total_attempts": 0,
+        "average_score": 0,
+        "average_time": 0,
+        "highest_score": 0,
+        "lowest_score": 0,
+        "median_score": 0,
+        "p90_score": 0,
+        "shortest_time": 0,
+        "longest_time": 0,
+        "median_time": 0,
+        "p90_time": 0,
+        "score_histogram": [],
+        "time_histogram": [],
+    }
+
+
+def statistics_pipeline(quiz, score_bounds, time_bounds):
+    """Single $facet pipeline computing summary, percentiles and histograms"""
+    percentiles = {"p": [0.5, 0.9], "method": "approximate"}
+    match = {"quiz_id": str(quiz["_id"])}
+    return [
+        {"$match": match},
+        {"$project": COVERED_PROJECTION},
+        # Same totals as the statistics document, which counts archived results
+        archived_results_union(match, COVERED_PROJECTION),
+        {"$facet": {
+            "summary": [{"$group": {
+                "_id": None,
+                "total_attempts": {"$sum": 1},
+                "average_score": {"$avg": "$score"},
+                "highest_score": {"$max": "$score"},
+                "lowest_score": {"$min": "$score"},
+                "score_percentiles": {"$percentile": dict(percentiles, input="$score")},
+                "average_time": {"$avg": "$time_spent"},
+                "shortest_time": {"$min": "$time_spent"},
+                "longest_time": {"$max": "$time_spent"},
+                "time_percentiles": {"$percentile": dict(percentiles, input="$time_spent")},
+            }}],
+            "score_histogram": [_bucket_stage("score", score_bounds)],
+            "time_histogram": [_bucket_stage("time_spent", time_bounds)],
+        }},
+    ]
+
+
+def statistics_from_facets(facets, quiz_id, max_score, score_bounds, time_bounds):
+    """Public statistics response built from the statistics_pipeline output"""
+    summary = (facets.get("summary") or [None])[0]
+    if not summary:
+        return empty_statistics(quiz_id)
+
+    median_score, p90_score = summary["score_percentiles"]
+    median_time, p90_time = summary["time_percentiles"]
+    return {
+        "quiz_id": quiz_id,
+        "total_attempts": summary["total_attempts"],
+        "average_score": summary["average_score"],
+        "average_time": summary["average_time"],
+        "highest_score": summary["highest_score"],
+        "lowest_score": summary["lowest_score"],
+        "median_score": median_score,
+        "p90_score": p90_score,
+        "shortest_time": summary["shortest_time"],
+        "longest_time": summary["longest_time"],
+        "median_time": median_time,
+        "p90_time": p90_time,
+        "max_possible_score": max_score,
+        "score_histogram": _histogram(facets.get("score_histogram", []), score_bounds),
+        "time_histogram": _histogram(facets.get("time_histogram", []), time_bounds),
+    }
+
+
+def compute_statistics(results_collection, quiz, quiz_id):
+    """Quiz statistics computed server-side with a single $facet pipeline"""
+    max_score = quiz_max_score(quiz)
+    score_bounds, time_bounds = quiz_bounds(max_score, quiz.get("duration_seconds"))
+    pipeline = statistics_pipeline(quiz, score_bounds, time_bounds)
+    facets = next(results_collection.aggregate(pipeline), None) or {}
+    return statistics_from_facets(facets, quiz_id, max_score, score_bounds, time_bounds)
+
+
+# --- Incrementally maintained quiz_stats documents ---
+#
+# One document per quiz, _id = integer quiz_id from the main DB. Updated with
+# $inc/$min/$max for every stored result, so reads are a single document fetch.
+# Only init_stats_document and rebuild_stats_document create it, and updates and
+# reads match the histogram bounds it was built with, so a quiz that was never
+# backfilled or whose points/duration changed uses the aggregation until rebuilt.
+# While a rebuild runs the document carries its rebuild_cutoff and is not complete.
+
+def quiz_max_score(quiz):
+    return sum(q.get("points", 0) for q in quiz.get("questions", []))
+
+
+def quiz_bounds(max_score, duration_seconds):
+    """Fixed histogram boundaries for a quiz (max possible score, duration)"""
+    return histogram_boundaries(max_score), histogram_boundaries(duration_seconds or 0)
+
+
+def stats_document_filter(quiz_id, max_score, duration_seconds):
+    """Matches the statistics document only if a rebuild completed it with these bounds"""
+    score_bounds, time_bounds = quiz_bounds(max_score, duration_seconds)
+    return {
+        "_id": quiz_id,
+        "complete": True,
+        "max_possible_score": max_score,
+        "score_bounds": score_bounds,
+        "time_bounds": time_bounds,
+    }
+
+
+def quiz_stats_filter(quiz):
+    """stats_document_filter for a quiz document"""
+    return stats_document_filter(quiz["quiz_id"], quiz_max_score(quiz), quiz.get("duration_seconds"))
+
+
+def bucket_key(value, boundaries):
+    """Index of the [low, high) bucket holding value, or 'overflow'"""
+    for index, (low, high) in enumerate(zip(boundaries, boundaries[1:])):
+        if low <= value < high:
+            return str(index)
+    return "overflow"
+
+
+def result_stats_update(max_score, duration_seconds, results):
+    """$inc/$min/$max update folding stored results of one quiz into its statistics document"""
+    score_bounds, time_bounds = quiz_bounds(max_score, duration_seconds)
+    inc = {"count": 0, "sum_score": 0, "sum_score_sq": 0, "sum_time": 0, "sum_time_sq": 0}
+    scores, times = [], []
+    for result in results:
+        score = result.get("score", 0)
+        time_spent = result.get("time_spent", 0)
+        scores.append(score)
+        times.append(time_spent)
+        inc["count"] += 1
+        inc["sum_score"] += score
+        inc["sum_score_sq"] += score * score
+        inc["sum_time"] += time_spent
+        inc["sum_time_sq"] += time_spent * time_spent
+        for field in (f"score_buckets.{bucket_key(score, score_bounds)}", f"time_buckets.{bucket_key(time_spent, time_bounds)}"):
+            inc[field] = inc.get(field, 0) + 1
+    return {
+        "$inc": inc,
+        "$min": {"min_score": min(scores), "min_time": min(times)},
+        "$max": {"max_score": max(scores), "max_time": max(times)},
+        "$set": {"updated_at": results[-1].get("submitted_at")},
+    }
+
+
+def rebuild_cutoff():
+    """ObjectId from which on results reach a document under rebuild through the writer"""
+    return ObjectId.from_datetime(datetime.utcnow() + timedelta(seconds=REBUILD_CUTOFF_LEAD_SECONDS + 1))
+
+
+def wait_for_cutoff(cutoff):
+    """Sleep until the results from before the cutoff are stored"""
+    remaining = (cutoff.generation_time - datetime.now(timezone.utc)).total_seconds() + REBUILD_SETTLE_SECONDS
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def stats_rebuild_cutoffs(stats_collection, quiz_ids):
+    """{quiz_id: rebuild_cutoff} of the statistics documents under rebuild"""
+    return {
+        doc["_id"]: doc["rebuild_cutoff"]
+        for doc in stats_collection.find(
+            {"_id": {"$in": list(quiz_ids)}, "rebuild_cutoff": {"$exists": True}}, {"rebuild_cutoff": 1}
+        )
+    }
+
+
+def stats_document_write(quiz_id, max_score, duration_seconds, results, cutoff=None):
+    """(filter, update) folding stored results into the statistics document, or None
+
+    A document under rebuild (cutoff from stats_rebuild_cutoffs) only takes the
+    results from its cutoff on, the rebuild aggregates the older ones. The filter
+    still matches once that rebuild completed.
+    """
+    query = stats_document_filter(quiz_id, max_score, duration_seconds)
+    if cutoff is not None:
+        results = [result for result in results if result["_id"] >= cutoff]
+        if not results:
+            return None
+        query["$or"] = [{"rebuild_cutoff": cutoff}, {"complete": query.pop("complete")}]
+    return query, result_stats_update(max_score, duration_seconds, results)
+
+
+def record_result_stats(stats_collection, quiz_id, max_score, duration_seconds, result):
+    """Fold one stored result into the quiz's statistics document (if it is complete)"""
+    write = stats_document_write(
+        quiz_id, max_score, duration_seconds, [result], stats_rebuild_cutoffs(stats_collection, [quiz_id]).get(quiz_id)
+    )
+    if write:
+        stats_collection.update_one(*write)
+
+
+def _bucket_list(counts, boundaries):
+    """Stored {index: count} map -> $bucket-style list used by _histogram"""
+    buckets = [
+        {"_id": low, "count": counts.get(str(index), 0)}
+        for index, low in enumerate(boundaries[:-1])
+    ]
+    if "overflow" in counts:
+        buckets.append({"_id": "overflow", "count": counts["overflow"]})
+    return buckets
+
+
+def histogram_percentile(histogram, total, p):
+    """Approximate percentile by linear interpolation inside the histogram bucket"""
+    if not total:
+        return 0
+    target = p * total
+    seen = 0
+    for bucket in histogram:
+        if bucket["count"] and seen + bucket["count"] >= target:
+            if bucket["max"] is None:
+                return bucket["min"]
+            fraction = (target - seen) / bucket["count"]
+            return bucket["min"] + fraction * (bucket["max"] - bucket["min"])
+        seen += bucket["count"]
+    return histogram[-1]["min"] if histogram else 0
+
+
+def _std_dev(total, sum_values, sum_squares):
+    mean = sum_values / total
+    return math.sqrt(max(sum_squares / total - mean * mean, 0))
+
+
+def statistics_from_document(doc, quiz_id):
+    """Public statistics response built from a quiz_stats document"""
+    total = doc.get("count", 0)
+    if not total:
+        return empty_statistics(quiz_id)
+
+    score_histogram = _histogram(_bucket_list(doc.get("score_buckets", {}), doc["score_bounds"]), doc["score_bounds"])
+    time_histogram = _histogram(_bucket_list(doc.get("time_buckets", {}), doc["time_bounds"]), doc["time_bounds"])
+    return {
+        "quiz_id": quiz_id,
+        "total_attempts": total,
+        "average_score": doc["sum_score"] / total,
+        "average_time": doc["sum_time"] / total,
+        "highest_score": doc["max_score"],
+        "lowest_score": doc["min_score"],
+        "std_dev_score": _std_dev(total, doc["sum_score"], doc["sum_score_sq"]),
+        "median_score": histogram_percentile(score_histogram, total, 0.5),
+        "p90_score": histogram_percentile(score_histogram, total, 0.9),
+        "shortest_time": doc["min_time"],
+        "longest_time": doc["max_time"],
+        "std_dev_time": _std_dev(total, doc["sum_time"], doc["sum_time_sq"]),
+        "median_time": histogram_percentile(time_histogram, total, 0.5),
+        "p90_time": histogram_percentile(time_histogram, total, 0.9),
+        "max_possible_score": doc.get("max_possible_score"),
+        "score_histogram": score_histogram,
+        "time_histogram": time_histogram,
+        "updated_at": doc["updated_at"].isoformat() if hasattr(doc.get("updated_at"), "isoformat") else doc.get("updated_at"),
+    }
+
+
+def _empty_stats_document(quiz, score_bounds, time_bounds):
+    return {
+        "count": 0, "sum_score": 0, "sum_score_sq": 0, "sum_time": 0, "sum_time_sq": 0,
+        "score_buckets": {},
+        "time_buckets": {},
+        "score_bounds": score_bounds,
+        "time_bounds": time_bounds,
+        "max_possible_score": quiz_max_score(quiz),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def init_stats_document(stats_collection, quiz):
+    """Complete empty statistics document for a quiz that has no results yet"""
+    score_bounds, time_bounds = quiz_bounds(quiz_max_score(quiz), quiz.get("duration_seconds"))
+    stats_collection.replace_one(
+        {"_id": quiz["quiz_id"]}, dict(_empty_stats_document(quiz, score_bounds, time_bounds), complete=True), upsert=True
+    )
+
+
+def rebuild_stats_document(results_collection, stats_collection, quiz):
+    """Recompute a quiz's statistics document from results and mark it complete
+
+    The document restarts empty with a rebuild cutoff: the ResultWriter folds
+    newer results into it, and once the older ones are all stored their
+    aggregation is added with $inc. Returns the number of aggregated results.
+    """
+    score_bounds, time_bounds = quiz_bounds(quiz_max_score(quiz), quiz.get("duration_seconds"))
+    cutoff = rebuild_cutoff()
+    stats_collection.replace_one(
+        {"_id": quiz["quiz_id"]},
+        dict(_empty_stats_document(quiz, score_bounds, time_bounds), complete=False, rebuild_cutoff=cutoff),
+        upsert=True
+    )
+    wait_for_cutoff(cutoff)
+
+    match = {"quiz_id": str(quiz["_id"]), "_id": {"$lt": cutoff}}
+    pipeline = [
+        {"$match": match},
+        {"$project": COVERED_PROJECTION},
+        # Archived results still count towards the quiz's statistics
+        archived_results_union(match, COVERED_PROJECTION),
+        {"$facet": {
+            "summary": [{"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "sum_score": {"$sum": "$score"},
+                "sum_score_sq": {"$sum": {"$multiply": ["$score", "$score"]}},
+                "sum_time": {"$sum": "$time_spent"},
+                "sum_time_sq": {"$sum": {"$multiply": ["$time_spent", "$time_spent"]}},
+                "min_score": {"$min": "$score"},
+                "max_score": {"$max": "$score"},
+                "min_time": {"$min": "$time_spent"},
+                "max_time": {"$max": "$time_spent"},
+            }}],
+            "score_buckets": [_bucket_stage("score", score_bounds)],
+            "time_buckets": [_bucket_stage("time_spent", time_bounds)],
+        }},
+    ]
+    facets = next(results_collection.aggregate(pipeline), None) or {}
+    summary = (facets.get("summary") or [None])[0]
+
+    update = {
+        "$set": {"complete": True, "updated_at": datetime.utcnow()},
+        "$unset": {"rebuild_cutoff": ""},
+    }
+    if summary:
+        index_of = {
+            field: {low: str(i) for i, low in enumerate(boundaries[:-1])}
+            for field, boundaries in (("score_buckets", score_bounds), ("time_buckets", time_bounds))
+        }
+        inc = {field: summary[field] for field in ("count", "sum_score", "sum_score_sq", "sum_time", "sum_time_sq")}
+        for field, lows in index_of.items():
+            for bucket in facets.get(field, []):
+                inc[f"{field}.{lows.get(bucket['_id'], 'overflow')}"] = bucket["count"]
+        update.update({
+            "$inc": inc,
+            "$min": {"min_score": summary["min_score"], "min_time": summary["min_time"]},
+            "$max": {"max_score": summary["max_score"], "max_time": summary["max_time"]},
+        })
+    # Matches nothing if a newer rebuild restarted the document in the meantime
+    stats_collection.update_one({"_id": quiz["quiz_id"], "rebuild_cutoff": cutoff}, update)
+    return summary["count"] if summary else 0
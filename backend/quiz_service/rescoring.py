@@ -0,0 +1,146 @@
+"""Vectorized bulk rescoring of stored results
+
+Used when a quiz's answer key changes after results were recorded. Results are
+streamed in batches, encoded into NumPy boolean matrices and scored against the
+new key in one shot per batch; only changed scores are written back.
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+from pymongo import UpdateOne
+
+from quiz_processor import AnswerKey
+from result_codec import MAX_OPTION_INDEX, LayoutCache, answer_index, decode_answers, is_compact
+
+DEFAULT_BATCH_SIZE = 5000
+
+# answers for legacy results, enc/layout/masks for compact ones
+RESCORE_PROJECTION = {"answers": 1, "enc": 1, "layout": 1, "masks": 1, "score": 1, "max_score": 1}
+
+
+class KeyMatrix:
+    """Answer key as arrays: key[q, a] is True if option a of question q is correct"""
+
+    def __init__(self, answer_key):
+        self.version = answer_key.version
+        self.layout_id = answer_key.layout_id
+        self.max_score = answer_key.max_score
+        self.question_index = {qid: q for q, (qid, _, _) in enumerate(answer_key.questions)}
+        masks = [mask for _, mask, _ in answer_key.questions]
+        self.n_options = max(list(answer_key.option_counts) + [mask.bit_length() for mask in masks] + [1])
+        self.key = np.array(
+            [[bool(mask >> a & 1) for a in range(self.n_options)] for mask in masks],
+            dtype=bool
+        ).reshape(len(masks), self.n_options)
+        self.points = np.array([points for _, _, points in answer_key.questions], dtype=np.int64)
+
+
+def encode_answers(answer_maps, key_matrix):
+    """Encode answer maps into (selected[n, Q, A], invalid[n, Q]) boolean matrices"""
+    n = len(answer_maps)
+    n_questions = len(key_matrix.question_index)
+    selected = np.zeros((n, n_questions, key_matrix.n_options), dtype=bool)
+    invalid = np.zeros((n, n_questions), dtype=bool)
+    rows, cols, opts = [], [], []
+    question_index = key_matrix.question_index
+    n_options = key_matrix.n_options
+
+    for r, answers in enumerate(answer_maps):
+        for question_id, user_answer in (answers or {}).items():
+            q = question_index.get(question_id)
+            if q is None:
+                continue
+            if not isinstance(user_answer, list):
+                user_answer = [user_answer]
+            for option in user_answer:
+                option = answer_index(option)
+                if option is not None and 0 <= option < n_options:
+                    rows.append(r)
+                    cols.append(q)
+                    opts.append(option)
+                else:
+                    invalid[r, q] = True
+
+    if rows:
+        selected[rows, cols, opts] = True
+    return selected, invalid
+
+
+def encode_mask_rows(mask_rows, key_matrix):
+    """Same matrices as encode_answers, built directly from compact masks in key order"""
+    masks = np.array(mask_rows, dtype=np.int64).reshape(len(mask_rows), len(key_matrix.question_index))
+    options = np.arange(key_matrix.n_options, dtype=np.int64)
+    selected = (masks[:, :, None] >> options & 1).astype(bool)
+    # Bits past the last option are indexes the quiz does not have
+    invalid = (masks >> key_matrix.n_options) != 0
+    return selected, invalid
+
+
+def encode_documents(docs, key_matrix, layouts):
+    """Answer matrices for a batch of result documents in either encoding"""
+    fast = key_matrix.n_options <= MAX_OPTION_INDEX + 1
+    if fast and all(is_compact(doc) and doc["layout"] == key_matrix.layout_id for doc in docs):
+        return encode_mask_rows([doc["masks"] for doc in docs], key_matrix)
+    return encode_answers([decode_answers(doc, layouts) for doc in docs], key_matrix)
+
+
+def score_batch(selected, invalid, key_matrix):
+    """Scores for a whole batch: exact match of the selection per question"""
+    if selected.shape[1] == 0:
+        return np.zeros(selected.shape[0], dtype=np.int64)
+    correct = (selected == key_matrix.key).all(axis=2) & ~invalid
+    return correct.astype(np.int64) @ key_matrix.points
+
+
+def _rescore_batch(results_collection, batch, key_matrix, layouts, stats):
+    selected, invalid = encode_documents(batch, key_matrix, layouts)
+    scores = score_batch(selected, invalid, key_matrix)
+
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {
+                "score": int(score),
+                "max_score": key_matrix.max_score,
+                "quiz_version": key_matrix.version,
+                "rescored_at": now,
+            }}
+        )
+        for doc, score in zip(batch, scores)
+        if doc.get("score") != score or doc.get("max_score") != key_matrix.max_score
+    ]
+    if updates:
+        results_collection.bulk_write(updates, ordered=False)
+    stats["scanned"] += len(batch)
+    stats["changed"] += len(updates)
+
+
+def rescore_results(results_collection, quiz, batch_size=DEFAULT_BATCH_SIZE):
+    """Rescore every stored result of a quiz against its current answer key"""
+    key_matrix = KeyMatrix(AnswerKey(quiz))
+    layouts = LayoutCache(results_collection.database["quiz_layouts"])
+    stats = {"quiz_id": quiz.get("quiz_id"), "version": key_matrix.version, "scanned": 0, "changed": 0}
+    start = time.perf_counter()
+
+    cursor = results_collection.find(
+        {"quiz_id": str(quiz["_id"])}, RESCORE_PROJECTION
+    ).batch_size(batch_size)
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            _rescore_batch(results_collection, batch, key_matrix, layouts, stats)
+            batch = []
+    if batch:
+        _rescore_batch(results_collection, batch, key_matrix, layouts, stats)
+
+    stats["elapsed_seconds"] = time.perf_counter() - start
+    stats["results_per_second"] = stats["scanned"] / stats["elapsed_seconds"] if stats["elapsed_seconds"] else 0
+    return stats
+
+
+def answer_key_changed(old_quiz, new_quiz):
+    """True if the compiled keys differ (correct answers or points)"""
+    return AnswerKey(old_quiz).questions != AnswerKey(new_quiz).questions
@@ -0,0 +1,200 @@
+"""Compact storage encoding for result documents
+
+Legacy results (no "enc" field) store answers as {"<question id>": ["<index>", ...]}
+plus quiz_name and user_name copies. Compact results (enc = 2) store instead:
+
+    layout  id of the question order in quiz_layouts ({_id, question_ids})
+    masks   one bitmask of selected answer indexes per question, in layout order
+
+quiz_name is normalized out and comes from quizzes. user_name stays in the
+document: it is the name at submission time, so renaming a player does not
+rewrite their history. (Compact results written before that carry no user_name
+and take it from players, {_id: user_id, name}.) A result is only compacted
+when the encoding is exact (every question known, every index an answer_index
+in 0..MAX_OPTION_INDEX); anything else stays in the legacy format, so both
+encodings coexist in one collection.
+
+decode_results() restores the legacy shape for API responses.
+"""
+import hashlib
+
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+
+ENCODING_VERSION = 2
+
+# Masks are stored as BSON int64
+MAX_OPTION_INDEX = 62
+
+# Fields a compact document needs for decoding
+COMPACT_FIELDS = ("enc", "layout", "masks")
+
+
+def answer_index(option):
+    """Answer index of one submitted option, or None if it is not one
+
+    Accepts ints (not bools) and strings of ASCII digits, surrounding spaces
+    allowed. Scoring, rescoring and encode_masks all use it, so an answer means
+    the same in either encoding.
+    """
+    if isinstance(option, bool):
+        return None
+    if isinstance(option, int):
+        return option
+    if isinstance(option, str):
+        option = option.strip()
+        if option.isascii() and option.isdigit():
+            return int(option)
+    return None
+
+
+def layout_id(question_ids):
+    """Stable id of an ordered list of question ids"""
+    return hashlib.sha1("\x1f".join(question_ids).encode()).hexdigest()[:16]
+
+
+def encode_masks(answers, question_ids):
+    """Per-question bitmasks in question_ids order, or None if not exactly encodable"""
+    position = {question_id: q for q, question_id in enumerate(question_ids)}
+    if len(position) != len(question_ids):
+        return None
+    masks = [0] * len(question_ids)
+    for question_id, user_answer in (answers or {}).items():
+        q = position.get(str(question_id))
+        if q is None:
+            return None
+        if not isinstance(user_answer, list):
+            user_answer = [user_answer]
+        for option in user_answer:
+            index = answer_index(option)
+            if index is None or not 0 <= index <= MAX_OPTION_INDEX:
+                return None
+            masks[q] |= 1 << index
+    return masks
+
+
+def decode_masks(masks, question_ids):
+    """Answers map ({question id: [index, ...]}) for the answered questions"""
+    return {
+        question_id: [index for index in range(mask.bit_length()) if mask >> index & 1]
+        for question_id, mask in zip(question_ids, masks)
+        if mask
+    }
+
+
+def compact_result(result, question_ids):
+    """Compact copy of a legacy result document, or the document itself if not encodable"""
+    masks = encode_masks(result.get("answers"), question_ids)
+    if masks is None:
+        return result
+    compact = {k: v for k, v in result.items() if k not in ("answers", "quiz_name")}
+    compact.update({"enc": ENCODING_VERSION, "layout": layout_id(question_ids), "masks": masks})
+    return compact
+
+
+def is_compact(doc):
+    return doc.get("enc") == ENCODING_VERSION
+
+
+def register_layout(layouts_collection, question_ids):
+    """Store a question order once (content-addressed, never changes)"""
+    layout = layout_id(question_ids)
+    layouts_collection.update_one(
+        {"_id": layout}, {"$setOnInsert": {"question_ids": list(question_ids)}}, upsert=True
+    )
+    return layout
+
+
+class LayoutCache:
+    """Per-process cache of quiz_layouts; entries are immutable so never invalidated"""
+
+    def __init__(self, layouts_collection):
+        self.layouts_collection = layouts_collection
+        self._layouts = {}
+
+    def get(self, layout):
+        if layout not in self._layouts:
+            doc = self.layouts_collection.find_one({"_id": layout})
+            if doc is None:
+                return None
+            self._layouts[layout] = tuple(doc["question_ids"])
+        return self._layouts[layout]
+
+    def put(self, layout, question_ids):
+        self._layouts[layout] = tuple(question_ids)
+
+
+def decode_answers(doc, layouts):
+    """Answers map of a result in either encoding"""
+    if not is_compact(doc):
+        return doc.get("answers")
+    question_ids = layouts.get(doc["layout"])
+    if question_ids is None:
+        # Never guess: an empty map would silently rescore the result to zero
+        raise LookupError(f"Unknown result layout: {doc['layout']}")
+    return decode_masks(doc["masks"], question_ids)
+
+
+# --- Name normalization ---
+
+def name_lookups(docs):
+    """(quiz ObjectIds, user ids) whose names compact documents are missing"""
+    quiz_ids, user_ids = set(), set()
+    for doc in docs:
+        if not is_compact(doc):
+            continue
+        if "quiz_id" in doc and "quiz_name" not in doc:
+            try:
+                quiz_ids.add(ObjectId(doc["quiz_id"]))
+            except (InvalidId, TypeError):
+                pass
+        if "user_id" in doc and "user_name" not in doc:
+            user_ids.add(doc["user_id"])
+    return quiz_ids, user_ids
+
+
+def apply_decoding(docs, quiz_names, user_names, layouts=None):
+    """Restore the legacy shape in place; answers are decoded only if layouts is given"""
+    for doc in docs:
+        if not is_compact(doc):
+            continue
+        if "quiz_id" in doc:
+            doc.setdefault("quiz_name", quiz_names.get(doc["quiz_id"], ""))
+        if "user_id" in doc:
+            doc.setdefault("user_name", user_names.get(doc["user_id"], ""))
+        if layouts is not None and "masks" in doc:
+            doc["answers"] = decode_answers(doc, layouts)
+        for field in COMPACT_FIELDS:
+            doc.pop(field, None)
+    return docs
+
+
+def decode_results(db, docs, layouts=None):
+    """Decode result documents read from db (one name lookup per collection)
+
+    Only the names of fields present in the documents are resolved, so narrow
+    projections stay narrow. Pass a LayoutCache to also decode answers.
+    """
+    quiz_ids, user_ids = name_lookups(docs)
+    quiz_names = {
+        str(quiz["_id"]): quiz.get("name", "")
+        for quiz in db["quizzes"].find({"_id": {"$in": list(quiz_ids)}}, {"name": 1})
+    } if quiz_ids else {}
+    user_names = {
+        player["_id"]: player.get("name", "")
+        for player in db["players"].find({"_id": {"$in": list(user_ids)}})
+    } if user_ids else {}
+    return apply_decoding(docs, quiz_names, user_names, layouts)
+
+
+def decoded_batches(results_collection, cursor, batch_size, layouts=None):
+    """Iterate a results cursor in decoded lists of up to batch_size documents"""
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield decode_results(results_collection.database, batch, layouts)
+            batch = []
+    if batch:
+        yield decode_results(results_collection.database, batch, layouts)
+
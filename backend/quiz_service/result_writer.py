@@ -0,0 +1,223 @@
+"""Batched writes of scored results
+
+Scoring processes no longer write to MongoDB themselves: they put the scored
+result on a multiprocessing queue (ResultWriter.submit) and exit. A writer
+thread in the service process drains the queue and flushes every
+RESULT_FLUSH_INTERVAL_MS, or as soon as RESULT_BATCH_SIZE results are waiting:
+
+    results     one insert_many(ordered=False), duplicates rejected by dedupe_key_1
+    quiz_stats  one merged update per quiz
+    user_stats  one merged update per user
+    players     one upsert per user
+
+A result therefore waits at most the flush interval plus one flush before it
+is stored, and a burst of N results costs a few round trips instead of ~4N.
+Redis work (statuses, leaderboards, mail) is left to the on_stored callback;
+rows rejected as duplicates go to on_duplicate, rows that were not stored to
+on_failed. Queued results live only in this process: a restart loses them, and
+their submission claims expire (indexes.SUBMISSION_CLAIM_TTL_SECONDS) so the
+client can retry.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from quiz_stats import stats_document_write, stats_rebuild_cutoffs
+from user_results import user_stats_states, user_stats_write
+
+RESULT_BATCH_SIZE = int(os.getenv("RESULT_BATCH_SIZE", "500"))
+# Latency ceiling: the oldest waiting result is flushed after this long
+RESULT_FLUSH_INTERVAL_MS = int(os.getenv("RESULT_FLUSH_INTERVAL_MS", "200"))
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class ResultWriter:
+    """Buffers scored results from worker processes and writes them in batches
+
+    Queue items are dicts with:
+        result      full result document (names, decoded answers) for callbacks
+        stored      document to insert (compact encoding when possible)
+        stats       (quiz_id, max_score, duration_seconds) of the quiz_stats document
+        dedupe_key  claim to release if the write fails, or None
+        email       (to, subject, html body)
+    """
+
+    def __init__(self, db, on_stored, on_failed, on_duplicate,
+                 batch_size=RESULT_BATCH_SIZE, flush_interval_ms=RESULT_FLUSH_INTERVAL_MS):
+        self.db = db
+        self.on_stored = on_stored
+        self.on_failed = on_failed
+        self.on_duplicate = on_duplicate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        # Created before any scoring process is forked, so workers inherit it; spawn
+        # context so it can also be handed to spawned pool workers (app.start_process_pool)
+        self.queue = multiprocessing.get_context("spawn").Queue()
+        self.metrics = {
+            "flushes": 0, "stored": 0, "duplicates": 0, "failed": 0,
+            "flush_seconds": 0.0, "max_batch": 0, "max_wait_seconds": 0.0,
+        }
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        """Hand a scored result to the writer (called from scoring processes)"""
+        item["queued_at"] = time.time()
+        self.queue.put(item)
+
+    def start(self):
+        """Start the writer thread in this process if it is not running yet"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or the ceiling hits"""
+        items = [self.queue.get()]
+        deadline = items[0]["queued_at"] + self.flush_interval
+        while len(items) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            try:
+                items = self._collect()
+            except (EOFError, OSError, ValueError):
+                # Queue closed at interpreter shutdown
+                return
+            try:
+                self.flush(items)
+            except Exception as e:
+                # Only reached if the insert failed and its outcome could not be checked
+                print(f"Result batch of {len(items)} failed: {str(e)}")
+                self.metrics["failed"] += len(items)
+                self._callback(self.on_failed, items)
+
+    def _callback(self, callback, items):
+        """Run a callback; its errors never turn stored results into failed ones"""
+        if not items:
+            return
+        try:
+            callback(items)
+        except Exception as e:
+            print(f"Result writer callback {callback.__name__} failed for {len(items)} results: {str(e)}")
+
+    def _insert(self, items):
+        """insert_many the batch; returns {index: error code} of the rows that were not inserted"""
+        try:
+            self.db["results"].insert_many([item["stored"] for item in items], ordered=False)
+            return {}
+        except BulkWriteError as e:
+            # ordered=False: everything except the reported indexes was inserted
+            return {error["index"]: error.get("code") for error in e.details.get("writeErrors", [])}
+        except Exception as e:
+            # e.g. connection lost mid-batch: part of it may be stored, so ask which rows made it
+            print(f"Result insert interrupted, checking which rows were stored: {str(e)}")
+            inserted = {
+                doc["_id"] for doc in self.db["results"].find(
+                    {"_id": {"$in": [item["stored"]["_id"] for item in items if "_id" in item["stored"]]}}, {"_id": 1}
+                )
+            }
+            return {
+                index: None for index, item in enumerate(items)
+                if item["stored"].get("_id") not in inserted
+            }
+
+    def flush(self, items):
+        """Write one batch; returns the items that were stored"""
+        start = time.perf_counter()
+        rejected = self._insert(items)
+
+        stored, duplicates, failed = [], [], []
+        for index, item in enumerate(items):
+            if index not in rejected:
+                item["result"]["_id"] = item["stored"]["_id"]
+                stored.append(item)
+            elif rejected[index] == DUPLICATE_KEY_ERROR:
+                print(f"Submission {item['result']['submission_id']} already stored under its dedupe key")
+                duplicates.append(item)
+            else:
+                failed.append(item)
+
+        if stored:
+            try:
+                self._write_summaries([item["result"] for item in stored], [item["stats"] for item in stored])
+            except Exception as e:
+                # Results are stored, so do not fail them; summaries can be rebuilt
+                print(f"Summary update failed (rebuild with manage.py backfill-stats/backfill-user-stats): {str(e)}")
+        self.metrics["failed"] += len(failed)
+        self.metrics["duplicates"] += len(duplicates)
+        self._callback(self.on_failed, failed)
+        self._callback(self.on_duplicate, duplicates)
+        self._callback(self.on_stored, stored)
+
+        now = time.time()
+        self.metrics["flushes"] += 1
+        self.metrics["stored"] += len(stored)
+        self.metrics["flush_seconds"] += time.perf_counter() - start
+        self.metrics["max_batch"] = max(self.metrics["max_batch"], len(items))
+        self.metrics["max_wait_seconds"] = max(self.metrics["max_wait_seconds"], now - items[0]["queued_at"])
+        return stored
+
+    def _write_summaries(self, results, stats):
+        by_quiz, by_user = {}, {}
+        for result, quiz_stats in zip(results, stats):
+            by_quiz.setdefault(tuple(quiz_stats), []).append(result)
+            by_user.setdefault(result["user_id"], []).append(result)
+
+        # No upsert: incomplete or outdated documents are left to rebuild_stats_document,
+        # documents under rebuild only take the results from its cutoff on
+        cutoffs = stats_rebuild_cutoffs(self.db["quiz_stats"], {quiz_id for quiz_id, _, _ in by_quiz})
+        stats_writes = [
+            stats_document_write(quiz_id, max_score, duration_seconds, quiz_results, cutoffs.get(quiz_id))
+            for (quiz_id, max_score, duration_seconds), quiz_results in by_quiz.items()
+        ]
+        stats_writes = [UpdateOne(query, update) for query, update in filter(None, stats_writes)]
+        if stats_writes:
+            self.db["quiz_stats"].bulk_write(stats_writes, ordered=False)
+
+        states = user_stats_states(self.db["user_stats"], by_user)
+        user_writes = [
+            UpdateOne(query, update, upsert=upsert)
+            for query, update, upsert in filter(None, (
+                user_stats_write(user_id, user_results, states) for user_id, user_results in by_user.items()
+            ))
+        ]
+        if user_writes:
+            try:
+                self.db["user_stats"].bulk_write(user_writes, ordered=False)
+            except BulkWriteError as e:
+                # Upserts of documents a rebuild created since the states were read; it counts these results
+                if any(error.get("code") != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                    raise
+        # Compact results stored before user_name was kept take the name from players
+        self.db["players"].bulk_write([
+            UpdateOne({"_id": user_id}, {"$set": {"name": user_results[-1].get("user_name", "")}}, upsert=True)
+            for user_id, user_results in by_user.items()
+        ], ordered=False)
+
+    def snapshot(self):
+        """Metrics plus derived throughput and queue depth"""
+        metrics = dict(self.metrics)
+        metrics["results_per_second"] = metrics["stored"] / metrics["flush_seconds"] if metrics["flush_seconds"] else 0
+        metrics["average_batch"] = metrics["stored"] / metrics["flushes"] if metrics["flushes"] else 0
+        try:
+            metrics["queued"] = self.queue.qsize()
+        except NotImplementedError:
+            metrics["queued"] = None
+        metrics["running"] = bool(self._thread and self._thread.is_alive())
+        return metrics
@@ -0,0 +1,91 @@
+"""Streaming export of a quiz's results as NDJSON or CSV
+
+Rows are read from a Mongo cursor in EXPORT_BATCH_SIZE batches, in leaderboard
+order (served by the quiz_score_time_id index, no in-memory sort), and written
+out in chunks, so memory stays flat regardless of the number of results.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from leaderboard import LEADERBOARD_SORT
+from result_codec import LayoutCache, decoded_batches
+
+EXPORT_BATCH_SIZE = 1000
+ROWS_PER_CHUNK = 500
+
+EXPORT_FIELDS = [
+    "submission_id", "user_id", "user_name", "score", "max_score",
+    "time_spent", "submitted_at", "quiz_version",
+]
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _export_row(doc, include_answers):
+    row = {field: doc.get(field) for field in EXPORT_FIELDS}
+    if isinstance(row["submitted_at"], datetime):
+        row["submitted_at"] = row["submitted_at"].isoformat()
+    if include_answers:
+        row["answers"] = doc.get("answers")
+    return row
+
+
+def export_cursor(results_collection, mongo_quiz_id, include_answers=False, batch_size=EXPORT_BATCH_SIZE):
+    projection = {"_id": 0, "enc": 1, **{field: 1 for field in EXPORT_FIELDS}}
+    if include_answers:
+        projection.update({"answers": 1, "layout": 1, "masks": 1})
+    return results_collection.find(
+        {"quiz_id": mongo_quiz_id}, projection
+    ).sort(LEADERBOARD_SORT).batch_size(batch_size)
+
+
+def stream_ndjson(cursor, include_answers=False):
+    chunk = []
+    for doc in cursor:
+        chunk.append(json.dumps(_export_row(doc, include_answers)))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+def stream_csv(cursor, include_answers=False):
+    fields = EXPORT_FIELDS + (["answers"] if include_answers else [])
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    rows = 0
+    for doc in cursor:
+        row = _export_row(doc, include_answers)
+        if include_answers:
+            row["answers"] = json.dumps(row["answers"])
+        writer.writerow(row)
+        rows += 1
+        if rows % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def decoded_rows(results_collection, cursor, include_answers=False, batch_size=EXPORT_BATCH_SIZE):
+    """Documents of the cursor in legacy shape, names resolved once per batch"""
+    layouts = LayoutCache(results_collection.database["quiz_layouts"]) if include_answers else None
+    for batch in decoded_batches(results_collection, cursor, batch_size, layouts):
+        yield from batch
+
+
+def stream_export(results_collection, mongo_quiz_id, export_format, include_answers=False):
+    cursor = export_cursor(results_collection, mongo_quiz_id, include_answers)
+    stream = stream_csv if export_format == "csv" else stream_ndjson
+    try:
+        yield from stream(decoded_rows(results_collection, cursor, include_answers), include_answers)
+    finally:
+        cursor.close()
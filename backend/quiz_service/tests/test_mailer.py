@@ -0,0 +1,138 @@
+import json
+import smtplib
+import socket
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+controller_module = pytest.importorskip("aiosmtpd.controller")
+
+from mailer import (
+    MAIL_DEAD_KEY, MAIL_METRICS_KEY, MAIL_PROCESSING_KEY, MAIL_QUEUE_KEY, MAIL_RETRY_KEY,
+    MailDispatcher, enqueue_email,
+)
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.recipients = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.recipients += envelope.rcpt_tos
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def test_sends_batch_and_acks(redis_client, smtp_server):
+    controller, handler = smtp_server
+    for i in range(3):
+        enqueue_email(redis_client, f"user{i}@example.com", "Quiz Results", "<p>7 / 10</p>")
+    dispatcher = MailDispatcher(redis_client, controller.hostname, controller.port, batch_size=10)
+
+    assert dispatcher.run_once(block_seconds=1) == 3
+    dispatcher._close()
+
+    assert sorted(handler.recipients) == [f"user{i}@example.com" for i in range(3)]
+    assert redis_client.llen(MAIL_QUEUE_KEY) == 0
+    assert redis_client.llen(MAIL_PROCESSING_KEY) == 0
+    assert redis_client.hget(MAIL_METRICS_KEY, "sent") == "3"
+
+
+def test_undecodable_message_is_dead_lettered(redis_client, smtp_server):
+    controller, handler = smtp_server
+    redis_client.rpush(MAIL_QUEUE_KEY, "{not json", json.dumps({"to": "a@example.com"}))
+    enqueue_email(redis_client, "ok@example.com", "Quiz Results", "<p>ok</p>")
+    dispatcher = MailDispatcher(redis_client, controller.hostname, controller.port)
+
+    dispatcher.run_once(block_seconds=1)
+    dispatcher._close()
+
+    assert handler.recipients == ["ok@example.com"]
+    dead = [json.loads(raw) for raw in redis_client.lrange(MAIL_DEAD_KEY, 0, -1)]
+    assert [entry["raw"] for entry in dead] == ["{not json", json.dumps({"to": "a@example.com"})]
+    assert redis_client.llen(MAIL_PROCESSING_KEY) == 0
+
+
+def test_failed_send_is_retried_then_dead_lettered(redis_client):
+    enqueue_email(redis_client, "user@example.com", "Quiz Results", "<p>7 / 10</p>")
+    # Nothing listens on this port, every send fails
+    dispatcher = MailDispatcher(redis_client, "127.0.0.1", free_port(), max_attempts=2, base_backoff=0)
+
+    dispatcher.run_once(block_seconds=1)
+    assert redis_client.zcard(MAIL_RETRY_KEY) == 1
+    assert redis_client.llen(MAIL_PROCESSING_KEY) == 0
+
+    # Back-off of 0: the retry is promoted and fails for good
+    dispatcher.run_once(block_seconds=1)
+    assert redis_client.zcard(MAIL_RETRY_KEY) == 0
+    assert redis_client.llen(MAIL_PROCESSING_KEY) == 0
+    dead = json.loads(redis_client.lindex(MAIL_DEAD_KEY, 0))
+    assert dead["to"] == "user@example.com" and dead["attempts"] == 2
+
+
+class DroppedConnection:
+    """Pooled connection the server hangs up on right after NOOP"""
+
+    def __init__(self):
+        self.closed = False
+
+    def noop(self):
+        return 250, b"OK"
+
+    def send_message(self, msg):
+        raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+    def quit(self):
+        raise smtplib.SMTPServerDisconnected("please run connect() first")
+
+    def close(self):
+        self.closed = True
+
+
+def test_dropped_connection_is_closed_and_resent(redis_client, smtp_server):
+    controller, handler = smtp_server
+    enqueue_email(redis_client, "user@example.com", "Quiz Results", "<p>7 / 10</p>")
+    dispatcher = MailDispatcher(redis_client, controller.hostname, controller.port)
+    dropped = dispatcher._smtp = DroppedConnection()
+
+    assert dispatcher.run_once(block_seconds=1) == 1
+    dispatcher._close()
+
+    assert dropped.closed
+    assert handler.recipients == ["user@example.com"]
+
+
+def test_unacked_messages_are_requeued(redis_client, smtp_server):
+    controller, handler = smtp_server
+    enqueue_email(redis_client, "first@example.com", "Quiz Results", "<p>1</p>")
+    enqueue_email(redis_client, "second@example.com", "Quiz Results", "<p>2</p>")
+    dispatcher = MailDispatcher(redis_client, controller.hostname, controller.port, batch_size=1)
+    # A dispatcher that died after taking the first message
+    dispatcher._next_batch(block_seconds=1)
+
+    assert dispatcher.requeue_unacked() == 1
+    assert dispatcher.run_once(block_seconds=1) == 1
+    dispatcher._close()
+
+    assert handler.recipients == ["first@example.com"]
+    assert redis_client.llen(MAIL_QUEUE_KEY) == 1
@@ -0,0 +1,382 @@
+"""Paginated result history and maintained per-user summaries
+
+History pages are read newest first over the (user_id, submitted_at, _id) index
+(or (user_id, quiz_id, submitted_at, _id) when filtered by quiz) with a
+projection that leaves out the answers map.
+
+user_stats holds one small document per user, _id = user_id:
+    attempts, sum_score, sum_max_score, total_time, last_submitted_at
+    quizzes.<mongo quiz id>: {quiz_name, attempts, best_score, max_score}
+    complete    set by rebuild_user_summaries
+
+Summaries are read from a document only once a rebuild marked it complete,
+otherwise from the same aggregation run for that one user. After a full rebuild
+(BACKFILL_MARKER_ID) a user without a document has no earlier results, so the
+writer may create the document on the user's first result.
+
+A rebuild runs next to the writer: it resets the documents and tags them with
+a run (a REBUILD_RUN_PREFIX document holding the run's cutoff ObjectId). The
+writer folds results from the cutoff on into tagged documents, and the rebuild
+adds its aggregation of the older results on top.
+"""
+from datetime import datetime, timezone
+
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING, UpdateOne
+
+from archive import ARCHIVE_COLLECTION, archived_results_union, month_bucket
+from quiz_stats import rebuild_cutoff, wait_for_cutoff
+from result_codec import decode_results
+
+USER_RESULT_PROJECTION = {
+    "submission_id": 1, "quiz_id": 1, "quiz_name": 1, "quiz_version": 1,
+    "score": 1, "max_score": 1, "time_spent": 1, "submitted_at": 1,
+    # Compact results carry no quiz_name, enc marks them for decoding
+    "enc": 1,
+}
+
+# Matches the user_submitted_at_id / user_quiz_submitted_at indexes
+USER_RESULT_SORT = [("submitted_at", DESCENDING), ("_id", DESCENDING)]
+
+# user_stats document recording the last full rebuild
+BACKFILL_MARKER_ID = "_backfill"
+# user_stats documents of running rebuilds, "<prefix><ObjectId>"
+REBUILD_RUN_PREFIX = "_rebuild:"
+
+
+def encode_user_cursor(row):
+    """Cursor pointing after the given row: '<submitted_at epoch ms>:<result_id>'"""
+    submitted_at = row["submitted_at"].replace(tzinfo=timezone.utc)
+    return f"{int(submitted_at.timestamp() * 1000)}:{row['_id']}"
+
+
+def decode_user_cursor(cursor):
+    """Parse a history cursor; raises ValueError"""
+    try:
+        millis, result_id = cursor.split(":")
+        submitted_at = datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc).replace(tzinfo=None)
+        return submitted_at, ObjectId(result_id)
+    except (AttributeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def user_page_query(user_id, cursor=None, mongo_quiz_id=None):
+    """Filter for one history page, starting after the cursor"""
+    query = {"user_id": user_id}
+    if mongo_quiz_id:
+        query["quiz_id"] = mongo_quiz_id
+    if cursor:
+        submitted_at, result_id = decode_user_cursor(cursor)
+        query["$or"] = [
+            {"submitted_at": {"$lt": submitted_at}},
+            {"submitted_at": submitted_at, "_id": {"$lt": result_id}},
+        ]
+    return query
+
+
+def split_user_page(rows, limit):
+    """Split limit+1 fetched rows into a page and the next cursor"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_user_cursor(rows[-1]) if has_more and rows else None
+    return rows, next_cursor
+
+
+def archived_user_pipeline(user_id, month, limit, cursor=None, mongo_quiz_id=None):
+    """Aggregation over one month of a user's archive buckets returning up to limit history rows after the cursor"""
+    return [
+        {"$match": {"user_id": user_id, "bucket": month}},
+        {"$unwind": "$results"},
+        {"$replaceRoot": {"newRoot": "$results"}},
+        {"$match": user_page_query(user_id, cursor, mongo_quiz_id)},
+        {"$sort": dict(USER_RESULT_SORT)},
+        {"$limit": limit},
+        {"$project": USER_RESULT_PROJECTION},
+    ]
+
+
+def fetch_archived_rows(archive_collection, user_id, limit, cursor=None, mongo_quiz_id=None):
+    """Up to limit archived history rows after the cursor, newest first
+
+    Months do not overlap in time, so they are read newest first (from the
+    cursor's month) and only until the page is full.
+    """
+    month_query = {"user_id": user_id}
+    if cursor:
+        submitted_at, _ = decode_user_cursor(cursor)
+        month_query["bucket"] = {"$lte": month_bucket(submitted_at)}
+    rows = []
+    for month in sorted(archive_collection.distinct("bucket", month_query), reverse=True):
+        rows += archive_collection.aggregate(
+            archived_user_pipeline(user_id, month, limit - len(rows), cursor, mongo_quiz_id)
+        )
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def fetch_user_page(results_collection, user_id, limit, cursor=None, mongo_quiz_id=None, include_archived=False):
+    """One page of a user's results, newest first. Returns (rows, next_cursor).
+
+    With include_archived the page continues into results_archive once the
+    hot results are exhausted (archived results are always the older ones).
+    """
+    rows = list(
+        results_collection.find(user_page_query(user_id, cursor, mongo_quiz_id), USER_RESULT_PROJECTION)
+        .sort(USER_RESULT_SORT)
+        .limit(limit + 1)
+    )
+    if include_archived and len(rows) <= limit:
+        after = encode_user_cursor(rows[-1]) if rows else cursor
+        archived = fetch_archived_rows(
+            results_collection.database[ARCHIVE_COLLECTION], user_id, limit + 1 - len(rows), after, mongo_quiz_id
+        )
+        for row in archived:
+            row["archived"] = True
+        rows += archived
+    rows, next_cursor = split_user_page(rows, limit)
+    return decode_results(results_collection.database, rows), next_cursor
+
+
+def user_result_update(results):
+    """$inc/$max/$set update folding stored results of one user into their summary document"""
+    inc, maxes, sets = {}, {}, {}
+    for result in results:
+        quiz_key = f"quizzes.{result['quiz_id']}"
+        score = result.get("score", 0)
+        for field, value in (
+            ("attempts", 1),
+            ("sum_score", score),
+            ("sum_max_score", result.get("max_score", 0)),
+            ("total_time", result.get("time_spent", 0)),
+            (f"{quiz_key}.attempts", 1),
+        ):
+            inc[field] = inc.get(field, 0) + value
+        for field, value in ((f"{quiz_key}.best_score", score), ("last_submitted_at", result.get("submitted_at"))):
+            if value is not None and (field not in maxes or value > maxes[field]):
+                maxes[field] = value
+        sets[f"{quiz_key}.quiz_name"] = result.get("quiz_name", "")
+        sets[f"{quiz_key}.max_score"] = result.get("max_score", 0)
+    return {"$inc": inc, "$max": maxes, "$set": sets}
+
+
+def user_stats_states(user_stats_collection, user_ids):
+    """Rebuild state for user_stats_write: (documents by _id incl. the backfill marker, cutoffs by run)"""
+    docs = {
+        doc["_id"]: doc
+        for doc in user_stats_collection.find({"_id": {"$in": list(user_ids) + [BACKFILL_MARKER_ID]}}, {"rebuild": 1})
+    }
+    runs = list({doc["rebuild"] for doc in docs.values() if "rebuild" in doc})
+    cutoffs = {}
+    if runs:
+        cutoffs = {run["_id"]: run.get("cutoff") for run in user_stats_collection.find({"_id": {"$in": runs}})}
+    return docs, cutoffs
+
+
+def user_stats_write(user_id, results, states):
+    """(filter, update, upsert) folding results into a complete summary document, or None
+
+    Before the first full rebuild only existing complete documents are updated.
+    A document tagged by a running rebuild (or a missing one during a full
+    rebuild) only takes the results from the run's cutoff on.
+    """
+    docs, cutoffs = states
+    doc = docs.get(user_id)
+    run_id = (doc if doc is not None else docs.get(BACKFILL_MARKER_ID, {})).get("rebuild")
+    if run_id in cutoffs:
+        cutoff = cutoffs[run_id]
+        # Without a cutoff the run is still tagging documents and will aggregate these results
+        results = [result for result in results if cutoff is not None and result["_id"] >= cutoff]
+        if not results:
+            return None
+        update = user_result_update(results)
+        if doc is None:
+            update["$setOnInsert"] = {"complete": False, "rebuild": run_id}
+            return {"_id": user_id}, update, True
+        return {"_id": user_id, "$or": [{"rebuild": run_id}, {"complete": True}]}, update, False
+
+    # A document a rebuild reset after the states were read is not complete: the
+    # update skips it, the upsert collides with it (duplicate key), and the
+    # rebuild aggregates these results
+    backfilled = BACKFILL_MARKER_ID in docs
+    return {"_id": user_id, "complete": True}, user_result_update(results), backfilled and doc is None
+
+
+def record_user_result(user_stats_collection, result):
+    """Fold one stored result into the user's summary document"""
+    write = user_stats_write(result["user_id"], [result], user_stats_states(user_stats_collection, [result["user_id"]]))
+    if write:
+        query, update, upsert = write
+        user_stats_collection.update_one(query, update, upsert=upsert)
+
+
+def summary_from_document(doc, user_id):
+    """Public per-user totals built from a user_stats document"""
+    doc = doc or {}
+    attempts = doc.get("attempts", 0)
+    sum_max_score = doc.get("sum_max_score", 0)
+    last_submitted_at = doc.get("last_submitted_at")
+    quizzes = doc.get("quizzes", {})
+    return {
+        "user_id": user_id,
+        "attempts": attempts,
+        "quizzes_played": len(quizzes),
+        "average_score": doc.get("sum_score", 0) / attempts if attempts else 0,
+        "average_percentage": doc.get("sum_score", 0) / sum_max_score * 100 if sum_max_score else 0,
+        "total_time": doc.get("total_time", 0),
+        "last_submitted_at": last_submitted_at.isoformat() if isinstance(last_submitted_at, datetime) else last_submitted_at,
+        "quizzes": [
+            dict(stats, quiz_id=quiz_id)
+            for quiz_id, stats in sorted(quizzes.items(), key=lambda item: -item[1].get("attempts", 0))
+        ],
+    }
+
+
+def user_summary_pipeline(match):
+    """Aggregation producing complete user_stats documents for the matching results"""
+    return [
+        {"$match": match},
+        archived_results_union(match),
+        {"$group": {
+            "_id": {"user_id": "$user_id", "quiz_id": "$quiz_id"},
+            "attempts": {"$sum": 1},
+            "best_score": {"$max": "$score"},
+            "sum_score": {"$sum": "$score"},
+            "sum_max_score": {"$sum": "$max_score"},
+            "total_time": {"$sum": "$time_spent"},
+            "last_submitted_at": {"$max": "$submitted_at"},
+            "quiz_name": {"$last": "$quiz_name"},
+            "max_score": {"$max": "$max_score"},
+        }},
+        # Compact results carry no quiz_name: take the current name from quizzes
+        {"$lookup": {
+            "from": "quizzes",
+            "let": {"quiz_oid": {"$convert": {"input": "$_id.quiz_id", "to": "objectId", "onError": None}}},
+            "pipeline": [{"$match": {"$expr": {"$eq": ["$_id", "$$quiz_oid"]}}}, {"$project": {"name": 1}}],
+            "as": "quiz",
+        }},
+        {"$set": {"quiz_name": {"$ifNull": [{"$first": "$quiz.name"}, "$quiz_name", ""]}}},
+        {"$group": {
+            "_id": "$_id.user_id",
+            "attempts": {"$sum": "$attempts"},
+            "sum_score": {"$sum": "$sum_score"},
+            "sum_max_score": {"$sum": "$sum_max_score"},
+            "total_time": {"$sum": "$total_time"},
+            "last_submitted_at": {"$max": "$last_submitted_at"},
+            "quizzes": {"$push": {"k": "$_id.quiz_id", "v": {
+                "quiz_name": "$quiz_name",
+                "attempts": "$attempts",
+                "best_score": "$best_score",
+                "max_score": "$max_score",
+            }}},
+        }},
+        {"$set": {"quizzes": {"$arrayToObject": "$quizzes"}, "complete": True}},
+    ]
+
+
+def load_user_summary(results_collection, user_stats_collection, user_id):
+    """Public summary from the complete user_stats document, else aggregated from results"""
+    doc = user_stats_collection.find_one({"_id": user_id, "complete": True})
+    if doc is None:
+        doc = next(results_collection.aggregate(user_summary_pipeline({"user_id": user_id})), None)
+    return summary_from_document(doc, user_id)
+
+
+def _quiz_entry(quizzes, quiz_id):
+    """quizzes.<quiz_id> for a computed quiz_id (null if missing)"""
+    return {"$let": {
+        "vars": {"entry": {"$first": {"$filter": {
+            "input": {"$objectToArray": {"$ifNull": [quizzes, {}]}},
+            "as": "quiz",
+            "cond": {"$eq": ["$$quiz.k", quiz_id]},
+        }}}},
+        "in": "$$entry.v",
+    }}
+
+
+def _add_summary_stage(run_id):
+    """$merge whenMatched pipeline adding aggregated older results to a document of this run
+
+    Documents without the run tag were created by the writer after the rebuild
+    read its users, from results the user had none before, and stay as they are.
+    """
+    def add(field):
+        return {"$add": [{"$ifNull": [f"${field}", 0]}, f"$$new.{field}"]}
+
+    quizzes = {"$reduce": {
+        "input": {"$concatArrays": [
+            {"$objectToArray": {"$ifNull": ["$quizzes", {}]}},
+            {"$objectToArray": "$$new.quizzes"},
+        ]},
+        "initialValue": {},
+        "in": {"$let": {
+            "vars": {"seen": _quiz_entry("$$value", "$$this.k"), "added": "$$this.v"},
+            "in": {"$mergeObjects": ["$$value", {"$arrayToObject": [[{"k": "$$this.k", "v": {
+                # Names from the writer's (newer) results win
+                "quiz_name": {"$ifNull": ["$$seen.quiz_name", "$$added.quiz_name"]},
+                "attempts": {"$add": [{"$ifNull": ["$$seen.attempts", 0]}, "$$added.attempts"]},
+                "best_score": {"$max": ["$$seen.best_score", "$$added.best_score"]},
+                "max_score": {"$ifNull": ["$$seen.max_score", "$$added.max_score"]},
+            }}]]}]},
+        }},
+    }}
+    merged = {"$mergeObjects": ["$$new", {
+        "attempts": add("attempts"),
+        "sum_score": add("sum_score"),
+        "sum_max_score": add("sum_max_score"),
+        "total_time": add("total_time"),
+        "last_submitted_at": {"$max": ["$last_submitted_at", "$$new.last_submitted_at"]},
+        "quizzes": quizzes,
+    }]}
+    return [{"$replaceWith": {"$cond": [{"$eq": ["$rebuild", run_id]}, merged, "$$ROOT"]}}]
+
+
+def rebuild_user_summaries(results_collection, user_stats_collection, user_ids=None):
+    """Recompute user_stats documents from results (all users or only user_ids)
+
+    Safe while the ResultWriter runs, see the module docstring.
+    """
+    run_id = f"{REBUILD_RUN_PREFIX}{ObjectId()}"
+    user_stats_collection.insert_one({"_id": run_id, "started_at": datetime.utcnow()})
+    reset = {
+        "$set": {
+            "attempts": 0, "sum_score": 0, "sum_max_score": 0, "total_time": 0, "quizzes": {},
+            "complete": False, "rebuild": run_id,
+        },
+        "$unset": {"last_submitted_at": ""},
+    }
+    if user_ids is None:
+        # Users without a document follow the run through the marker
+        user_stats_collection.update_one({"_id": BACKFILL_MARKER_ID}, {"$set": {"rebuild": run_id}}, upsert=True)
+        # Summary documents only, not the marker or run documents
+        user_stats_collection.update_many({"attempts": {"$exists": True}}, reset)
+        match = {}
+    else:
+        user_ids = list(user_ids)
+        if user_ids:
+            user_stats_collection.bulk_write([UpdateOne({"_id": user_id}, reset, upsert=True) for user_id in user_ids])
+        match = {"user_id": {"$in": user_ids}}
+
+    # Set after the tagging: the writer can only see a document tagged with its cutoff
+    cutoff = rebuild_cutoff()
+    user_stats_collection.update_one({"_id": run_id}, {"$set": {"cutoff": cutoff}})
+    wait_for_cutoff(cutoff)
+
+    pipeline = user_summary_pipeline(dict(match, _id={"$lt": cutoff}))
+    pipeline.append({"$merge": {
+        "into": user_stats_collection.name,
+        "whenMatched": _add_summary_stage(run_id),
+        "whenNotMatched": "insert",
+    }})
+    results_collection.aggregate(pipeline, allowDiskUse=True)
+    # Documents without older results have everything from the writer
+    user_stats_collection.update_many(
+        {"rebuild": run_id, "_id": {"$ne": BACKFILL_MARKER_ID}},
+        {"$set": {"complete": True}, "$unset": {"rebuild": ""}}
+    )
+    if user_ids is None:
+        user_stats_collection.replace_one(
+            {"_id": BACKFILL_MARKER_ID}, {"rebuilt_at": datetime.utcnow()}, upsert=True
+        )
+    user_stats_collection.delete_one({"_id": run_id})
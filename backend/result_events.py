@@ -0,0 +1,48 @@
+import json
+import logging
+import time
+
+import redis
+
+from extensions import redis_client, socketio
+from live_leaderboard import mark_dirty
+from rooms import user_room
+
+logger = logging.getLogger(__name__)
+
+# Isti kanal kao u quiz_service/app.py (Quiz Service objavljuje kad upiše rezultat)
+RESULT_READY_CHANNEL = "quiz_events:result_ready"
+
+
+def _listen():
+    """Prosleđuje result_ready poruke iz Redis-a (completed i failed) u socket.io sobu korisnika"""
+    backoff = 1
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(RESULT_READY_CHANNEL)
+            logger.info(f"Subscribed to {RESULT_READY_CHANNEL}")
+            backoff = 1
+            for message in pubsub.listen():
+                try:
+                    event = json.loads(message['data'])
+                    # Svaki proces ima svog pretplatnika, pa šalje samo svojim klijentima
+                    # (bez message queue-a, inače bi korisnik dobio N kopija)
+                    socketio.emit('result_ready', event, room=user_room(event['user_id']), ignore_queue=True)
+                    # Rang lista sobe kviza se šalje u sledećem tick-u (live_leaderboard);
+                    # neuspela obrada (status failed) ne menja rang listu
+                    if event.get('status') == 'completed' and event.get('quiz_id') is not None:
+                        mark_dirty(event['quiz_id'])
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Invalid result_ready message: {e}")
+        except redis.RedisError as e:
+            logger.warning(f"Result listener lost Redis ({e}), retrying in {backoff}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+        finally:
+            pubsub.close()
+
+
+def start_result_listener():
+    """Pokreće pretplatnika u pozadini (jednom po procesu)"""
+    socketio.start_background_task(_listen)
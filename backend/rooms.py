@@ -0,0 +1,22 @@
+"""Socket.IO sobe u koje se klijent pridružuje pri konekciji
+
+user_<id>      lični događaji (result_ready, odluke o kvizovima autora)
+role_<uloga>   svi korisnici jedne uloge (catalog_changed)
+admin_room     soba administratora (ime zadržano iz prve verzije)
+"""
+from models import ROLE_ADMIN, VALID_ROLES
+
+ADMIN_ROOM = 'admin_room'
+
+
+def user_room(user_id):
+    """Soba u koju se svaki korisnik pridružuje pri konekciji"""
+    return f'user_{user_id}'
+
+
+def role_room(role):
+    return ADMIN_ROOM if role == ROLE_ADMIN else f'role_{role}'
+
+
+def all_role_rooms():
+    return [role_room(role) for role in VALID_ROLES]
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from rich import _console
 from sqlalchemy.orm import joinedload
 from datetime import datetime
@@ -11,6 +11,8 @@ from dto import (
     ErrorResponseDTO
 )
 from extensions import socketio
+from admin_events import notify_quiz_pending
+from rooms import ADMIN_ROOM, all_role_rooms, user_room
 from models import (
     db,
     User,
@@ -25,6 +27,7 @@ from models import (
     VALID_QUIZ_STATUSES
 )
 from pdf_report_service import pdf_service
+import leaderboard_cache
 from email_service import email_service
 import requests
 import logging
@@ -36,6 +39,8 @@ from flask_cors import cross_origin
 logger = logging.getLogger(__name__)
 
 QUIZ_SERVICE_URL = "http://quiz_service:5001"
+# Najduži long-poll koji prosleđujemo (isto ograničenje kao SUBMISSION_MAX_WAIT_SECONDS u Quiz Service-u)
+SUBMISSION_MAX_WAIT_SECONDS = 25
 
 
 
@@ -99,9 +104,9 @@ def create_quiz(user_id):
     db.session.add(quiz)
     db.session.commit()
     
-    payload = quiz.to_dict(include_questions=True, include_answers=True)
-    socketio.emit('new_quiz_pending', payload, room='admin_room')
+    notify_quiz_pending(quiz)
     
+    payload = quiz.to_dict(include_questions=True, include_answers=True)
     return jsonify(QuizResponseDTO(**payload).dict()), 201
 
 
@@ -186,17 +191,49 @@ def update_quiz(user_id, quiz_id):
             code='validation_error'
         ).dict()), 400
     
+    was_approved = quiz.status == QUIZ_STATUS_APPROVED
     build_quiz_from_dto(quiz, data)
     quiz.status = QUIZ_STATUS_PENDING
     quiz.rejection_reason = None
+    quiz.version = (quiz.version or 1) + 1
     db.session.commit()
     
+    notify_quiz_pending(quiz)
+    # Kviz koji se vraća na odobravanje nestaje iz kataloga
+    if was_approved:
+        emit_catalog_changed(quiz)
+    
     payload = quiz.to_dict(include_questions=True, include_answers=True)
-    socketio.emit('new_quiz_pending', payload, room='admin_room')
+    return jsonify(QuizResponseDTO(**payload).dict()), 200
+
+
+@quiz_bp.route('/quizzes/<int:quiz_id>', methods=['GET'])
+@role_required(ROLE_MODERATOR, ROLE_ADMIN)
+def get_quiz_details(user_id, quiz_id):
+    """Ceo kviz sa tačnim odgovorima (admin ili autor) - učitava se na zahtev posle quizzes_pending"""
+    quiz = Quiz.query.options(joinedload(Quiz.questions).joinedload(QuizQuestion.answers)).get(quiz_id)
+    if not quiz:
+        return jsonify(ErrorResponseDTO(
+            error='Kviz nije pronađen',
+            code='quiz_not_found'
+        ).dict()), 404
     
+    user = User.query.get(user_id)
+    if user.role != ROLE_ADMIN and quiz.author_id != user_id:
+        return jsonify(ErrorResponseDTO(
+            error='Nemate ovlašćenja za pregled ovog kviza',
+            code='insufficient_permissions'
+        ).dict()), 403
+    
+    payload = quiz.to_dict(include_questions=True, include_answers=True)
     return jsonify(QuizResponseDTO(**payload).dict()), 200
 
 
+def emit_catalog_changed(quiz):
+    """Signal svim ulogama da je kviz ušao u katalog odobrenih ili izašao iz njega"""
+    socketio.emit('catalog_changed', {'quiz_id': quiz.id, 'version': quiz.version}, to=all_role_rooms())
+
+
 @quiz_bp.route('/quizzes/<int:quiz_id>/approve', methods=['POST'])
 @role_required(ROLE_ADMIN)
 def approve_quiz(user_id, quiz_id):
@@ -230,8 +267,10 @@ def approve_quiz(user_id, quiz_id):
     except requests.exceptions.RequestException as e:
         print(f"Warning: Could not sync quiz to MongoDB: {e}")
     
+    # Odluka ide autoru i adminima; ostalima samo signal da se katalog promenio
     payload = quiz.to_summary_dict()
-    socketio.emit('quiz_approved', payload)
+    socketio.emit('quiz_approved', payload, to=[user_room(quiz.author_id), ADMIN_ROOM])
+    emit_catalog_changed(quiz)
     
     return jsonify(payload), 200
 
@@ -259,12 +298,16 @@ def reject_quiz(user_id, quiz_id):
             code='quiz_not_found'
         ).dict()), 404
     
+    was_approved = quiz.status == QUIZ_STATUS_APPROVED
     quiz.status = QUIZ_STATUS_REJECTED
     quiz.rejection_reason = reason
     db.session.commit()
     
     payload = quiz.to_summary_dict()
-    socketio.emit('quiz_rejected', payload)
+    socketio.emit('quiz_rejected', payload, to=[user_room(quiz.author_id), ADMIN_ROOM])
+    # Odbijanje odobrenog kviza ga uklanja iz kataloga
+    if was_approved:
+        emit_catalog_changed(quiz)
     
     return jsonify(payload), 200
 
@@ -326,9 +369,14 @@ def submit_quiz_answers(user_id, quiz_id):
     data['user_name'] = f"{user.first_name} {user.last_name}"
     
     try:
+        # Idempotency-Key prosleđujemo da ponovljeni submit ne bi pravio duplikat
+        headers = {}
+        if request.headers.get('Idempotency-Key'):
+            headers['Idempotency-Key'] = request.headers['Idempotency-Key']
         response = requests.post(
             f"{QUIZ_SERVICE_URL}/quizzes/{quiz_id}/submit",
             json=data,
+            headers=headers,
             timeout=10
         )
         return response.json(), response.status_code
@@ -343,29 +391,119 @@ def submit_quiz_answers(user_id, quiz_id):
 @quiz_bp.route('/quizzes/<int:quiz_id>/leaderboard', methods=['GET'])
 @token_required
 def get_quiz_leaderboard(user_id, quiz_id):
-    """Get quiz leaderboard - proxied to Quiz Service"""
+    """Get quiz leaderboard page - proxied to Quiz Service (limit, cursor, best)"""
+    params = {
+        key: request.args[key]
+        for key in ('limit', 'cursor', 'best')
+        if key in request.args
+    }
+    
+    # Direktno iz materijalizovanog Redis sorted seta, bez poziva Quiz Service-a
+    page = leaderboard_cache.read_page(
+        quiz_id,
+        limit=request.args.get('limit', 50, type=int),
+        cursor=params.get('cursor'),
+        best_only=params.get('best') in ('1', 'true')
+    )
+    if page is not None:
+        return jsonify(page), 200
+    
     try:
         response = requests.get(
             f"{QUIZ_SERVICE_URL}/quizzes/{quiz_id}/results",
+            params=params,
+            timeout=10
+        )
+        return response.json(), response.status_code
+    except requests.exceptions.RequestException:
+        return jsonify({'results': [], 'next_cursor': None}), 200
+
+
+@quiz_bp.route('/quizzes/<int:quiz_id>/leaderboard/me', methods=['GET'])
+@token_required
+def get_my_rank(user_id, quiz_id):
+    """Get current user's rank with ?around=<n> neighbours"""
+    around = min(max(request.args.get('around', 0, type=int), 0), 50)
+    rank = leaderboard_cache.user_rank(quiz_id, user_id, around)
+    if rank is not None:
+        return jsonify(rank), 200
+    
+    try:
+        response = requests.get(
+            f"{QUIZ_SERVICE_URL}/quizzes/{quiz_id}/results/rank/{user_id}",
+            params={'around': around},
             timeout=10
         )
         return response.json(), response.status_code
     except requests.exceptions.RequestException:
-        return jsonify([]), 200
+        return jsonify(ErrorResponseDTO(
+            error='Quiz service unavailable',
+            code='service_unavailable'
+        ).dict()), 503
 
 
 @quiz_bp.route('/users/my-results', methods=['GET'])
 @token_required
 def get_my_results(user_id):
-    """Get current user's quiz results"""
+    """Get current user's quiz results - stranica po stranica (?limit, ?cursor, ?quiz_id, ?include_archived)"""
+    params = {
+        key: request.args[key]
+        for key in ('limit', 'cursor', 'quiz_id', 'include_archived')
+        if request.args.get(key)
+    }
     try:
         response = requests.get(
             f"{QUIZ_SERVICE_URL}/users/{user_id}/results",
+            params=params,
             timeout=10
         )
         return response.json(), response.status_code
     except requests.exceptions.RequestException:
-        return jsonify([]), 200
+        return jsonify({'results': [], 'next_cursor': None}), 200
+
+
+@quiz_bp.route('/users/my-results/summary', methods=['GET'])
+@token_required
+def get_my_results_summary(user_id):
+    """Ukupna statistika korisnika (broj pokušaja, prosek, po kvizu)"""
+    try:
+        response = requests.get(
+            f"{QUIZ_SERVICE_URL}/users/{user_id}/summary",
+            timeout=10
+        )
+        return response.json(), response.status_code
+    except requests.exceptions.RequestException:
+        return jsonify(ErrorResponseDTO(
+            error='Quiz service unavailable',
+            code='service_unavailable'
+        ).dict()), 503
+
+
+@quiz_bp.route('/submissions/<submission_id>', methods=['GET'])
+@token_required
+def get_submission_status(user_id, submission_id):
+    """Get submission status - proxied to Quiz Service (supports ?wait= long-poll)"""
+    # Negativan wait bi dao negativan timeout (ValueError u requests), prevelik bi držao vezu
+    wait = min(max(request.args.get('wait', 0, type=int), 0), SUBMISSION_MAX_WAIT_SECONDS)
+    try:
+        response = requests.get(
+            f"{QUIZ_SERVICE_URL}/submissions/{submission_id}",
+            params={'wait': wait},
+            timeout=wait + 10
+        )
+    except requests.exceptions.RequestException:
+        return jsonify(ErrorResponseDTO(
+            error='Quiz service unavailable',
+            code='service_unavailable'
+        ).dict()), 503
+
+    status = response.json()
+    if response.status_code == 200 and status.get('user_id') != str(user_id):
+        return jsonify(ErrorResponseDTO(
+            error='Submission not found',
+            code='submission_not_found'
+        ).dict()), 404
+    return status, response.status_code
 
 
 @quiz_bp.route('/quizzes/<int:quiz_id>/statistics', methods=['GET'])
@@ -385,6 +523,63 @@ def get_quiz_stats(user_id, quiz_id):
         ).dict()), 503
 
 
+@quiz_bp.route('/quizzes/<int:quiz_id>/analytics', methods=['GET'])
+@role_required(ROLE_ADMIN, ROLE_MODERATOR)
+def get_quiz_analytics(user_id, quiz_id):
+    """Get per-question analytics (difficulty, discrimination, options)"""
+    try:
+        response = requests.get(
+            f"{QUIZ_SERVICE_URL}/quizzes/{quiz_id}/analytics",
+            timeout=30
+        )
+        return response.json(), response.status_code
+    except requests.exceptions.RequestException:
+        return jsonify(ErrorResponseDTO(
+            error='Analytics unavailable',
+            code='service_unavailable'
+        ).dict()), 503
+
+
+@quiz_bp.route('/quizzes/<int:quiz_id>/results/export', methods=['GET'])
+@role_required(ROLE_ADMIN, ROLE_MODERATOR)
+def export_quiz_results(user_id, quiz_id):
+    """Izvoz svih rezultata kviza (?format=ndjson|csv) - strimuje se iz Quiz Service-a"""
+    try:
+        upstream = requests.get(
+            f"{QUIZ_SERVICE_URL}/quizzes/{quiz_id}/results/export",
+            params=request.args,
+            stream=True,
+            timeout=(5, 60)
+        )
+    except requests.exceptions.RequestException:
+        return jsonify(ErrorResponseDTO(
+            error='Quiz service unavailable',
+            code='service_unavailable'
+        ).dict()), 503
+    
+    if upstream.status_code != 200:
+        try:
+            return upstream.json(), upstream.status_code
+        finally:
+            upstream.close()
+    
+    def generate():
+        # Prosleđujemo chunk po chunk, bez učitavanja celog izvoza u memoriju
+        try:
+            for chunk in upstream.iter_content(chunk_size=64 * 1024):
+                yield chunk
+        finally:
+            upstream.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        content_type=upstream.headers.get('Content-Type'),
+        headers={'Content-Disposition': upstream.headers.get(
+            'Content-Disposition', f'attachment; filename=quiz_{quiz_id}_results'
+        )}
+    )
+
+
 @quiz_bp.route('/quizzes/<int:quiz_id>/generate-report', methods=['POST'])
 @cross_origin()
 @role_required(ROLE_ADMIN)
@@ -423,29 +618,32 @@ def generate_quiz_report(user_id, quiz_id):
         ).dict()), 400
     
     try:
-        # Dohvati rezultate iz Quiz Service-a
+        # Dohvati rezultate iz Quiz Service-a, stranicu po stranicu
         logger.info(f"Dohvatanje rezultata sa {QUIZ_SERVICE_URL}/quizzes/{quiz_id}/results")
-        response = requests.get(
-            f"{QUIZ_SERVICE_URL}/quizzes/{quiz_id}/results",
-            timeout=10
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"Greška pri dohvatanju rezultata: {response.status_code}")
-            return jsonify(ErrorResponseDTO(
-                error='Rezultati nisu dostupni',
-                code='results_unavailable'
-            ).dict()), 503
-        
-        # Quiz Service vraća direktno listu rezultata
-        results_raw = response.json()
-        
-        # Provjeri tip odgovora
-        if isinstance(results_raw, list):
-            results_list = results_raw
-        else:
-            # Fallback ako vraća dictionary sa 'results' ključem
-            results_list = results_raw.get('results', [])
+        results_list = []
+        cursor = None
+        while True:
+            params = {'limit': 200}
+            if cursor:
+                params['cursor'] = cursor
+            response = requests.get(
+                f"{QUIZ_SERVICE_URL}/quizzes/{quiz_id}/results",
+                params=params,
+                timeout=10
+            )
+            
+            if response.status_code != 200:
+                logger.error(f"Greška pri dohvatanju rezultata: {response.status_code}")
+                return jsonify(ErrorResponseDTO(
+                    error='Rezultati nisu dostupni',
+                    code='results_unavailable'
+                ).dict()), 503
+            
+            page = response.json()
+            results_list.extend(page.get('results', []))
+            cursor = page.get('next_cursor')
+            if not cursor:
+                break
         
         logger.info(f"Dohvaćeno {len(results_list)} rezultata")
         
@@ -13,6 +13,7 @@ from dto import (
 from models import User, db, ROLE_PLAYER, ROLE_MODERATOR, ROLE_ADMIN
 from auth import token_required, role_required
 from config import Config
+from socket_presence import read_presence
 
 try:
     from email_service import email_service
@@ -412,6 +413,19 @@ def get_user_stats(user_id):
         logger.error(f"Get user stats error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@users_bp.route('/admin/websocket', methods=['GET'])
+@role_required(ROLE_ADMIN)
+def get_websocket_presence(user_id):
+    """WebSocket prisustvo i brojači po čvoru i po sobi (samo admin)"""
+    try:
+        presence = read_presence()
+        logger.info(f"Admin {user_id} fetched websocket presence")
+        return jsonify(presence), 200
+        
+    except Exception as e:
+        logger.error(f"Get websocket presence error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ==================== TEST ROUTES ====================
 
 @users_bp.route('/test/create-users', methods=['GET'])
@@ -0,0 +1,178 @@
+"""Benchmark skaliranja WebSocket konekcija (threading / eventlet / gevent)
+
+Otvara N Socket.IO konekcija sa JWT tokenima potpisanim sa JWT_SECRET_KEY,
+drži ih otvorene (idle) i pušta --active klijenata da šalju join_quiz_room i
+mere round-trip do system_message odgovora. Server se pokreće zasebno:
+
+    SOCKETIO_ASYNC_MODE=gevent python app.py
+    python socket_benchmark.py --sockets 2000 --active 200 --server-pid <PID>
+
+Uz --server-pid se na Linux-u čitaju RSS i broj niti serverskog procesa
+(/proc/<pid>/status) pre konekcija, sa idle konekcijama i posle aktivne faze.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+import jwt
+import socketio
+
+from config import Config
+
+
+def make_token(user_id, role='IGRAČ'):
+    payload = {
+        'user_id': user_id,
+        'role': role,
+        'exp': datetime.utcnow() + timedelta(hours=1),
+        'type': 'access',
+        'iat': datetime.utcnow()
+    }
+    return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
+
+
+def process_stats(pid):
+    """RSS (MB) i broj niti procesa, ili None ako /proc nije dostupan"""
+    if not pid:
+        return None
+    stats = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key == 'VmRSS':
+                    stats['rss_mb'] = int(value.split()[0]) / 1024
+                elif key == 'Threads':
+                    stats['threads'] = int(value)
+    except OSError:
+        return None
+    return stats
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def describe(label, values):
+    if not values:
+        print(f"  {label}: -")
+        return
+    print(f"  {label}: p50 {percentile(values, 0.5) * 1000:.1f} ms, "
+          f"p95 {percentile(values, 0.95) * 1000:.1f} ms, "
+          f"p99 {percentile(values, 0.99) * 1000:.1f} ms, "
+          f"max {max(values) * 1000:.1f} ms")
+
+
+class BenchClient:
+    """Jedna konekcija; replies prima system_message odgovore redom"""
+
+    def __init__(self, url, user_id):
+        self.url = url
+        self.user_id = user_id
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.replies = asyncio.Queue()
+        self.sio.on('system_message', self._on_system_message)
+
+    async def _on_system_message(self, data):
+        await self.replies.put(time.perf_counter())
+
+    async def connect(self, timeout):
+        start = time.perf_counter()
+        await self.sio.connect(
+            # codecs=deflate: benchmark ne čita payload, pa radi i sa SOCKETIO_SERIALIZER=deflate
+            f"{self.url}?token={make_token(self.user_id)}&codecs=deflate",
+            transports=['websocket'],
+            wait_timeout=timeout
+        )
+        # Server potvrđuje konekciju sa system_message
+        await asyncio.wait_for(self.replies.get(), timeout)
+        return time.perf_counter() - start
+
+    async def round_trip(self, quiz_id, timeout):
+        start = time.perf_counter()
+        await self.sio.emit('join_quiz_room', {'quiz_id': quiz_id})
+        received = await asyncio.wait_for(self.replies.get(), timeout)
+        return received - start
+
+
+async def run(args):
+    clients = [BenchClient(args.url, args.first_user_id + i) for i in range(args.sockets)]
+    limit = asyncio.Semaphore(args.connect_concurrency)
+    connect_times, connect_errors = [], []
+
+    async def connect(client):
+        async with limit:
+            try:
+                connect_times.append(await client.connect(args.timeout))
+            except Exception as e:
+                connect_errors.append(type(e).__name__)
+
+    baseline = process_stats(args.server_pid)
+    start = time.perf_counter()
+    await asyncio.gather(*(connect(client) for client in clients))
+    connect_elapsed = time.perf_counter() - start
+    connected = [client for client in clients if client.sio.connected]
+
+    await asyncio.sleep(args.settle)
+    idle = process_stats(args.server_pid)
+
+    active = connected[:args.active]
+    round_trips, round_trip_errors = [], []
+
+    async def drive(client):
+        deadline = time.perf_counter() + args.duration
+        # Razmaknuti početak da klijenti ne šalju u istom trenutku
+        await asyncio.sleep(random.random() * args.interval)
+        while time.perf_counter() < deadline:
+            try:
+                round_trips.append(await client.round_trip(random.randint(1, 100), args.timeout))
+            except Exception as e:
+                round_trip_errors.append(type(e).__name__)
+            await asyncio.sleep(args.interval)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(drive(client) for client in active))
+    active_elapsed = time.perf_counter() - start
+    loaded = process_stats(args.server_pid)
+    still_connected = sum(1 for client in connected if client.sio.connected)
+
+    await asyncio.gather(*(client.sio.disconnect() for client in connected), return_exceptions=True)
+
+    print(f"Connections: {len(connect_times)}/{args.sockets} in {connect_elapsed:.2f}s "
+          f"({len(connect_times) / connect_elapsed:.0f}/s), errors {len(connect_errors)}")
+    if connect_errors:
+        print(f"  first errors: {sorted(set(connect_errors))}")
+    describe("connect", connect_times)
+    print(f"Active: {len(active)} clients, {len(round_trips)} round trips in {active_elapsed:.2f}s "
+          f"({len(round_trips) / active_elapsed if active_elapsed else 0:.0f}/s), errors {len(round_trip_errors)}")
+    describe("round trip", round_trips)
+    print(f"Still connected after active phase: {still_connected}/{len(connected)}")
+    if baseline and idle and loaded:
+        per_socket = (idle['rss_mb'] - baseline['rss_mb']) * 1024 / len(connected) if connected else 0
+        print(f"Server: RSS {baseline['rss_mb']:.0f} -> {idle['rss_mb']:.0f} MB idle ({per_socket:.1f} KB/socket) "
+              f"-> {loaded['rss_mb']:.0f} MB active; threads {baseline['threads']} -> {idle['threads']} -> {loaded['threads']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket connection scale benchmark")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{Config.PORT}")
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--active", type=int, default=100, help="clients sending messages, the rest stay idle")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between messages per active client")
+    parser.add_argument("--duration", type=float, default=20.0, help="length of the active phase")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--settle", type=float, default=3.0, help="idle seconds before the active phase")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--first-user-id", type=int, default=100000)
+    parser.add_argument("--server-pid", type=int)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
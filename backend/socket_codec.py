@@ -0,0 +1,40 @@
+"""Format Socket.IO poruka (SOCKETIO_SERIALIZER)
+
+json     tekstualni JSON paketi (podrazumevano)
+deflate  JSON, ali payload od SOCKETIO_COMPRESS_THRESHOLD bajtova naviše ide kao
+         {'_deflate': <zlib bajtovi>} - Socket.IO ga šalje kao binarni attachment,
+         a websocket.js ga raspakuje (DecompressionStream) pre nego što prosledi event
+
+Payload se pakuje u InstrumentedSocketIO.emit, pre message queue-a i pre
+enkodiranja paketa, pa se emit u sobu kompresuje jednom za sve klijente. Zato
+isti format važi za ceo server: websocket.js u query-ju konekcije javlja koje
+formate ume da raspakuje (codecs=deflate), a server u deflate modu odbija
+klijenta koji to ne javi (npr. stari bundle iz keša) umesto da mu šalje poruke
+koje ne može da pročita.
+"""
+import json
+import zlib
+
+from config import Config
+
+SERIALIZERS = ('json', 'deflate')
+SERIALIZER = Config.SOCKETIO_SERIALIZER
+DEFLATE_KEY = '_deflate'
+
+if SERIALIZER not in SERIALIZERS:
+    raise ValueError(f"SOCKETIO_SERIALIZER mora biti jedno od {SERIALIZERS}, a ne '{SERIALIZER}'")
+
+
+def client_supports_serializer(codecs):
+    """codecs je query parametar konekcije, npr. 'deflate'"""
+    return SERIALIZER == 'json' or SERIALIZER in (codecs or '').split(',')
+
+
+def encode_payload(data):
+    """U deflate modu pakuje veliki dict/list payload u kompresovani omotač"""
+    if SERIALIZER != 'deflate' or not isinstance(data, (dict, list)):
+        return data
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    if len(raw) < Config.SOCKETIO_COMPRESS_THRESHOLD:
+        return data
+    return {DEFLATE_KEY: zlib.compress(raw)}
@@ -0,0 +1,72 @@
+"""Brojači WebSocket saobraćaja za ovaj proces
+
+Konekcije i diskonekcije beleže handler-i u app.py; svaki emit (i iz handler-a
+i iz pozadinskih taskova) meri InstrumentedSocketIO iz extensions.py. Vrednosti
+su kumulativne od starta procesa; socket_presence ih uz heartbeat upisuje u
+Redis, odakle ih admin endpoint sabira po čvorovima.
+"""
+import threading
+import time
+
+
+class SocketMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.connects = 0
+        self.disconnects = 0
+        # Odbijene konekcije: nevažeći ili istekao token / klijent bez podržanog formata
+        self.rejected_auth = 0
+        self.rejected_codec = 0
+        # event -> [broj, ukupno sekundi, najduže sekundi]
+        self.emits = {}
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_disconnect(self):
+        with self._lock:
+            self.disconnects += 1
+
+    def record_rejected_auth(self):
+        """Konekcija odbijena zbog tokena"""
+        with self._lock:
+            self.rejected_auth += 1
+
+    def record_rejected_codec(self):
+        """Konekcija odbijena jer klijent ne ume da raspakuje nijedan format"""
+        with self._lock:
+            self.rejected_codec += 1
+
+    def record_emit(self, event, seconds):
+        with self._lock:
+            stats = self.emits.setdefault(event, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            uptime = time.time() - self.started_at
+            emits = {
+                event: {
+                    'count': count,
+                    'per_second': count / uptime if uptime else 0,
+                    'avg_ms': total / count * 1000 if count else 0,
+                    'max_ms': longest * 1000,
+                    'total_seconds': total,
+                }
+                for event, (count, total, longest) in self.emits.items()
+            }
+            return {
+                'uptime_seconds': uptime,
+                'connects': self.connects,
+                'disconnects': self.disconnects,
+                'rejected_auth': self.rejected_auth,
+                'rejected_codec': self.rejected_codec,
+                'emits': emits,
+            }
+
+
+socket_metrics = SocketMetrics()
@@ -0,0 +1,151 @@
+"""Prisustvo WebSocket klijenata u Redis-u, po čvoru i po sobi
+
+Svaki proces (čvor) na svakih PRESENCE_HEARTBEAT_SECONDS upiše jednom
+transakcijom:
+
+    ws_presence:nodes              ZSET čvor -> vreme poslednjeg heartbeat-a
+    ws_presence:node:<id>          HASH broj socket-a i korisnika, brojači (socket_metrics)
+    ws_presence:node:<id>:rooms    HASH soba -> broj lokalnih klijenata
+
+Ključevi čvora ističu posle PRESENCE_TTL_SECONDS, pa ugašen ili zaglavljen
+čvor sam nestaje iz prikaza. Lične user_<id> sobe se ne upisuju pojedinačno,
+samo njihov broj (korisnici na čvoru). read_presence sabira žive čvorove za
+admin endpoint.
+"""
+import json
+import logging
+import os
+import socket
+import time
+
+from config import Config
+from extensions import redis_client, socketio
+from socket_metrics import socket_metrics
+
+logger = logging.getLogger(__name__)
+
+NODE_ID = Config.SOCKETIO_NODE_ID or f'{socket.gethostname()}:{os.getpid()}'
+NODES_KEY = 'ws_presence:nodes'
+
+
+def _node_key(node_id):
+    return f'ws_presence:node:{node_id}'
+
+
+def _rooms_key(node_id):
+    return f'ws_presence:node:{node_id}:rooms'
+
+
+def local_presence():
+    """Socket-i, korisnici i sobe ovog procesa (iz Socket.IO menadžera soba)"""
+    sockets = users = 0
+    rooms = {}
+    for room, participants in list(socketio.server.manager.rooms.get('/', {}).items()):
+        if room is None:
+            # Svaki sid je u None sobi namespace-a
+            sockets = len(participants)
+        elif room in participants:
+            # Soba sa imenom sid-a
+            continue
+        elif room.startswith('user_'):
+            users += 1
+        elif participants:
+            rooms[room] = len(participants)
+    return {'sockets': sockets, 'users': users, 'rooms': rooms}
+
+
+def heartbeat():
+    presence = local_presence()
+    now = time.time()
+    ttl = Config.PRESENCE_TTL_SECONDS
+    node_key, rooms_key = _node_key(NODE_ID), _rooms_key(NODE_ID)
+
+    pipe = redis_client.pipeline()
+    pipe.delete(rooms_key)
+    if presence['rooms']:
+        pipe.hset(rooms_key, mapping=presence['rooms'])
+        pipe.expire(rooms_key, ttl)
+    pipe.hset(node_key, mapping={
+        'sockets': presence['sockets'],
+        'users': presence['users'],
+        'async_mode': Config.SOCKETIO_ASYNC_MODE,
+        'heartbeat_at': now,
+        'metrics': json.dumps(socket_metrics.snapshot()),
+    })
+    pipe.expire(node_key, ttl)
+    pipe.zadd(NODES_KEY, {NODE_ID: now})
+    pipe.zremrangebyscore(NODES_KEY, '-inf', now - ttl)
+    pipe.execute()
+
+
+def _merge_emits(total, emits):
+    for event, stats in emits.items():
+        merged = total.setdefault(event, {'count': 0, 'per_second': 0, 'total_seconds': 0, 'max_ms': 0})
+        merged['count'] += stats['count']
+        merged['per_second'] += stats['per_second']
+        merged['total_seconds'] += stats['total_seconds']
+        merged['max_ms'] = max(merged['max_ms'], stats['max_ms'])
+
+
+def read_presence():
+    """Zbir svih živih čvorova: po čvoru, po sobi i ukupno"""
+    now = time.time()
+    node_ids = redis_client.zrangebyscore(NODES_KEY, now - Config.PRESENCE_TTL_SECONDS, '+inf')
+
+    pipe = redis_client.pipeline(transaction=False)
+    for node_id in node_ids:
+        pipe.hgetall(_node_key(node_id))
+        pipe.hgetall(_rooms_key(node_id))
+    replies = pipe.execute()
+
+    nodes, rooms, emits = [], {}, {}
+    totals = {'nodes': 0, 'sockets': 0, 'users': 0, 'connects': 0, 'disconnects': 0, 'rejected_auth': 0, 'rejected_codec': 0}
+    for node_id, node, node_rooms in zip(node_ids, replies[::2], replies[1::2]):
+        # Ključ je istekao između ZSET-a i HASH-a
+        if not node:
+            continue
+        metrics = json.loads(node['metrics'])
+        heartbeat_at = float(node['heartbeat_at'])
+        nodes.append({
+            'node_id': node_id,
+            'async_mode': node['async_mode'],
+            'sockets': int(node['sockets']),
+            'users': int(node['users']),
+            'heartbeat_age_seconds': round(now - heartbeat_at, 1),
+            'rooms': {room: int(count) for room, count in node_rooms.items()},
+            'metrics': metrics,
+        })
+        totals['nodes'] += 1
+        totals['sockets'] += int(node['sockets'])
+        totals['users'] += int(node['users'])
+        for key in ('connects', 'disconnects', 'rejected_auth', 'rejected_codec'):
+            # Čvor sa starijom verzijom još nema podeljene brojače odbijanja
+            totals[key] += metrics.get(key, 0)
+        for room, count in node_rooms.items():
+            rooms[room] = rooms.get(room, 0) + int(count)
+        _merge_emits(emits, metrics['emits'])
+
+    for stats in emits.values():
+        stats['avg_ms'] = stats['total_seconds'] / stats['count'] * 1000 if stats['count'] else 0
+    totals['emits'] = emits
+
+    return {
+        'nodes': nodes,
+        'rooms': dict(sorted(rooms.items(), key=lambda item: item[1], reverse=True)),
+        'totals': totals,
+    }
+
+
+def _run():
+    logger.info(f"WebSocket presence: node {NODE_ID}, heartbeat every {Config.PRESENCE_HEARTBEAT_SECONDS}s")
+    while True:
+        try:
+            heartbeat()
+        except Exception as e:
+            logger.warning(f"Presence heartbeat failed: {e}")
+        socketio.sleep(Config.PRESENCE_HEARTBEAT_SECONDS)
+
+
+def start_presence_heartbeat():
+    """Pokreće heartbeat u pozadini (jednom po procesu)"""
+    socketio.start_background_task(_run)
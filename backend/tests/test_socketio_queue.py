@@ -0,0 +1,160 @@
+"""Dva backend procesa na jednom Redis message queue-u
+
+Pokreće fakeredis TCP server i dva `python app.py` procesa (threading mod)
+sa zajedničkom SQLite bazom. Proverava da emit u admin_room iz HTTP zahteva
+na jednom procesu stiže klijentima na oba, a da emit sa ignore_queue
+(result_ready iz result_events) ostaje lokalan: svaki proces ga šalje samo
+svojim klijentima, pa klijent dobija tačno jednu kopiju.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+socketio = pytest.importorskip("socketio")
+requests = pytest.importorskip("requests")
+import redis
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN = {'email': 'admin@quizplatform.com', 'password': 'Admin123!'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def start_backend(port, env):
+    process = subprocess.Popen(
+        [sys.executable, 'app.py'], cwd=BACKEND_DIR, env=dict(env, PORT=str(port)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    def healthy():
+        try:
+            return requests.get(f'http://127.0.0.1:{port}/health', timeout=1).ok
+        except requests.RequestException:
+            return False
+
+    if not wait_until(healthy, timeout=30):
+        process.kill()
+        pytest.fail(f'Backend na portu {port} se nije pokrenuo')
+    return process
+
+
+@pytest.fixture(scope='module')
+def cluster(tmp_path_factory):
+    redis_port = free_port()
+    server = fakeredis.TcpFakeServer(('127.0.0.1', redis_port), server_type='redis')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    redis_url = f'redis://127.0.0.1:{redis_port}/0'
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{tmp_path_factory.mktemp('db') / 'quiz.db'}",
+        REDIS_URL=redis_url,
+        SOCKETIO_MESSAGE_QUEUE=redis_url,
+        FLASK_DEBUG='false',
+        SOCKETIO_ASYNC_MODE='threading',
+        ADMIN_NOTIFY_BATCH_MS='50',
+    )
+    # Prvi proces pravi tabele i default admina, drugi ih samo koristi
+    ports = [free_port(), free_port()]
+    processes = []
+    try:
+        for port in ports:
+            processes.append(start_backend(port, env))
+        yield [f'http://127.0.0.1:{port}' for port in ports], redis.Redis.from_url(redis_url)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+        server.shutdown()
+        server.server_close()
+
+
+def login(base, credentials):
+    response = requests.post(f'{base}/api/auth/login', json=credentials)
+    assert response.ok, response.text
+    return response.json()
+
+
+def create_moderator(base, admin_token):
+    credentials = {'email': 'moderator@test.rs', 'password': 'Moderator123!'}
+    response = requests.post(f'{base}/api/auth/register', json=dict(
+        credentials, first_name='Mod', last_name='Erator', date_of_birth='1990-01-01',
+        gender='Muški', country='Serbia', street='Street', number='1'
+    ))
+    assert response.status_code == 201, response.text
+    response = requests.put(
+        f"{base}/api/users/{response.json()['user']['id']}/role", json={'role': 'MODERATOR'},
+        headers={'Authorization': f'Bearer {admin_token}'}
+    )
+    assert response.ok, response.text
+    return login(base, credentials)['access_token']
+
+
+def connect(base, token, events):
+    """Socket.IO klijent koji beleži (event, payload) za svaki primljeni event"""
+    client = socketio.Client()
+    for event in ('quizzes_pending', 'result_ready'):
+        client.on(event, lambda data, event=event: events.append((event, data)))
+    # Polling: backend/websocket.py bi pri pokretanju iz backend/ zaklonio websocket-client
+    client.connect(f'{base}?token={token}', transports=['polling'])
+    return client
+
+
+def test_emits_fan_out_across_processes(cluster):
+    bases, redis_client = cluster
+    admin = login(bases[0], ADMIN)
+    moderator_token = create_moderator(bases[0], admin['access_token'])
+
+    events = {base: [] for base in bases}
+    clients = [connect(base, admin['access_token'], events[base]) for base in bases]
+    try:
+        # HTTP zahtev na drugom procesu, admin_room obaveštenje na oba
+        response = requests.post(f'{bases[1]}/api/quizzes', json={
+            'title': 'Multi-process quiz', 'duration_seconds': 60,
+            'questions': [{'text': 'Two plus two?', 'points': 1, 'answers': [
+                {'text': '4', 'is_correct': True}, {'text': '5', 'is_correct': False}
+            ]}],
+        }, headers={'Authorization': f'Bearer {moderator_token}'})
+        assert response.status_code == 201, response.text
+        quiz_id = response.json()['id']
+
+        def pending_ids(base):
+            return [quiz['id'] for event, data in events[base] if event == 'quizzes_pending' for quiz in data['quizzes']]
+
+        assert wait_until(lambda: all(quiz_id in pending_ids(base) for base in bases))
+
+        # Oba procesa primaju result_ready sa Redis-a i emituju sa ignore_queue:
+        # svaki klijent dobija jednu kopiju (preko queue-a bi dobio dve)
+        redis_client.publish('quiz_events:result_ready', json.dumps({
+            'user_id': admin['user']['id'], 'submission_id': 'multi-process', 'status': 'completed',
+        }))
+
+        def results(base):
+            return [data for event, data in events[base] if event == 'result_ready']
+
+        assert wait_until(lambda: all(results(base) for base in bases))
+        time.sleep(0.5)
+        assert all(len(results(base)) == 1 for base in bases)
+    finally:
+        for client in clients:
+            client.disconnect()
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Dialog,
   DialogTitle,
@@ -15,30 +15,98 @@ import {
   Box,
   Typography,
   Chip,
-  IconButton
+  IconButton,
+  Button
 } from '@mui/material';
 import CloseIcon from '@mui/icons-material/Close';
 import EmojiEventsIcon from '@mui/icons-material/EmojiEvents';
 import TimerIcon from '@mui/icons-material/Timer';
 import { quizAPI } from '../services/api';
+import websocketService from '../services/websocket';
+
+// Primenjuje leaderboard_delta na prvih topN redova; ostatak liste ostaje iz API-ja
+const applyLeaderboardDelta = (rows, delta, topN) => {
+  const current = rows.slice(0, topN);
+  const byUser = new Map(current.map((row) => [row.user_id, row]));
+  const changed = new Set(delta.changes.map((change) => (change.row ? change.row.user_id : change.user_id)));
+  const removed = new Set(delta.removed);
+
+  const top = new Array(topN).fill(null);
+  if (delta.base_seq !== null) {
+    current.forEach((row, index) => {
+      if (!changed.has(row.user_id) && !removed.has(row.user_id)) top[index] = row;
+    });
+  }
+  delta.changes.forEach((change) => {
+    top[change.rank - 1] = change.row || byUser.get(change.user_id);
+  });
+
+  const nextTop = top.filter(Boolean);
+  const inTop = new Set(nextTop.map((row) => row.user_id));
+  return [...nextTop, ...rows.slice(topN).filter((row) => !inTop.has(row.user_id) && !removed.has(row.user_id))];
+};
 
 const QuizLeaderboard = ({ open, onClose, quizId, quizTitle }) => {
   const [leaderboard, setLeaderboard] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
 
+  // seq poslednjeg primenjenog stanja live rang liste
+  const liveSeq = useRef(null);
+
   useEffect(() => {
     if (open && quizId) {
       fetchLeaderboard();
     }
   }, [open, quizId]);
 
-  const fetchLeaderboard = async () => {
+  useEffect(() => {
+    if (!open || !quizId) return undefined;
+
+    const join = () => websocketService.joinQuizRoom(quizId);
+    const handleSnapshot = (board) => {
+      if (String(board.quiz_id) !== String(quizId)) return;
+      liveSeq.current = board.seq;
+      setLeaderboard((prev) => {
+        const inTop = new Set(board.rows.map((row) => row.user_id));
+        return [...board.rows, ...prev.slice(board.top).filter((row) => !inTop.has(row.user_id))];
+      });
+    };
+    const handleDelta = (delta) => {
+      if (String(delta.quiz_id) !== String(quizId)) return;
+      if (delta.base_seq !== null && delta.base_seq !== liveSeq.current) {
+        // Propušten delta: novo stanje stiže kao snapshot
+        join();
+        return;
+      }
+      liveSeq.current = delta.seq;
+      setLeaderboard((prev) => applyLeaderboardDelta(prev, delta, delta.top));
+    };
+
+    websocketService.connect();
+    websocketService.on('connected', join);
+    websocketService.on('leaderboard_snapshot', handleSnapshot);
+    websocketService.on('leaderboard_delta', handleDelta);
+    join();
+    return () => {
+      websocketService.off('connected', join);
+      websocketService.off('leaderboard_snapshot', handleSnapshot);
+      websocketService.off('leaderboard_delta', handleDelta);
+      websocketService.leaveQuizRoom(quizId);
+      liveSeq.current = null;
+    };
+  }, [open, quizId]);
+
+  const fetchLeaderboard = async (cursor = null) => {
     try {
       setLoading(true);
       setError('');
-      const response = await quizAPI.getLeaderboard(quizId);
-      setLeaderboard(response.data || []);
+      // Najbolji pokušaj po igraču, stranica po stranica
+      const response = await quizAPI.getLeaderboard(quizId, { cursor, best: true });
+      const rows = response.data?.results || [];
+      setLeaderboard((prev) => (cursor ? [...prev, ...rows] : rows));
+      setNextCursor(response.data?.next_cursor || null);
     } catch (err) {
       console.error('Failed to load leaderboard:', err);
       setError(err.response?.data?.error || 'Nije moguće učitati rang listu');
@@ -217,6 +285,14 @@ const QuizLeaderboard = ({ open, onClose, quizId, quizTitle }) => {
           </TableContainer>
         )}
 
+        {!loading && !error && nextCursor && (
+          <Box display="flex" justifyContent="center" mt={2}>
+            <Button variant="outlined" onClick={() => fetchLeaderboard(nextCursor)}>
+              Učitaj još
+            </Button>
+          </Box>
+        )}
+
         {!loading && !error && leaderboard.length > 0 && (
           <Box mt={2} p={2} bgcolor="grey.50" borderRadius={1}>
             <Typography variant="body2" color="text.secondary" textAlign="center">
@@ -51,6 +51,7 @@ import {
   CheckCircle as CheckIcon,
   Error as ErrorIcon,
   PictureAsPdf as PdfIcon,
+  Visibility as ViewIcon,
 } from '@mui/icons-material'
 import { useNavigate } from 'react-router-dom'
 import { useAuth } from '../context/AuthContext'
@@ -90,6 +91,10 @@ const AdminPanel = () => {
   const [rejectionReason, setRejectionReason] = useState('')
   const [quizActionLoading, setQuizActionLoading] = useState(false)
   const [reportGenerating, setReportGenerating] = useState({})
+  // Pitanja i odgovori se učitavaju tek na zahtev (obaveštenja nose samo sažetak)
+  const [detailsDialog, setDetailsDialog] = useState(false)
+  const [quizDetails, setQuizDetails] = useState(null)
+  const [detailsLoading, setDetailsLoading] = useState(false)
 
   // Dialogs
   const [changeRoleDialog, setChangeRoleDialog] = useState(false)
@@ -119,24 +124,31 @@ const AdminPanel = () => {
 
   useEffect(() => {
     websocketService.connect()
-    const handleNewQuiz = (payload) => {
-      if (payload?.status === 'PENDING') {
-        setPendingQuizzes((prev) => {
-          const exists = prev.some((quiz) => quiz.id === payload.id)
-          return exists ? prev : [payload, ...prev]
+    const handlePendingQuizzes = (payload) => {
+      const incoming = (payload?.quizzes || []).filter((quiz) => quiz.status === 'PENDING')
+      if (incoming.length === 0) return
+      setPendingQuizzes((prev) => {
+        // Novija verzija istog kviza zamenjuje postojeći red
+        const byId = new Map(prev.map((quiz) => [quiz.id, quiz]))
+        const added = []
+        incoming.forEach((quiz) => {
+          const current = byId.get(quiz.id)
+          if (!current) added.push(quiz)
+          else if ((current.version || 0) < quiz.version) byId.set(quiz.id, quiz)
         })
-      }
+        return [...added, ...prev.map((quiz) => byId.get(quiz.id))]
+      })
     }
     const handleQuizDecision = (payload) => {
       if (payload?.id) {
         setPendingQuizzes((prev) => prev.filter((quiz) => quiz.id !== payload.id))
       }
     }
-    websocketService.on('new_quiz_pending', handleNewQuiz)
+    websocketService.on('quizzes_pending', handlePendingQuizzes)
     websocketService.on('quiz_approved', handleQuizDecision)
     websocketService.on('quiz_rejected', handleQuizDecision)
     return () => {
-      websocketService.off('new_quiz_pending', handleNewQuiz)
+      websocketService.off('quizzes_pending', handlePendingQuizzes)
       websocketService.off('quiz_approved', handleQuizDecision)
       websocketService.off('quiz_rejected', handleQuizDecision)
     }
@@ -229,6 +241,22 @@ const AdminPanel = () => {
     }
   }
 
+  const handleOpenDetails = async (quiz) => {
+    setQuizDetails({ ...quiz, questions: null })
+    setDetailsDialog(true)
+    try {
+      setDetailsLoading(true)
+      const response = await quizAPI.getQuizDetails(quiz.id)
+      // Odgovor za ranije otvoren kviz ne prepisuje trenutni
+      setQuizDetails((current) => (current?.id === quiz.id ? response.data : current))
+    } catch (err) {
+      toast.error(err.response?.data?.error || 'Failed to load quiz details')
+      setDetailsDialog(false)
+    } finally {
+      setDetailsLoading(false)
+    }
+  }
+
   const handleOpenReject = (quiz) => {
     setSelectedQuiz(quiz)
     setRejectionReason('')
@@ -599,6 +627,14 @@ const AdminPanel = () => {
                     <TableCell>{quiz.question_count}</TableCell>
                     <TableCell align="right">
                       <Box display="flex" justifyContent="flex-end" gap={1}>
+                        <Button
+                          variant="outlined"
+                          size="small"
+                          startIcon={<ViewIcon />}
+                          onClick={() => handleOpenDetails(quiz)}
+                        >
+                          Details
+                        </Button>
                         <Button
                           variant="contained"
                           color="success"
@@ -1097,6 +1133,48 @@ const AdminPanel = () => {
         </DialogActions>
       </Dialog>
 
+      {/* QUIZ DETAILS DIALOG */}
+      <Dialog open={detailsDialog} onClose={() => setDetailsDialog(false)} maxWidth="md" fullWidth>
+        <DialogTitle>{quizDetails?.title || 'Quiz details'}</DialogTitle>
+        <DialogContent dividers>
+          {detailsLoading || !quizDetails?.questions ? (
+            <Box display="flex" justifyContent="center" py={4}>
+              <CircularProgress />
+            </Box>
+          ) : (
+            quizDetails.questions.map((question, index) => (
+              <Box key={question.id ?? index} mb={3}>
+                <Typography fontWeight="bold" gutterBottom>
+                  {index + 1}. {question.text}
+                  {question.points != null && (
+                    <Chip label={`${question.points} pts`} size="small" sx={{ ml: 1 }} />
+                  )}
+                </Typography>
+                {(question.answers || []).map((answer, answerIndex) => (
+                  <Box key={answer.id ?? answerIndex} display="flex" alignItems="center" gap={1} pl={2}>
+                    {answer.is_correct ? (
+                      <CheckIcon fontSize="small" color="success" />
+                    ) : (
+                      <ErrorIcon fontSize="small" color="disabled" />
+                    )}
+                    <Typography
+                      variant="body2"
+                      color={answer.is_correct ? 'success.main' : 'text.primary'}
+                      fontWeight={answer.is_correct ? 'bold' : 'normal'}
+                    >
+                      {answer.text}
+                    </Typography>
+                  </Box>
+                ))}
+              </Box>
+            ))
+          )}
+        </DialogContent>
+        <DialogActions>
+          <Button onClick={() => setDetailsDialog(false)}>Close</Button>
+        </DialogActions>
+      </Dialog>
+
       {/* REJECT QUIZ DIALOG */}
       <Dialog open={rejectDialog} onClose={() => setRejectDialog(false)} maxWidth="sm" fullWidth>
         <DialogTitle>
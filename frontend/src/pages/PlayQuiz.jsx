@@ -1,6 +1,7 @@
 import { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { quizAPI } from '../services/api';
+import websocketService from '../services/websocket';
 import '../App.css';
 
 const PlayQuiz = () => {
@@ -15,9 +16,11 @@ const PlayQuiz = () => {
   const [error, setError] = useState('');
   
   const startTime = useRef(Date.now());
+  const attemptKey = useRef(`${Date.now()}-${Math.random().toString(36).slice(2)}`);
   const timerRef = useRef(null);
 
   useEffect(() => {
+    websocketService.connect();
     fetchQuiz();
     return () => {
       if (timerRef.current) clearInterval(timerRef.current);
@@ -83,9 +86,36 @@ const PlayQuiz = () => {
     const timeSpent = Math.floor((Date.now() - startTime.current) / 1000);
 
     try {
-      await quizAPI.submitQuiz(id, answers, timeSpent);
+      const response = await quizAPI.submitQuiz(id, answers, timeSpent, {
+        idempotencyKey: attemptKey.current,
+        startedAt: new Date(startTime.current).toISOString()
+      });
+      const submissionId = response.data?.submission_id;
+
+      // Result is pushed over the websocket; long-poll only without a connection
+      let status = response.data?.status === 'completed' ? response.data : null;
+      if (submissionId && !status && websocketService.isConnected()) {
+        status = await websocketService.waitForResult(submissionId, 20000);
+      } else if (submissionId && !status) {
+        try {
+          const statusResponse = await quizAPI.getSubmission(submissionId, 20);
+          status = statusResponse.data;
+        } catch (pollErr) {
+          console.error('Failed to fetch submission status:', pollErr);
+        }
+      }
 
-      alert('Quiz submitted! Results will be emailed to you.');
+      if (status?.status === 'failed') {
+        // Claim is released on failure, so the same attempt can be submitted again
+        setError('Scoring failed, please submit again.');
+        setSubmitting(false);
+        return;
+      }
+      if (status?.status === 'completed') {
+        alert(`Quiz submitted! Score: ${status.score} / ${status.max_score} (${status.percentage.toFixed(1)}%)`);
+      } else {
+        alert('Quiz submitted! Results will be emailed to you.');
+      }
       navigate('/dashboard');
       
     } catch (err) {
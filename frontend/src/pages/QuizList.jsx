@@ -57,12 +57,12 @@ const QuizList = () => {
 
   useEffect(() => {
     websocketService.connect()
-    const handleApproved = () => {
+    const handleCatalogChanged = () => {
       loadQuizzes()
     }
-    websocketService.on('quiz_approved', handleApproved)
+    websocketService.on('catalog_changed', handleCatalogChanged)
     return () => {
-      websocketService.off('quiz_approved', handleApproved)
+      websocketService.off('catalog_changed', handleCatalogChanged)
     }
   }, [])
 
@@ -101,6 +101,9 @@ export const userAPI = {
   //  STATISTIKA KORISNIKA (samo admin)
   getUserStats: () => api.get('/api/users/stats'),
   
+  //  WEBSOCKET PRISUSTVO I BROJAČI (samo admin)
+  getWebsocketPresence: () => api.get('/api/admin/websocket'),
+  
   //  UPDATE PROFILA
   updateProfile: (userData) => api.put('/api/profile', userData),
   
@@ -129,20 +132,46 @@ export const quizAPI = {
     return api.get('/api/quizzes')
   },
   getMyQuizzes: () => api.get('/api/quizzes/mine'),
+  // Pitanja i tačni odgovori (admin ili autor); admin obaveštenja nose samo sažetak
+  getQuizDetails: (quizId) => api.get(`/api/quizzes/${quizId}`),
   approveQuiz: (quizId) => api.post(`/api/quizzes/${quizId}/approve`),
   rejectQuiz: (quizId, reason) => api.post(`/api/quizzes/${quizId}/reject`, { reason }),
   
   // PLAY QUIZ
   getQuizForPlay: (quizId) => api.get(`/api/quizzes/${quizId}/play`),
-  submitQuiz: (quizId, answers, timeSpent) => api.post(`/api/quizzes/${quizId}/submit`, { 
-    answers, 
-    time_spent: timeSpent 
-  }),
+  // idempotencyKey is fixed per attempt, so retries return the original submission
+  submitQuiz: (quizId, answers, timeSpent, { idempotencyKey, startedAt } = {}) => api.post(
+    `/api/quizzes/${quizId}/submit`,
+    {
+      answers,
+      time_spent: timeSpent,
+      started_at: startedAt
+    },
+    idempotencyKey ? { headers: { 'Idempotency-Key': idempotencyKey } } : undefined
+  ),
   
   // QUIZ RESULTS
-  getLeaderboard: (quizId) => api.get(`/api/quizzes/${quizId}/leaderboard`),
-  getMyResults: () => api.get('/api/users/my-results'),
+  getLeaderboard: (quizId, { limit = 50, cursor = null, best = false } = {}) => {
+    const params = new URLSearchParams({ limit, best: best ? 1 : 0 })
+    if (cursor) params.append('cursor', cursor)
+    return api.get(`/api/quizzes/${quizId}/leaderboard?${params.toString()}`)
+  },
+  getMyRank: (quizId, around = 2) => api.get(`/api/quizzes/${quizId}/leaderboard/me?around=${around}`),
+  getMyResults: ({ limit = 50, cursor = null, quizId = null, includeArchived = false } = {}) => {
+    const params = new URLSearchParams({ limit })
+    if (cursor) params.append('cursor', cursor)
+    if (quizId) params.append('quiz_id', quizId)
+    if (includeArchived) params.append('include_archived', '1')
+    return api.get(`/api/users/my-results?${params}`)
+  },
+  getMyResultsSummary: () => api.get('/api/users/my-results/summary'),
+  getSubmission: (submissionId, wait = 0) => api.get(`/api/submissions/${submissionId}?wait=${wait}`),
   getQuizStatistics: (quizId) => api.get(`/api/quizzes/${quizId}/statistics`),
+  getQuizAnalytics: (quizId) => api.get(`/api/quizzes/${quizId}/analytics`),
+  exportResults: (quizId, format = 'csv') => api.get(`/api/quizzes/${quizId}/results/export`, {
+    params: { format },
+    responseType: 'blob'
+  }),
   
   // GENERATE PDF REPORT (Admin only)
   generateReport: (quizId) => api.post(`/api/quizzes/${quizId}/generate-report`)
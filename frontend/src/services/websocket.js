@@ -1,5 +1,9 @@
 import { io } from 'socket.io-client'
 
+// Server u deflate modu (SOCKETIO_SERIALIZER) veće poruke šalje kao { _deflate: <zlib bajtovi> };
+// u query-ju konekcije javljamo da ih umemo raspakovati
+const SUPPORTED_CODECS = typeof DecompressionStream !== 'undefined' ? 'deflate' : ''
+
 class WebSocketService {
   constructor() {
     this.socket = null
@@ -7,6 +11,10 @@ class WebSocketService {
     this.connected = false
     this.reconnectAttempts = 0
     this.maxReconnectAttempts = 5
+    // Poslednji result_ready događaji po submission_id (stignu i pre nego što ih neko čeka)
+    this.recentResults = new Map()
+    // Raspakivanje je asinhrono; lanac čuva redosled poruka (npr. leaderboard_delta seq)
+    this.incoming = Promise.resolve()
   }
 
   /**
@@ -31,7 +39,7 @@ class WebSocketService {
       const WS_URL = import.meta.env.VITE_WS_URL || 'http://localhost:5000'
       
       this.socket = io(WS_URL, {
-        query: { token },
+        query: { token, codecs: SUPPORTED_CODECS },
         transports: ['websocket', 'polling'],
         reconnection: true,
         reconnectionAttempts: this.maxReconnectAttempts,
@@ -84,33 +92,57 @@ class WebSocketService {
         console.error(' WebSocket reconnection failed')
       })
 
-      // Backend event-i
-      this.socket.on('new_quiz_pending', (data) => {
-        console.log(' New quiz pending approval:', data)
-        this.emitEvent('new_quiz_pending', data)
+      // Backend event-i (payload raspakovan, redom kojim su stigli)
+      // Sažeci kvizova koji čekaju odobrenje, spojeni u jednu poruku; detalji preko quizAPI.getQuizDetails
+      this.listen('quizzes_pending', (data) => {
+        console.log(' Quizzes pending approval:', data.quizzes.length)
+        this.emitEvent('quizzes_pending', data)
       })
 
-      this.socket.on('quiz_approved', (data) => {
+      this.listen('quiz_approved', (data) => {
         console.log(' Quiz approved:', data)
         this.emitEvent('quiz_approved', data)
       })
 
-      this.socket.on('quiz_rejected', (data) => {
+      // Odobren novi kviz: samo signal da se lista kvizova ponovo učita
+      this.listen('catalog_changed', (data) => {
+        this.emitEvent('catalog_changed', data)
+      })
+
+      this.listen('quiz_rejected', (data) => {
         console.log(' Quiz rejected:', data)
         this.emitEvent('quiz_rejected', data)
       })
 
-      this.socket.on('admin_notification', (data) => {
+      this.listen('admin_notification', (data) => {
         console.log(' Admin notification:', data)
         this.emitEvent('admin_notification', data)
       })
 
-      this.socket.on('system_message', (data) => {
+      this.listen('result_ready', (data) => {
+        console.log(' Result ready:', data)
+        this.recentResults.set(data.submission_id, data)
+        if (this.recentResults.size > 20) {
+          this.recentResults.delete(this.recentResults.keys().next().value)
+        }
+        this.emitEvent('result_ready', data)
+      })
+
+      // Live rang lista sobe kviza: snapshot pri ulasku, zatim delte promena ranga
+      this.listen('leaderboard_snapshot', (data) => {
+        this.emitEvent('leaderboard_snapshot', data)
+      })
+
+      this.listen('leaderboard_delta', (data) => {
+        this.emitEvent('leaderboard_delta', data)
+      })
+
+      this.listen('system_message', (data) => {
         console.log(' System message:', data)
         this.emitEvent('system_message', data)
       })
 
-      this.socket.on('error', (error) => {
+      this.listen('error', (error) => {
         console.error(' WebSocket error:', error)
         this.emitEvent('error', error)
       })
@@ -123,6 +155,27 @@ class WebSocketService {
     }
   }
 
+  /**
+   * Slušač za event sa servera; payload se raspakuje pre handler-a, redom kojim je stigao
+   */
+  listen(event, handler) {
+    this.socket.on(event, (data) => {
+      this.incoming = this.incoming
+        .then(() => this.inflate(data))
+        .then(handler)
+        .catch((error) => console.error(` WebSocket ${event} handling error:`, error))
+    })
+  }
+
+  /**
+   * Raspakivanje { _deflate } omotača (zlib JSON)
+   */
+  async inflate(data) {
+    if (!data || !data._deflate) return data
+    const stream = new Blob([data._deflate]).stream().pipeThrough(new DecompressionStream('deflate'))
+    return JSON.parse(await new Response(stream).text())
+  }
+
   /**
    * Diskonektovanje od servera
    */
@@ -178,6 +231,28 @@ class WebSocketService {
     }
   }
 
+  /**
+   * Čeka result_ready za datu predaju; vraća null ako ne stigne na vreme
+   */
+  waitForResult(submissionId, timeoutMs = 20000) {
+    const ready = this.recentResults.get(submissionId)
+    if (ready) return Promise.resolve(ready)
+
+    return new Promise((resolve) => {
+      const handler = (data) => {
+        if (data.submission_id !== submissionId) return
+        clearTimeout(timer)
+        this.off('result_ready', handler)
+        resolve(data)
+      }
+      const timer = setTimeout(() => {
+        this.off('result_ready', handler)
+        resolve(null)
+      }, timeoutMs)
+      this.on('result_ready', handler)
+    })
+  }
+
   /**
    * Priključivanje u sobu za kviz
    */